@@ -0,0 +1,167 @@
+'''
+A scheduler for the bot's Discord API calls, shared by all cogs.
+
+Discord rate limits requests per bucket (roughly: per route, per channel or guild). discord.py waits out a 429
+by sleeping inside the call, so when lots of calls go to the same bucket at once they all end up waiting on
+each other in no particular order, and a judging `~ping` can get stuck behind a hundred team channels being
+created. Instead, calls are queued here per bucket, with only a few in flight per bucket (and overall) at a
+time, and when a slot frees up the waiting call with the highest priority goes next.
+
+Usage:
+    await api_scheduler.critical(("send", team_text.id), team_text.send(msg))
+    await api_scheduler.bulk(("create_channel", guild.id), guild.create_text_channel(...))
+
+Buckets are any hashable key; by convention (what the call does, the ID of the channel/guild it acts on).
+The number of calls in flight per bucket and overall are set by `api_bucket_concurrency` (default 2) and
+`api_global_concurrency` (default 10) in the config.
+'''
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import defaultdict, deque
+from time import perf_counter
+import numpy as np
+import utils
+
+args, config = utils.general_setup()
+
+# priorities; lower goes first
+CRITICAL = 0 # judging: ping, vcpull, tick
+NORMAL = 1 # everything else a user is waiting on
+BULK = 2 # team provisioning, embeds, anything that can wait
+
+PRIORITY_NAMES = {CRITICAL: "critical", NORMAL: "normal", BULK: "bulk"}
+
+
+class PriorityGate:
+    '''
+    Lets at most `limit` holders through at a time; waiters are let through lowest priority number first
+    (then first come, first served).
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.held = 0
+        self.waiters = [] # heap of (priority, seq, future)
+        self.seq = itertools.count()
+
+    def depth(self):
+        return len(self.waiters)
+
+    async def acquire(self, priority):
+        if self.held < self.limit and not self.waiters:
+            self.held += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.seq), future))
+        try:
+            await future # the slot is handed over by release()
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release() # we were given the slot just as we were cancelled; pass it on
+            else:
+                self.waiters = [w for w in self.waiters if w[2] is not future]
+                heapq.heapify(self.waiters)
+            raise
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None) # hand our slot straight to the next waiter
+                return
+        self.held -= 1
+
+
+class APIScheduler:
+    def __init__(self, bucket_limit, global_limit, history=500):
+        self.bucket_limit = bucket_limit
+        self.gate = PriorityGate(global_limit)
+        self.buckets = {} # bucket -> PriorityGate
+
+        # metrics
+        self.waits = defaultdict(lambda: deque(maxlen=history)) # priority -> recent waits, in seconds
+        self.completed = defaultdict(int) # priority -> calls made
+        self.waiting = defaultdict(int) # priority -> calls queued right now
+        self.max_depth = 0
+
+    def bucket(self, key):
+        if key not in self.buckets:
+            self.buckets[key] = PriorityGate(self.bucket_limit)
+        return self.buckets[key]
+
+    async def run(self, key, priority, coro):
+        '''
+        Wait for a slot in bucket `key` (and overall), then await the API call `coro`.
+        '''
+        bucket = self.bucket(key)
+        queued = perf_counter()
+        self.waiting[priority] += 1
+        self.max_depth = max(self.max_depth, bucket.depth() + 1)
+
+        try:
+            await bucket.acquire(priority)
+            try:
+                await self.gate.acquire(priority)
+            except BaseException:
+                bucket.release()
+                raise
+        except BaseException:
+            coro.close() # never going to be run
+            raise
+        finally:
+            self.waiting[priority] -= 1
+
+        wait = perf_counter() - queued
+        self.waits[priority].append(wait)
+        if wait > 5:
+            logging.warning(f"api_scheduler: {PRIORITY_NAMES[priority]} call in bucket {key} waited {wait:.1f}s")
+
+        try:
+            return await coro
+        finally:
+            self.completed[priority] += 1
+            self.gate.release()
+            bucket.release()
+            if bucket.held == 0 and not bucket.waiters:
+                self.buckets.pop(key, None) # so one-off buckets (e.g. per channel) don't pile up
+
+    def stats(self):
+        '''
+        Queue depth and wait times, per priority.
+        '''
+        stats = {
+            "buckets_active": len(self.buckets),
+            "in_flight": self.gate.held,
+            "max_bucket_depth": self.max_depth,
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            waits = self.waits[priority]
+            stats[name] = {
+                "waiting": self.waiting[priority],
+                "completed": self.completed[priority],
+                "wait_mean_ms": round(float(np.mean(waits)) * 1000, 1) if waits else None,
+                "wait_p90_ms": round(float(np.percentile(waits, 90)) * 1000, 1) if waits else None,
+            }
+        return stats
+
+
+scheduler = APIScheduler(
+    bucket_limit=config.get("api_bucket_concurrency", 2),
+    global_limit=config.get("api_global_concurrency", 10),
+)
+
+
+async def critical(key, coro):
+    return await scheduler.run(key, CRITICAL, coro)
+
+
+async def normal(key, coro):
+    return await scheduler.run(key, NORMAL, coro)
+
+
+async def bulk(key, coro):
+    return await scheduler.run(key, BULK, coro)
@@ -0,0 +1,92 @@
+'''
+Awaitable versions of the functions in database.py.
+
+Every query is run on a single dedicated worker thread, so a slow commit (or the lock held while
+backup/regular_backup.sh is running) only holds up other database calls instead of the whole event loop.
+Using one thread also means the shared sqlite3 connection/cursor in database.py is only ever touched by
+one thread at a time, so nothing there needs locking.
+
+Usage from a cog:
+    success = await async_database.modify_team_challenges(team_name, challenges)
+'''
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import database
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+
+
+async def run(fn, *args, **kwargs):
+    '''
+    Run any blocking function on the database thread and wait for its result. Use this for code (like the
+    queuing algorithms) that calls into database.py itself.
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _make_async(name):
+    # look the function up when it's called rather than now; database.py imports declare_cog, which imports this
+    # module, so database may only be partially imported at this point
+    async def wrapper(*args, **kwargs):
+        return await run(getattr(database, name), *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+def shutdown():
+    '''
+    Wait for any queued queries to finish. Called on exit so nothing is lost mid-commit.
+    '''
+    logging.info("async_database: waiting for queued queries to finish")
+    _executor.shutdown(wait=True)
+
+
+insert_participant = _make_async("insert_participant")
+check_if_verified = _make_async("check_if_verified")
+is_on_team = _make_async("is_on_team")
+team_exists = _make_async("team_exists")
+participant_exists = _make_async("participant_exists")
+check_new_team = _make_async("check_new_team")
+check_new_teams = _make_async("check_new_teams")
+get_discord_ids_by_email = _make_async("get_discord_ids_by_email")
+check_team_validity = _make_async("check_team_validity")
+insert_team = _make_async("insert_team")
+remove_from_team = _make_async("remove_from_team")
+add_to_team = _make_async("add_to_team")
+get_team_role = _make_async("get_team_role")
+get_teams_info = _make_async("get_teams_info")
+get_team_info = _make_async("get_team_info")
+team_from_text_channel = _make_async("team_from_text_channel")
+modify_team_challenges = _make_async("modify_team_challenges")
+get_teams_challenges = _make_async("get_teams_challenges")
+modify_team_judging_info = _make_async("modify_team_judging_info")
+get_all_challenge_info = _make_async("get_all_challenge_info")
+change_team_name = _make_async("change_team_name")
+get_team_display = _make_async("get_team_display")
+get_all_team_role_ids = _make_async("get_all_team_role_ids")
+queue_sheet_updates = _make_async("queue_sheet_updates")
+get_sheet_updates = _make_async("get_sheet_updates")
+remove_sheet_updates = _make_async("remove_sheet_updates")
+count_sheet_updates = _make_async("count_sheet_updates")
+save_judging = _make_async("save_judging")
+load_judging = _make_async("load_judging")
+get_judging_versions = _make_async("get_judging_versions")
+advance_judging_room = _make_async("advance_judging_room")
+record_judging_event = _make_async("record_judging_event")
+skip_judging_team = _make_async("skip_judging_team")
+get_judging_skips = _make_async("get_judging_skips")
+get_judging_events = _make_async("get_judging_events")
+get_current_judging_events = _make_async("get_current_judging_events")
+judging_state_at = _make_async("judging_state_at")
+last_judging_seq = _make_async("last_judging_seq")
+get_judging_board = _make_async("get_judging_board")
+set_judging_board_message = _make_async("set_judging_board_message")
+remove_judging_board_message = _make_async("remove_judging_board_message")
+add_scheduled_job = _make_async("add_scheduled_job")
+set_scheduled_job_due = _make_async("set_scheduled_job_due")
+remove_scheduled_jobs = _make_async("remove_scheduled_jobs")
+get_scheduled_jobs = _make_async("get_scheduled_jobs")
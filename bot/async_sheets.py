@@ -0,0 +1,87 @@
+'''
+Awaitable versions of the functions in sheets.py.
+
+gspread calls are blocking HTTP requests, so they're run on a small thread pool instead of the event loop.
+The pool size caps how many requests are made to Google at once (`sheets_workers` in the config, default 4),
+and at most `sheets_max_pending` calls (default 50) may be queued or running at a time; any more wait their
+turn here, instead of piling up in the pool's unbounded queue.
+
+Usage from a cog:
+    registered = await async_sheets.check_if_registered(email, first_name, last_name)
+'''
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import sheets
+import utils
+
+args, config = utils.general_setup()
+
+_executor = ThreadPoolExecutor(max_workers=config.get("sheets_workers", 4), thread_name_prefix="sheets")
+_slots = asyncio.BoundedSemaphore(config.get("sheets_max_pending", 50))
+
+stats = {
+    "admitted": 0, # calls given a slot: running, or queued for a free pool thread
+    "running": 0, # calls executing on a pool thread right now (at most sheets_workers)
+    "waiting": 0, # calls waiting for a free slot
+    "completed": 0,
+}
+_stats_lock = threading.Lock() # "running" is updated from the pool threads
+
+
+def _counted(fn, *args, **kwargs):
+    '''
+    Runs on a pool thread, so "running" only counts calls actually executing.
+    '''
+    with _stats_lock:
+        stats["running"] += 1
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        with _stats_lock:
+            stats["running"] -= 1
+
+
+async def run(fn, *args, **kwargs):
+    '''
+    Run any blocking sheets function on the sheets thread pool and wait for its result.
+    '''
+    stats["waiting"] += 1
+    try:
+        await _slots.acquire()
+    finally:
+        stats["waiting"] -= 1
+
+    stats["admitted"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(_counted, fn, *args, **kwargs))
+    finally:
+        stats["admitted"] -= 1
+        stats["completed"] += 1
+        _slots.release()
+
+
+def _make_async(name):
+    async def wrapper(*args, **kwargs):
+        return await run(getattr(sheets, name), *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+def shutdown():
+    logging.info("async_sheets: waiting for running sheet calls to finish")
+    _executor.shutdown(wait=True)
+
+
+check_if_registered = _make_async("check_if_registered")
+check_if_verified = _make_async("check_if_verified")
+verify = _make_async("verify")
+write_updates = _make_async("write_updates")
+
+
+async def refresh_registrations():
+    await run(sheets.registrations.refresh)
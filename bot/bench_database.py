@@ -0,0 +1,62 @@
+'''
+Counts the queries made by the bulk team loaders as the number of teams grows; the count should stay flat.
+Runs against a throwaway in-memory database, so the database in the config is never touched.
+
+    python bench_database.py -c <config>
+'''
+
+import sqlite3
+from time import perf_counter
+from types import SimpleNamespace
+import database
+import migrations
+
+TEAM_COUNTS = [10, 50, 150, 500]
+
+
+def fresh_database(n_teams):
+    '''
+    Point database.py at a new in-memory database containing `n_teams` teams of 4, each signed up for 2 challenges.
+    '''
+    con = sqlite3.connect(":memory:")
+    migrations.upgrade(con)
+
+    snowflake = 1000
+    for t in range(n_teams):
+        team_name = f"team-{t}"
+        con.execute("INSERT INTO Teams VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+            (team_name, snowflake + 1, snowflake + 2, snowflake + 3, snowflake + 4, None, "github.com/x", "devpost.com/x"))
+        snowflake += 5
+
+        for m in range(4):
+            con.execute("INSERT INTO Participants VALUES (?, ?, ?, ?, ?);", (f"{t}-{m}@ualberta.ca", "first", "last", snowflake, team_name))
+            snowflake += 1
+
+        for chal in ["HackED", "Hardware"]:
+            con.execute("INSERT INTO Challenges VALUES (?, ?);", (chal, team_name))
+
+    con.commit()
+    database.con = con
+    database.cur = con.cursor()
+    return con
+
+
+def count_queries(con, fn, *args):
+    statements = []
+    con.set_trace_callback(statements.append)
+    start = perf_counter()
+    fn(*args)
+    elapsed = perf_counter() - start
+    con.set_trace_callback(None)
+    return len(statements), elapsed
+
+
+if __name__ == "__main__":
+    guild = SimpleNamespace(channels=[], categories=[], roles=[], members=[]) # nothing resolves, only queries are measured
+
+    print(f"{'teams':>6} | {'get_teams_info':>24} | {'get_all_challenge_info':>24}")
+    for n_teams in TEAM_COUNTS:
+        con = fresh_database(n_teams)
+        q_info, t_info = count_queries(con, database.get_teams_info, guild)
+        q_chal, t_chal = count_queries(con, database.get_all_challenge_info)
+        print(f"{n_teams:>6} | {q_info:>6} queries {t_info * 1000:>8.1f} ms | {q_chal:>6} queries {t_chal * 1000:>8.1f} ms")
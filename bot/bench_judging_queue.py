@@ -0,0 +1,114 @@
+'''
+Micro-benchmark for judging_queue.JudgingQueue against the list approach `skip` used to take (copying the
+slices of the queue before and after the skipped team, and the whole judging dict, on every skip).
+
+Before timing anything, a random sequence of ticks and skips is run on both, to check they agree on the queue
+order and `current` at every step. Runs with no Discord or database:
+
+    python bench_judging_queue.py -c <config>
+'''
+
+import random
+from copy import deepcopy
+from time import perf_counter
+import utils
+from judging_queue import JudgingQueue
+import judging_state
+
+SIZES = [100, 1000, 10000]
+N_OPS = 2000
+
+
+def list_skip(judging, room_id):
+    # what Judging.skip did before
+    skip_team_idx = judging[room_id]["current"] + 1
+    new_queue = deepcopy(judging[room_id]["teams"][:skip_team_idx]) \
+                + deepcopy(judging[room_id]["teams"][skip_team_idx+1:]) \
+                + [ judging[room_id]["teams"][skip_team_idx] ]
+    mock_judging = deepcopy(judging)
+    mock_judging[room_id]["teams"] = new_queue
+    return mock_judging
+
+
+def random_ops(n_teams, n_ops, rng):
+    '''
+    A valid sequence of "tick"/"skip" operations for a queue of n_teams, that never runs past the end.
+    '''
+    ops, current = [], -1
+    for _ in range(n_ops):
+        can_skip = current + 2 < n_teams # there's a next team, and it isn't last
+        if can_skip and rng.random() < 0.5:
+            ops.append("skip")
+        elif current < n_teams - 1:
+            ops.append("tick")
+            current += 1
+    return ops
+
+
+def check_agrees(n_teams, n_ops, seed):
+    rng = random.Random(seed)
+    teams = [f"team-{i}" for i in range(n_teams)]
+    state = {"r": {"teams": list(teams), "current": -1}}
+    queue = JudgingQueue.from_state(state["r"])
+
+    for op in random_ops(n_teams, n_ops, rng):
+        if op == "tick":
+            judging_state.apply_event(state, "tick", "r", {})
+            queue.tick()
+        else:
+            index = state["r"]["current"] + 1
+            judging_state.apply_event(state, "skip", "r", {"index": index, "team_name": state["r"]["teams"][index]})
+            queue.skip_next()
+        assert queue.to_state() == state["r"], f"disagreed after {op}: {queue.to_state()} vs {state['r']}"
+
+    # conversion both ways keeps everything
+    assert JudgingQueue.from_state(queue.to_state()).to_state() == queue.to_state()
+
+    # withdraw/reinsert/move don't lose or duplicate teams
+    waiting = [e.team_name for e in queue if e.status in ["waiting", "pinged"]]
+    if len(waiting) >= 2:
+        queue.withdraw(waiting[0])
+        assert waiting[0] not in queue and len(queue) == n_teams - 1
+        queue.reinsert(waiting[0])
+        queue.move_after(waiting[-1])
+        assert queue.next_team() == waiting[-1] and sorted(queue.teams()) == sorted(teams)
+
+
+def bench(n_teams):
+    rng = random.Random(n_teams)
+    ops = random_ops(n_teams, N_OPS, rng)
+
+    # list approach
+    judging = {"r": {"teams": [f"team-{i}" for i in range(n_teams)], "current": -1}}
+    start = perf_counter()
+    for op in ops:
+        if op == "tick":
+            judging["r"]["current"] += 1
+        else:
+            judging = list_skip(judging, "r")
+    list_time = perf_counter() - start
+
+    # linked queue
+    queue = JudgingQueue.from_state({"teams": [f"team-{i}" for i in range(n_teams)], "current": -1})
+    start = perf_counter()
+    for op in ops:
+        if op == "tick":
+            queue.tick()
+        else:
+            queue.skip_next()
+    queue_time = perf_counter() - start
+
+    assert queue.to_state() == judging["r"]
+    skips = ops.count("skip")
+    print(f"{n_teams:>6} teams, {skips} skips: list {list_time / len(ops) * 1e6:9.1f}us/op   JudgingQueue {queue_time / len(ops) * 1e6:6.2f}us/op   ({list_time / queue_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    args, config = utils.general_setup()
+
+    for seed in range(20):
+        check_agrees(n_teams=30, n_ops=60, seed=seed)
+    print("JudgingQueue agrees with the list model on 20 random tick/skip sequences")
+
+    for n_teams in SIZES:
+        bench(n_teams)
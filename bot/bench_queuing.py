@@ -0,0 +1,103 @@
+'''
+Benchmarks every queuing algorithm on synthetic hackathons (see synthetic_event.py) of 50, 500 and 5000 teams.
+For each it reports runtime, peak memory (from tracemalloc, in a second run, since tracing slows things down) and
+the quality of what it came up with:
+
+* longest : minutes until the slowest room is done
+* std : standard deviation of the rooms' times, in minutes
+* sponsor : minutes until the slowest challenge room is done
+* pref : fraction of judged teams in a room they prefer
+* unassigned : teams that signed up but weren't given a room
+* booked : judging slots booked (more than the number of teams if teams are seen in several rooms)
+
+Runs with no Discord or database:
+
+    python bench_queuing.py -c <config>
+'''
+
+import logging
+import tracemalloc
+from time import perf_counter
+import numpy as np
+import utils
+import queuing
+from synthetic_event import generate_event
+
+SIZES = [50, 500, 5000]
+SEARCH_CANDIDATES = 1000
+SEED = 0
+
+ALGORITHMS = {
+    "first_chal_match": queuing.first_chal_match,
+    "balanced_match": queuing.balanced_match,
+    "timetable_match": queuing.timetable_match,
+    "search_match": lambda info, rooms: queuing.search_match(info, rooms, n_candidates=SEARCH_CANDIDATES, seed=SEED),
+}
+
+
+def quality(m, rooms, result):
+    timetable = isinstance(result[1], dict) # timetable_match also returns the timetable
+    assignment = result[0]
+    unassigned = result[3] if timetable else result[2]
+    booked = sum(len(teams) for teams in assignment.values())
+
+    if timetable:
+        # teams can be in several rooms, and rooms can have gaps, so use its own makespans
+        makespan = np.array([result[4][room_id] for room_id in m.room_ids])
+        row = {team_name: i for i, team_name in enumerate(m.team_names)}
+        column = {room_id: r for r, room_id in enumerate(m.room_ids)}
+        in_preferred = [
+            any(m.preferred[row[team_name], column[b["room_id"]]] for b in bookings)
+            for team_name, bookings in result[1].items()
+        ]
+        pref = np.mean(in_preferred) if in_preferred else 1.0
+    else:
+        assigned = m.assignment(assignment)
+        makespan = m.makespans(assigned)
+        # of signed-up teams that were given a room; first_chal_match also places teams that didn't sign up
+        judged = (assigned >= 0) & m.signed_up
+        in_preferred = judged & m.preferred[np.arange(len(assigned)), np.maximum(assigned, 0)]
+        pref = in_preferred.sum() / max(judged.sum(), 1)
+
+    sponsor = makespan[~m.default_rooms]
+    return {
+        "longest": makespan.max(initial=0),
+        "std": makespan.std() if len(makespan) else 0,
+        "sponsor": sponsor.max(initial=0),
+        "pref": pref,
+        "unassigned": len(unassigned),
+        "booked": booked,
+    }
+
+
+def bench(n_teams):
+    info, rooms = generate_event(n_teams, seed=SEED)
+    m = queuing.EventMatrices(info, rooms)
+    print(f"\n{n_teams} teams, {len(rooms)} rooms ({int(m.default_rooms.sum())} default), {int(m.signed_up.sum())} signed up")
+    print(f"{'algorithm':>18} | {'time':>9} | {'peak mem':>9} | {'longest':>8} | {'std':>6} | {'sponsor':>8} | {'pref':>5} | {'unassigned':>10} | {'booked':>6}")
+
+    for name, algorithm in ALGORITHMS.items():
+        start = perf_counter()
+        result = algorithm(info, rooms)
+        elapsed = perf_counter() - start
+
+        tracemalloc.start()
+        algorithm(info, rooms)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        q = quality(m, rooms, result)
+        print(f"{name:>18} | {elapsed:8.3f}s | {peak / 2**20:7.1f}MB | {q['longest']:8.0f} | {q['std']:6.1f} | {q['sponsor']:8.0f} | {q['pref']:5.0%} | {q['unassigned']:>10} | {q['booked']:>6}")
+
+        if isinstance(result[1], dict):
+            conflicts = queuing.find_conflicts(result[1], rooms)
+            assert conflicts == [], f"{name} double-booked teams: {conflicts[:3]}"
+
+
+if __name__ == "__main__":
+    args, config = utils.general_setup()
+    logging.disable(logging.INFO) # the algorithms log every team
+
+    print(f"search_match: {SEARCH_CANDIDATES} candidates, seed {SEED}; peak memory is the main process only (workers aren't traced)")
+    for n_teams in SIZES:
+        bench(n_teams)
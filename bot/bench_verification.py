@@ -0,0 +1,105 @@
+'''
+Load test for the verification pipeline, with no network access needed. Generates 5000 synthetic registrants
+in a local CSV registration source, then verifies all of them concurrently with verification_cog.verify_participant,
+the code /verify runs (with an in-memory database). Each run starts with a cold registration index, so the first
+lookups have to load it from the source.
+
+The run is repeated with a source that sleeps on every read/write to stand in for Google's latency, to check
+concurrent verifications overlap rather than queueing behind each other, and that the lookups that arrive while
+the index is loading share that one load.
+
+    python bench_verification.py -c <config>
+'''
+
+import asyncio
+import csv
+import sqlite3
+from time import perf_counter, sleep
+import numpy as np
+import utils
+import sheets
+import async_sheets
+import database
+import async_database
+import migrations
+import verification_cog
+from verification_cog import VerifyRes
+
+N_REGISTRANTS = 5000
+CONCURRENCY = 200 # verifications in flight at once
+FAKE_LATENCY = 0.05 # seconds per read/write for the slow source
+
+
+class SlowSource(sheets.LocalFileSource):
+    def load(self):
+        sleep(FAKE_LATENCY)
+        return super().load()
+
+    def write(self, updates):
+        sleep(FAKE_LATENCY)
+        super().write(updates)
+
+
+def make_registrants(n):
+    path = utils.gen_filename("loadtest_registrants", "csv")
+    registrants = [(f"hacker{i}@ualberta.ca", f"first{i}", f"last{i}") for i in range(n)]
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Email Address", "First Name", "Last Name", "Discord ID"])
+        for email, first_name, last_name in registrants:
+            writer.writerow([email, first_name, last_name, ""])
+
+    return path, registrants
+
+
+def fresh_database():
+    con = sqlite3.connect(":memory:", check_same_thread=False)
+    migrations.upgrade(con)
+    database.con = con
+    database.cur = con.cursor()
+
+
+async def run(source, registrants):
+    sheets.source = source
+    sheets.registrations = sheets.RegistrationIndex(ttl=60, min_refresh_interval=5) # cold, with fresh stats for each run
+    fresh_database()
+
+    slots = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def timed(i, registrant):
+        async with slots:
+            start = perf_counter()
+            res, queued = await verification_cog.verify_participant(*registrant, 10**17 + i)
+            latencies.append(perf_counter() - start)
+            return res
+
+    start = perf_counter()
+    results = await asyncio.gather(*[timed(i, r) for i, r in enumerate(registrants)])
+
+    # flush the write-behind queue like the Verification cog does
+    updates = await async_database.get_sheet_updates(limit=len(registrants))
+    await async_sheets.write_updates([(cell, value) for _, cell, value, _ in updates])
+    elapsed = perf_counter() - start
+
+    verified = results.count(VerifyRes.CAN_BE_VERIFIED)
+    print(f"  {verified}/{len(registrants)} verified in {elapsed:.2f}s ({verified / elapsed:.0f}/s)")
+    print(f"  latency p50={np.percentile(latencies, 50) * 1000:.1f}ms p90={np.percentile(latencies, 90) * 1000:.1f}ms max={max(latencies) * 1000:.1f}ms")
+    print(f"  registration index: {sheets.registrations.stats()}")
+
+
+async def main():
+    path, registrants = make_registrants(N_REGISTRANTS)
+    print(f"Wrote {N_REGISTRANTS} synthetic registrants to {path}")
+
+    print("Local file source:")
+    await run(sheets.LocalFileSource(path), registrants)
+
+    path, registrants = make_registrants(N_REGISTRANTS // 10)
+    print(f"Local file source with {FAKE_LATENCY * 1000:.0f}ms latency ({len(registrants)} registrants):")
+    await run(SlowSource(path), registrants)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,26 +1,45 @@
 import sqlite3
+import json
+from collections import defaultdict
+from time import time
 import utils
 import logging
 import discord
-from discord.utils import get as dget
 from declare_cog import challenge_order, challenge_data
+import migrations
+from index_cog import guild_index
+import judging_state
 
 args, config = utils.general_setup()
 
-con = sqlite3.connect(config["db_path"])
+# check_same_thread is off because all queries are run on async_database's worker thread rather than the
+# thread that imported this module. timeout makes writers wait out the lock held by backup/regular_backup.sh
+# instead of erroring.
+con = sqlite3.connect(config["db_path"], timeout=30, check_same_thread=False)
 cur = con.cursor()
 
 # set up
+migrations.upgrade(con) # bring older databases up to the current schema.sql
 cur.execute("PRAGMA foreign_keys = ON;")
+cur.execute("PRAGMA journal_mode = WAL;") # readers don't block the writer (or the backup) and vice versa
 con.commit()
 
-def insert_participant(email, first_name, last_name, discord_id):
+def insert_participant(email, first_name, last_name, discord_id, sheet_updates: list = None):
     '''
     Insert participant data into Participants table. Performs no checks.
+    Any (cell, value) `sheet_updates` that verify them in the registration sheet are queued (as in
+    queue_sheet_updates) in the same transaction, so a verified participant always has their sheet update queued.
     '''
-    cur.execute("INSERT INTO Participants VALUES (?, ?, ?, ?, ?);", (email, first_name, last_name, discord_id, None))
-    con.commit()
-    logging.info(f"Database: Added participant to database: {email}, {first_name}, {last_name}, {discord_id}, None")
+    try:
+        cur.execute("INSERT INTO Participants VALUES (?, ?, ?, ?, ?);", (email, first_name, last_name, int(discord_id), None))
+        if sheet_updates:
+            now = time()
+            cur.executemany("INSERT INTO SheetUpdates (cell, value, queued_at) VALUES (?, ?, ?);", [(cell, value, now) for cell, value in sheet_updates])
+        con.commit()
+    except sqlite3.Error:
+        con.rollback()
+        raise
+    logging.info(f"Database: Added participant to database: {email}, {first_name}, {last_name}, {discord_id}, None; queued sheet updates {sheet_updates}")
 
 
 def check_if_verified(email, first_name, last_name, discord_id):
@@ -35,7 +54,7 @@ def check_if_verified(email, first_name, last_name, discord_id):
     logging.info(f"Database: Found {len(match_email)} participants matching email {email}: {match_email}")
 
     # check if this account has already been verified
-    cur.execute("SELECT * FROM Participants WHERE discord_id = ?;", (discord_id,))
+    cur.execute("SELECT * FROM Participants WHERE discord_id = ?;", (int(discord_id),))
     match_discord = cur.fetchall()
     logging.info(f"Database: Found {len(match_discord)} participants matching discord id {discord_id}: {match_discord}")
 
@@ -80,7 +99,7 @@ def team_exists(team_name: str):
 
 def participant_exists(discord_id):
     # verify participant exists
-    cur.execute("SELECT * From Participants WHERE discord_id = ?;", (str(discord_id),))
+    cur.execute("SELECT * From Participants WHERE discord_id = ?;", (int(discord_id),))
     matches = cur.fetchall()
     if len(matches) == 0:
         return False
@@ -91,32 +110,17 @@ def participant_exists(discord_id):
         return True
 
 
-def check_team_validity(
-    team_name: str, 
-    team_text: discord.TextChannel,
-    team_vc: discord.VoiceChannel,
-    team_cat: discord.CategoryChannel,
-    team_role: discord.Role,
-    members: list 
-):
+def check_new_team(team_name: str, members: list):
     '''
-    Should be run before insert_team. Checks a team can be inserted correctly.
+    Checks a team with this name and these members could be created: the name is free, and every member is a
+    verified participant not already on a team. Run before any Discord artefacts are made for the team.
     '''
-    logging.info(f"check_team_validity called with args: {team_name}, {team_text}, {team_vc}, {team_cat}, {team_role}")
-
     if team_exists(team_name):
         return False
     
-    cur.execute("SELECT * FROM Teams WHERE channel_id = ? OR voice_id = ? OR category_id = ? OR role_id = ?;",
-        (str(team_text.id), str(team_vc.id), str(team_cat.id), str(team_role.id))
-    )
-    if len(cur.fetchall()) > 0:
-        logging.error("Database: one of the IDs for channel/category/role was already in the database.")
-        return False
-    
     for member in members:
         # get participant's email
-        cur.execute("SELECT email, team_name FROM Participants WHERE discord_id = ?;", (str(member.id),))
+        cur.execute("SELECT email, team_name FROM Participants WHERE discord_id = ?;", (member.id,))
         matches = cur.fetchall()
 
         # if we have multiple participants with same id, this is a Problem (but should not happen due to other checks)
@@ -133,11 +137,55 @@ def check_team_validity(
             logging.error(f"Database: Participant {member.name} with id={member.id} is already on a team (team_name={matches[0][1]})")
             return False
         
-        
     # otherwise, checks pass
     return True
 
 
+def check_new_teams(teams: dict):
+    '''
+    check_new_team for many teams at once, given as {team_name: [members]}. Returns the names of the teams
+    that fail the checks.
+    '''
+    return [team_name for team_name, members in teams.items() if not check_new_team(team_name, members)]
+
+
+def get_discord_ids_by_email(emails: list):
+    '''
+    Look up the Discord IDs that participants verified with, by email. Returns {email: discord_id} for the
+    emails that have been verified.
+    '''
+    emails = list(emails)
+    found = {}
+    for i in range(0, len(emails), 500): # older sqlite3 builds allow at most 999 parameters per query
+        chunk = emails[i:i + 500]
+        cur.execute(f"SELECT email, discord_id FROM Participants WHERE email IN ({', '.join('?' * len(chunk))});", chunk)
+        found.update(cur.fetchall())
+    return found
+
+
+def check_team_validity(
+    team_name: str, 
+    team_text: discord.TextChannel,
+    team_vc: discord.VoiceChannel,
+    team_cat: discord.CategoryChannel,
+    team_role: discord.Role,
+    members: list 
+):
+    '''
+    Checks a team can be inserted correctly. Run by insert_team inside its transaction.
+    '''
+    logging.info(f"check_team_validity called with args: {team_name}, {team_text}, {team_vc}, {team_cat}, {team_role}")
+
+    cur.execute("SELECT * FROM Teams WHERE channel_id = ? OR voice_id = ? OR category_id = ? OR role_id = ?;",
+        (team_text.id, team_vc.id, team_cat.id, team_role.id)
+    )
+    if len(cur.fetchall()) > 0:
+        logging.error("Database: one of the IDs for channel/category/role was already in the database.")
+        return False
+    
+    return check_new_team(team_name, members)
+
+
 def insert_team(
     team_name: str, 
     team_text: discord.TextChannel,
@@ -147,24 +195,38 @@ def insert_team(
     members: list
 ):
     '''
-    Insert a team and participants into the Participants and Teams tables.
-    Does not check for foreign key constraints or illegal duplicates; this should be done first.
+    Insert a team and participants into the Participants and Teams tables, in a single transaction.
+    check_team_validity is run inside the same transaction, so nothing can change between the checks and the
+    inserts. Returns True if the team was inserted; on False nothing was written.
     '''
 
-    # add team to Teams table
-    cur.execute("INSERT INTO Teams VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
-        (team_name, str(team_text.id), str(team_vc.id), str(team_cat.id), str(team_role.id), None, None, None)
-        # None/NULL for judging info that isnt yet specified
-    )
-    con.commit()
-    logging.info(f"Database: created team {team_name}")
+    try:
+        cur.execute("BEGIN IMMEDIATE;") # take the write lock now, so the checks below stay true until commit
 
-    # add each participant as member of team to Members table
-    for member in members:
-        cur.execute("UPDATE Participants SET team_name = ? WHERE discord_id = ?;", (team_name, str(member.id)))
-        logging.info(f"Database: updated member (name={member.name}, id={member.id}) to have team_name={team_name}")
+        if not check_team_validity(team_name, team_text, team_vc, team_cat, team_role, members):
+            con.rollback()
+            return False
 
-    con.commit()
+        # add team to Teams table
+        cur.execute("INSERT INTO Teams VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+            (team_name, team_text.id, team_vc.id, team_cat.id, team_role.id, None, None, None)
+            # None/NULL for judging info that isnt yet specified
+        )
+
+        # add each participant as member of team to Members table
+        cur.executemany("UPDATE Participants SET team_name = ? WHERE discord_id = ?;",
+            [(team_name, member.id) for member in members]
+        )
+
+        con.commit()
+
+    except sqlite3.Error as e:
+        con.rollback()
+        logging.error(f"Database: failed to insert team {team_name}, rolled back", exc_info=e)
+        return False
+
+    logging.info(f"Database: created team {team_name} with members {[(m.name, m.id) for m in members]}")
+    return True
 
 
 def remove_from_team(team_name, member):
@@ -174,7 +236,7 @@ def remove_from_team(team_name, member):
     res, info = False, ""
     logging.info(f"remove_from_team called with args: {team_name}, {member}")
 
-    cur.execute("SELECT team_name FROM Participants WHERE discord_id = ?;", (str(member.id),))
+    cur.execute("SELECT team_name FROM Participants WHERE discord_id = ?;", (member.id,))
     matches = cur.fetchall()
     
     # check participant exists
@@ -189,7 +251,7 @@ def remove_from_team(team_name, member):
 
     # can remove from team
     else:
-        cur.execute("UPDATE Participants SET team_name = NULL WHERE discord_id = ?;", (str(member.id),))
+        cur.execute("UPDATE Participants SET team_name = NULL WHERE discord_id = ?;", (member.id,))
         con.commit()
         res, info = True, f"Successfully removed participant {member.mention} from team `{team_name}`."
 
@@ -228,7 +290,7 @@ def add_to_team(team_name, member):
         return res, info
 
     # can add to team
-    cur.execute("UPDATE Participants SET team_name = ? WHERE discord_id = ?;", (team_name, str(member.id),))
+    cur.execute("UPDATE Participants SET team_name = ? WHERE discord_id = ?;", (team_name, member.id,))
     con.commit()
     return True, f"Successfully added participant {member.mention} to team `{team_name}`."
 
@@ -240,30 +302,33 @@ def get_team_role(guild: discord.Guild, team_name: str):
     cur.execute("SELECT role_id FROM Teams WHERE team_name = ?;", (team_name,))
     match = cur.fetchone()
 
-    role = dget(guild.roles, id=int(match[0]))
+    role = guild_index.role(int(match[0]))
     return role
 
 
-def make_team_info(guild: discord.Guild, team: tuple):
+def make_team_info(guild: discord.Guild, team: tuple, members: list = None, challenges: list = None):
     '''
     Takes a Guild and a row from the Teams table, constructs a dictionary.
+    The team's Participants rows and challenge names can be passed in if they've already been loaded in bulk;
+    otherwise they're queried here.
     '''
     logging.info(f"make_team_info called for team: {team}")
 
     # construct info for team
     team_info = {
-        "team_text": dget(guild.channels, id=int(team[1])),
-        "team_vc": dget(guild.channels, id=int(team[2])),
-        "team_cat": dget(guild.categories, id=int(team[3])),
-        "team_role": dget(guild.roles, id=int(team[4])),
+        "team_text": guild_index.channel(int(team[1])),
+        "team_vc": guild_index.channel(int(team[2])),
+        "team_cat": guild_index.category(int(team[3])),
+        "team_role": guild_index.role(int(team[4])),
         # team[5] was medium_pref, got rid of it
         "github_link": team[6],
         "devpost_link": team[7],
     }
 
     # get all members
-    cur.execute(f"SELECT * FROM Participants WHERE team_name = ?;", (team[0],))
-    members = cur.fetchall()
+    if members == None:
+        cur.execute(f"SELECT * FROM Participants WHERE team_name = ?;", (team[0],))
+        members = cur.fetchall()
     members_info = []
 
     # append info of each member
@@ -273,27 +338,55 @@ def make_team_info(guild: discord.Guild, team: tuple):
             "member_first_name": member[1],
             "member_last_name": member[2],
             "member_discord_id": member[3],
-            "member_object": dget(guild.members, id=int(member[3]))
+            "member_object": guild_index.member(int(member[3]))
         })
 
     team_info["team_members"] = members_info
 
     # get challenges
-    team_info["challenges"] = get_teams_challenges(team[0])
+    if challenges == None:
+        challenges = get_teams_challenges(team[0])
+    team_info["challenges"] = challenges
 
     return team_info
 
 
+def get_all_team_members():
+    '''
+    Get the Participants rows of everyone on a team, grouped by team name. One query, however many teams there are.
+    '''
+    cur.execute("SELECT * FROM Participants WHERE team_name IS NOT NULL;")
+
+    members = defaultdict(list)
+    for row in cur.fetchall():
+        members[row[4]].append(row)
+    return members
+
+
+def get_all_teams_challenges():
+    '''
+    Get the challenges every team is signed up for, grouped by team name. One query, however many teams there are.
+    '''
+    cur.execute("SELECT team_name, challenge_name FROM Challenges;")
+
+    challenges = defaultdict(list)
+    for team_name, challenge_name in cur.fetchall():
+        challenges[team_name].append(challenge_name)
+    return challenges
+
+
 def get_teams_info(guild: discord.Guild):
     logging.info(f"get_teams_info: called")
     info = {}
 
-    # for each team, get everything, 10 at a time
+    # load everything up front (3 queries in total) rather than querying members/challenges per team
     cur.execute("SELECT * FROM Teams;")
     matches = cur.fetchall()
-    
+    members = get_all_team_members()
+    challenges = get_all_teams_challenges()
+
     for match in matches:
-        info[match[0]] = make_team_info(guild, match)
+        info[match[0]] = make_team_info(guild, match, members[match[0]], challenges[match[0]])
 
     return info
 
@@ -315,7 +408,7 @@ def team_from_text_channel(channel_id):
     Gets the team associated with a text channel ID, if any.
     '''
 
-    cur.execute("SELECT team_name FROM Teams WHERE channel_id = ?;", (str(channel_id),))
+    cur.execute("SELECT team_name FROM Teams WHERE channel_id = ?;", (int(channel_id),))
     matches = cur.fetchall()
 
     if len(matches) == 0:
@@ -385,27 +478,26 @@ def get_all_challenge_info():
     '''
     Gets information required for sorting teams into judging queues; that is, medium preference and challenges signed up for.
     '''
-    info = []
+    info = {}
 
-    # get all the teams
-    cur.execute("SELECT team_name FROM Teams;")
-    matches_team = cur.fetchall()
-    
-    for match in matches_team:
-        team_name = match[0]
-        
-        # get the challenges this team signed up for
-        cur.execute("SELECT challenge_name FROM Challenges WHERE team_name = ?;", (team_name,))
-        matches_chal = cur.fetchall()
+    # get all the teams and the challenges they signed up for in one go; teams with no challenges come back once
+    # with challenge_name NULL
+    cur.execute("SELECT Teams.team_name, Challenges.challenge_name FROM Teams LEFT JOIN Challenges ON Teams.team_name = Challenges.team_name;")
+
+    for team_name, challenge_name in cur.fetchall():
+        chals = info.setdefault(team_name, [])
+        if challenge_name != None:
+            chals.append(challenge_name)
 
-        # construct info
-        info.append({
+    # construct info
+    return [
+        {
             'team_name': team_name,
             # 'medium_pref': medium_pref,
-            'challenges': challenge_order([m[0] for m in matches_chal])
-        })
-
-    return info
+            'challenges': challenge_order(chals)
+        }
+        for team_name, chals in info.items()
+    ]
 
 
 
@@ -454,4 +546,258 @@ def get_team_display(ctx, team_name):
 def get_all_team_role_ids():
     cur.execute("SELECT role_id FROM Teams;")
     matches = cur.fetchall()
-    return [x[0] for x in matches]
\ No newline at end of file
+    return [x[0] for x in matches]
+
+
+def queue_sheet_updates(updates: list):
+    '''
+    Queue (cell, value) writes to the registration sheet; they're sent in batches by the Verification cog.
+    '''
+    now = time()
+    cur.executemany("INSERT INTO SheetUpdates (cell, value, queued_at) VALUES (?, ?, ?);", [(cell, value, now) for cell, value in updates])
+    con.commit()
+    logging.info(f"Database: queued sheet updates {updates}")
+
+
+def get_sheet_updates(limit: int = 500):
+    '''
+    Get the oldest queued sheet writes, as (update_id, cell, value, queued_at) rows.
+    '''
+    cur.execute("SELECT update_id, cell, value, queued_at FROM SheetUpdates ORDER BY update_id LIMIT ?;", (limit,))
+    return cur.fetchall()
+
+
+def remove_sheet_updates(update_ids: list):
+    '''
+    Remove queued sheet writes once they've been written to the sheet.
+    '''
+    cur.executemany("DELETE FROM SheetUpdates WHERE update_id = ?;", [(i,) for i in update_ids])
+    con.commit()
+
+
+def count_sheet_updates():
+    cur.execute("SELECT COUNT(*) FROM SheetUpdates;")
+    return cur.fetchone()[0]
+
+
+# ===== judging state
+# each function below is one transaction, so the stored state is never half-updated. every change is also
+# appended to JudgingEvents in the same transaction, so the event log always agrees with the state
+
+CHECKPOINT_EVERY = config.get("judging_checkpoint_every", 50) # events between checkpoints
+
+def append_judging_event(kind: str, room_id: str, data: dict):
+    '''
+    Append an event to the judging log; to be called inside the transaction making the change. Every
+    CHECKPOINT_EVERY events, the state after the event is saved as a checkpoint. Returns the event's seq.
+    '''
+    now = time()
+    cur.execute("INSERT INTO JudgingEvents (kind, room_id, data, created_at) VALUES (?, ?, ?, ?);", (kind, room_id, json.dumps(data), now))
+    seq = cur.lastrowid
+
+    # a start event holds the whole state anyway, so it's always a checkpoint
+    if kind == "start" or seq % CHECKPOINT_EVERY == 0:
+        cur.execute("INSERT INTO JudgingCheckpoints VALUES (?, ?, ?);", (seq, json.dumps(load_judging()), now))
+    return seq
+
+
+def save_judging(judging: dict):
+    '''
+    Replace the stored judging state with `judging` (in the format used by the Judging cog,
+    {room_id: {"teams": [...], "current": int}}). Skip history from the previous scheme is cleared too.
+    Returns the seq of the event logged.
+    '''
+    with con:
+        # versions carry on from the previous scheme rather than restarting at 0, so an operation that read a
+        # room before the new scheme started can't mistake it for the same state
+        cur.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM JudgingRooms;")
+        version = cur.fetchone()[0]
+
+        cur.execute("DELETE FROM JudgingSkips;")
+        cur.execute("DELETE FROM JudgingQueue;")
+        cur.execute("DELETE FROM JudgingRooms;")
+        cur.executemany("INSERT INTO JudgingRooms VALUES (?, ?, ?);", [(room_id, info["current"], version) for room_id, info in judging.items()])
+        cur.executemany("INSERT INTO JudgingQueue (room_id, team_name, position) VALUES (?, ?, ?);",
+            [(room_id, team_name, position) for room_id, info in judging.items() for position, team_name in enumerate(info["teams"])]
+        )
+        seq = append_judging_event("start", None, {"judging": judging})
+    logging.info(f"Database: saved judging state for rooms {list(judging.keys())}")
+    return seq
+
+
+def load_judging():
+    '''
+    Get the stored judging state, in the format used by the Judging cog.
+    '''
+    judging = {}
+    cur.execute("SELECT room_id, current FROM JudgingRooms;")
+    for room_id, current in cur.fetchall():
+        judging[room_id] = {"teams": [], "current": current}
+
+    cur.execute("SELECT room_id, team_name FROM JudgingQueue ORDER BY room_id, position;")
+    for room_id, team_name in cur.fetchall():
+        judging[room_id]["teams"].append(team_name)
+
+    return judging
+
+
+def get_judging_versions():
+    '''
+    Get each room's version, as {room_id: version}. A room's version goes up by one with every change to it.
+    '''
+    cur.execute("SELECT room_id, version FROM JudgingRooms;")
+    return dict(cur.fetchall())
+
+
+def advance_judging_room(room_id: str, expected_version: int = None):
+    '''
+    Move a room's queue along by one team (what `tick` does). Returns the room's new `current`, and the seq
+    of the event logged. If `expected_version` is given and the room's version isn't that, nothing is changed
+    and None is returned.
+
+    The event records the team that went in (None once the room is finished), for judging telemetry.
+    '''
+    with con:
+        cur.execute("UPDATE JudgingRooms SET current = current + 1, version = version + 1 WHERE room_id = ? AND (? IS NULL OR version = ?);",
+            (room_id, expected_version, expected_version)
+        )
+        if cur.rowcount == 0:
+            logging.warning(f"Database: not advancing room {room_id}, it isn't at version {expected_version}")
+            return None
+        cur.execute("SELECT current FROM JudgingRooms WHERE room_id = ?;", (room_id,))
+        current = cur.fetchone()[0]
+        cur.execute("SELECT team_name FROM JudgingQueue WHERE room_id = ? ORDER BY position LIMIT 1 OFFSET ?;", (room_id, current))
+        team = cur.fetchone()
+        seq = append_judging_event("tick", room_id, {"team_name": team[0] if team != None else None})
+    return current, seq
+
+
+def skip_judging_team(room_id: str, index: int, expected_version: int = None):
+    '''
+    Move the team at `index` in a room's queue to the end of the queue, and record the skip (what `skip` does).
+    Returns the name of the skipped team, and the seq of the event logged. If `expected_version` is given and
+    the room's version isn't that, nothing is changed and None is returned.
+    '''
+    with con:
+        cur.execute("UPDATE JudgingRooms SET version = version + 1 WHERE room_id = ? AND (? IS NULL OR version = ?);",
+            (room_id, expected_version, expected_version)
+        )
+        if cur.rowcount == 0:
+            logging.warning(f"Database: not skipping in room {room_id}, it isn't at version {expected_version}")
+            return None
+
+        cur.execute("SELECT entry_id, team_name FROM JudgingQueue WHERE room_id = ? ORDER BY position LIMIT 1 OFFSET ?;", (room_id, index))
+        entry_id, team_name = cur.fetchone()
+
+        # positions only need to be in order, not contiguous, so only this one row has to change
+        cur.execute("UPDATE JudgingQueue SET position = (SELECT MAX(position) + 1 FROM JudgingQueue WHERE room_id = ?) WHERE entry_id = ?;", (room_id, entry_id))
+        cur.execute("INSERT INTO JudgingSkips (room_id, team_name, skipped_at) VALUES (?, ?, ?);", (room_id, team_name, time()))
+        seq = append_judging_event("skip", room_id, {"index": index, "team_name": team_name})
+
+    logging.info(f"Database: skipped {team_name} in room {room_id}")
+    return team_name, seq
+
+
+def record_judging_event(kind: str, room_id: str, data: dict):
+    '''
+    Log an event that doesn't change the queue (a `ping` or `vcpull`), for judging telemetry. Returns its seq.
+    '''
+    with con:
+        seq = append_judging_event(kind, room_id, data)
+    return seq
+
+
+def get_judging_skips(room_id: str):
+    '''
+    Get the skip history for a room, as (team_name, skipped_at) rows, oldest first.
+    '''
+    cur.execute("SELECT team_name, skipped_at FROM JudgingSkips WHERE room_id = ? ORDER BY skip_id;", (room_id,))
+    return cur.fetchall()
+
+
+def get_judging_events(after_seq: int = 0, limit: int = None):
+    '''
+    Get logged judging events with seq > after_seq, as (seq, kind, room_id, data, created_at) rows, oldest first.
+    '''
+    cur.execute("SELECT seq, kind, room_id, data, created_at FROM JudgingEvents WHERE seq > ? ORDER BY seq LIMIT ?;",
+        (after_seq, -1 if limit == None else limit)
+    )
+    return [(seq, kind, room_id, json.loads(data), created_at) for seq, kind, room_id, data, created_at in cur.fetchall()]
+
+
+def get_current_judging_events():
+    '''
+    Get the logged judging events since (and including) the start of the current judging scheme, in the same
+    format as get_judging_events.
+    '''
+    cur.execute("SELECT COALESCE(MAX(seq), 0) FROM JudgingEvents WHERE kind = 'start';")
+    return get_judging_events(after_seq=cur.fetchone()[0] - 1)
+
+
+def judging_state_at(seq: int):
+    '''
+    Rebuild the judging state as it was just after event `seq`, from the last checkpoint at or before it plus
+    the events since. Returns None if there's no checkpoint that early (i.e. judging hadn't started).
+    '''
+    cur.execute("SELECT seq, state FROM JudgingCheckpoints WHERE seq <= ? ORDER BY seq DESC LIMIT 1;", (seq,))
+    match = cur.fetchone()
+    if match == None:
+        return None
+    checkpoint_seq, state = match
+
+    cur.execute("SELECT kind, room_id, data FROM JudgingEvents WHERE seq > ? AND seq <= ? ORDER BY seq;", (checkpoint_seq, seq))
+    events = [(kind, room_id, json.loads(data)) for kind, room_id, data in cur.fetchall()]
+    return judging_state.replay(json.loads(state), events)
+
+
+def get_judging_board():
+    '''
+    Get the live judging board's message IDs, as {room_id: message_id}, for messages in the current public
+    judging log channel.
+    '''
+    cur.execute("SELECT room_id, message_id FROM JudgingBoard WHERE channel_id = ?;", (config['public_judging_log_channel_id'],))
+    return dict(cur.fetchall())
+
+
+def set_judging_board_message(room_id: str, channel_id: int, message_id: int):
+    cur.execute("INSERT OR REPLACE INTO JudgingBoard VALUES (?, ?, ?);", (room_id, channel_id, message_id))
+    con.commit()
+
+
+def remove_judging_board_message(room_id: str):
+    cur.execute("DELETE FROM JudgingBoard WHERE room_id = ?;", (room_id,))
+    con.commit()
+
+
+def last_judging_seq():
+    cur.execute("SELECT MAX(seq) FROM JudgingEvents;")
+    return cur.fetchone()[0] or 0
+
+
+# ===== scheduled jobs (see timers.py)
+
+def add_scheduled_job(kind: str, key: str, due: float, payload: dict):
+    '''
+    Store a pending job. Returns its job_id.
+    '''
+    cur.execute("INSERT INTO ScheduledJobs (kind, job_key, due, payload) VALUES (?, ?, ?, ?);", (kind, key, due, json.dumps(payload)))
+    con.commit()
+    return cur.lastrowid
+
+
+def set_scheduled_job_due(job_id: int, due: float):
+    cur.execute("UPDATE ScheduledJobs SET due = ? WHERE job_id = ?;", (due, job_id))
+    con.commit()
+
+
+def remove_scheduled_jobs(job_ids: list):
+    cur.executemany("DELETE FROM ScheduledJobs WHERE job_id = ?;", [(i,) for i in job_ids])
+    con.commit()
+
+
+def get_scheduled_jobs():
+    '''
+    Get all pending jobs, as (job_id, kind, key, due, payload) rows.
+    '''
+    cur.execute("SELECT job_id, kind, job_key, due, payload FROM ScheduledJobs ORDER BY due;")
+    return [(job_id, kind, key, due, json.loads(payload)) for job_id, kind, key, due, payload in cur.fetchall()]
@@ -6,7 +6,7 @@ from typing import Optional
 import logging
 import utils
 import json
-import database
+import async_database
 import re
 
 # setup
@@ -73,7 +73,7 @@ async def judging_signup(
         return
     
     # check run in a team's channel
-    team_name = database.team_from_text_channel(interaction.channel.id)
+    team_name = await async_database.team_from_text_channel(interaction.channel.id)
     logging.info(f"judging_signup: team {team_name} signing up")
     if team_name == None:
         logging.info(f"judging_signup: ignoring because channel_id not associated with team")
@@ -101,7 +101,7 @@ async def judging_signup(
     # order challenges in standard way
     # only unique, non-None challenges
     new_challenges = challenge_order(list(set([c.name for c in [challenge1, challenge2] if c != None])))
-    old_challenges = challenge_order(database.get_teams_challenges(team_name))
+    old_challenges = challenge_order(await async_database.get_teams_challenges(team_name))
     logging.info(f"judging_signup: old challenges: {old_challenges}, new_challenges: {new_challenges} before adding HackED")
 
     # info about old challenges
@@ -122,14 +122,14 @@ async def judging_signup(
     new_challenges.insert(0, challenge_data['main_challenge'])
     
     # can actually sign up for challenges yay
-    success = database.modify_team_challenges(team_name, new_challenges)
+    success = await async_database.modify_team_challenges(team_name, new_challenges)
     if not success:
         controller = await utils.get_controller(interaction.guild)
         await interaction.response.send_message(f"❌ Your team was not fully signed up for judging; something unknown went wrong. Paging {controller.mention}.")
         return
     
     # register medium pref, github/devpost links
-    success = database.modify_team_judging_info(team_name, medium_pref, github_link, devpost_link)
+    success = await async_database.modify_team_judging_info(team_name, medium_pref, github_link, devpost_link)
     if not success:
         controller = await utils.get_controller(interaction.guild)
         await interaction.response.send_message(f"❌ Your team was not fully signed up for judging; something unknown went wrong. Paging {controller.mention}.")
@@ -178,7 +178,7 @@ async def judging_withdraw(interaction: discord.Interaction):
         return
     
     # check run in a team's channel
-    team_name = database.team_from_text_channel(interaction.channel.id)
+    team_name = await async_database.team_from_text_channel(interaction.channel.id)
     logging.info(f"judging_withdraw: team {team_name} signing up")
     if team_name == None:
         logging.info(f"judging_withdraw: ignoring because channel_id not associated with team")
@@ -195,13 +195,13 @@ async def judging_withdraw(interaction: discord.Interaction):
         return
 
     # can actually sign up for challenges yay
-    success = database.modify_team_challenges(team_name, [])
+    success = await async_database.modify_team_challenges(team_name, [])
     if not success:
         await interaction.response.send_message(f"❌ Your team was not fully withdrawn from judging; something unknown went wrong. Paging {utils.get_controller(interaction.message.guild).mention}.")
         return
     
     # register medium pref, github/devpost links
-    success = database.modify_team_judging_info(team_name, None, None, None)
+    success = await async_database.modify_team_judging_info(team_name, None, None, None)
     if not success:
         await interaction.response.send_message(f"❌ Your team was not fully withdrawn from judging; something unknown went wrong. Paging {utils.get_controller(interaction.message.guild).mention}.")
         return
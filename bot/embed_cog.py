@@ -3,6 +3,7 @@ from discord.ext import commands
 from discord.utils import get as dget
 import logging
 import utils
+import api_scheduler
 import json
 
 args, config = utils.general_setup()
@@ -43,7 +44,7 @@ class Embed(commands.Cog):
 
         # edit the message
         embed_message = await channel.fetch_message(message_id)
-        await embed_message.edit(embed=embed)
+        await api_scheduler.bulk(("edit", channel.id), embed_message.edit(embed=embed))
         await ctx.message.add_reaction("✅")
 
 
@@ -60,7 +61,7 @@ class Embed(commands.Cog):
         embed = discord.Embed.from_dict(json.loads(contents.strip(), strict=False))
 
         # edit the message
-        await channel.send(embed=embed)
+        await api_scheduler.bulk(("send", channel.id), channel.send(embed=embed))
         await ctx.message.add_reaction("✅")
 
 
@@ -87,7 +88,7 @@ class Embed(commands.Cog):
 
         # edit the message
         embed_message = await channel.fetch_message(message_id)
-        await embed_message.edit(embed=embed)
+        await api_scheduler.bulk(("edit", channel.id), embed_message.edit(embed=embed))
         await ctx.message.add_reaction("✅")
 
 
@@ -113,5 +114,5 @@ class Embed(commands.Cog):
         embed = discord.Embed.from_dict(json.loads(contents.strip(), strict=False))
 
         # edit the message
-        await channel.send(embed=embed)
+        await api_scheduler.bulk(("send", channel.id), channel.send(embed=embed))
         await ctx.message.add_reaction("✅")
@@ -0,0 +1,178 @@
+'''
+This cog keeps an index of the server's channels, roles and members by ID and by name, so that looking up a
+team's artefacts doesn't mean scanning every channel/role/member in the server (which is what dget does).
+The index is built once the cog is loaded and kept up to date by the guild events below.
+'''
+
+import discord
+from discord.ext import commands
+from collections import defaultdict
+import logging
+import utils
+
+args, config = utils.general_setup()
+
+
+class GuildIndex:
+    def __init__(self):
+        self.guild = None
+        self.channels = {}
+        self.roles = {}
+        self.members = {}
+        self.channels_by_name = defaultdict(dict) # name -> {id: channel}, since categories/text/voice channels for a team share a name
+        self.roles_by_name = defaultdict(dict) # name -> {id: role}
+
+
+    def build(self, guild: discord.Guild):
+        self.guild = guild
+        self.channels, self.roles, self.members = {}, {}, {}
+        self.channels_by_name, self.roles_by_name = defaultdict(dict), defaultdict(dict)
+
+        for channel in guild.channels:
+            self.add_channel(channel)
+        for role in guild.roles:
+            self.add_role(role)
+        for member in guild.members:
+            self.add_member(member)
+
+        logging.info(f"GuildIndex: indexed {len(self.channels)} channels, {len(self.roles)} roles, {len(self.members)} members")
+
+
+    # ===== keeping the index current
+
+    def add_channel(self, channel):
+        self.channels[channel.id] = channel
+        self.channels_by_name[channel.name][channel.id] = channel
+
+    def remove_channel(self, channel):
+        self.channels.pop(channel.id, None)
+        self.channels_by_name[channel.name].pop(channel.id, None)
+
+    def add_role(self, role):
+        self.roles[role.id] = role
+        self.roles_by_name[role.name][role.id] = role
+
+    def remove_role(self, role):
+        self.roles.pop(role.id, None)
+        self.roles_by_name[role.name].pop(role.id, None)
+
+    def add_member(self, member):
+        self.members[member.id] = member
+
+    def remove_member(self, member):
+        self.members.pop(member.id, None)
+
+
+    # ===== lookups
+    # on a miss these fall back to the guild's own caches, in case an event was missed
+
+    def channel(self, channel_id):
+        if channel_id in self.channels:
+            return self.channels[channel_id]
+        if self.guild != None and (channel := self.guild.get_channel(channel_id)) != None:
+            self.add_channel(channel)
+            return channel
+        return None
+
+    def category(self, category_id):
+        channel = self.channel(category_id)
+        return channel if isinstance(channel, discord.CategoryChannel) else None
+
+    def role(self, role_id):
+        if role_id in self.roles:
+            return self.roles[role_id]
+        if self.guild != None and (role := self.guild.get_role(role_id)) != None:
+            self.add_role(role)
+            return role
+        return None
+
+    def member(self, member_id):
+        if member_id in self.members:
+            return self.members[member_id]
+        if self.guild != None and (member := self.guild.get_member(member_id)) != None:
+            self.add_member(member)
+            return member
+        return None
+
+    def channels_named(self, name, channel_type=None):
+        return [c for c in self.channels_by_name.get(name, {}).values() if channel_type == None or isinstance(c, channel_type)]
+
+    def category_named(self, name):
+        matches = self.channels_named(name, discord.CategoryChannel)
+        return matches[0] if matches else None
+
+    def role_named(self, name):
+        matches = list(self.roles_by_name.get(name, {}).values())
+        return matches[0] if matches else None
+
+    def name_taken(self, name):
+        '''
+        Check if any channel, category or role already has this name.
+        '''
+        return bool(self.channels_by_name.get(name)) or bool(self.roles_by_name.get(name))
+
+
+guild_index = GuildIndex()
+
+
+class Index(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        # cogs are added in on_ready, so the guild is already cached by now
+        guild = self.bot.get_guild(config['guild_id'])
+        if guild == None:
+            logging.error(f"Index: couldn't find guild {config['guild_id']} to index")
+            return
+        guild_index.build(guild)
+
+    def for_this_guild(self, obj):
+        return obj.guild.id == config['guild_id']
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        if self.for_this_guild(channel):
+            guild_index.add_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        if self.for_this_guild(channel):
+            guild_index.remove_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if self.for_this_guild(after):
+            guild_index.remove_channel(before)
+            guild_index.add_channel(after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        if self.for_this_guild(role):
+            guild_index.add_role(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        if self.for_this_guild(role):
+            guild_index.remove_role(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        if self.for_this_guild(after):
+            guild_index.remove_role(before)
+            guild_index.add_role(after)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        if self.for_this_guild(member):
+            guild_index.add_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        if self.for_this_guild(member):
+            guild_index.remove_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if self.for_this_guild(after):
+            guild_index.add_member(after)
@@ -0,0 +1,160 @@
+'''
+The live judging board: one pinned message per judging room in the public judging log channel, edited in place
+whenever that room's queue changes, instead of a new message with every room's queue on every change.
+
+* Only the room that changed is re-rendered, and if its render is the same as what's already posted (kept in
+  a cache) no edit is made at all.
+* Edits are debounced: a change marks the room dirty and the edit happens `judging_board_debounce` seconds
+  (default 2) later, so a burst of `tick`s for a room becomes a single edit showing the final state.
+* Long queues are cut down to fit in one message; judged teams are collapsed into a count, and only the next
+  few teams are listed.
+* Each listed team is shown with its predicted time to go in, from judging telemetry (see judging_telemetry.py).
+  These are rounded to the minute, so the message is only edited when a prediction moves by a minute or more.
+
+The board's message IDs are kept in the database, so the same messages are edited after a restart.
+'''
+
+import discord
+import asyncio
+import logging
+import utils
+import api_scheduler
+import async_database
+from index_cog import guild_index
+
+args, config = utils.general_setup()
+
+MAX_LENGTH = 1990 # discord's limit is 2000; a little padding
+
+
+def room_status(info):
+    if info["current"] < 0:
+        return "Not Started"
+    elif info["current"] < len(info["teams"]):
+        return "In Progress"
+    return "Done"
+
+
+def render_room(room_id: str, info: dict, upcoming: int = 15, etas: dict = None):
+    '''
+    Render one room's queue for the public board. Shows the current team and the next `upcoming` teams (with
+    their ETAs from `etas`, {team_name: unix time}, if given), with judged teams and the rest of the queue
+    summarised, and always fits in one message.
+    '''
+    teams, current = info["teams"], info["current"]
+    room_display_name = config["judging_rooms"][room_id]['display_name']
+
+    msg = f"### {room_display_name} `[{room_status(info)}]`\n"
+    msg += f"-# The team indicated by :scales: is the current team being judged (if any). If you are one of the next few teams, we encourage you to report to the front desk (for in-person team members) or your team VC (for online team members) in advance.\n"
+    if etas != None:
+        msg += f"-# Times are estimates based on how long teams have been taking in this room; be ready a few minutes early.\n"
+
+    judged = max(0, min(current, len(teams)))
+    if judged > 0:
+        msg += f"- :white_check_mark: {judged} team{'s' if judged != 1 else ''} judged\n"
+
+    if 0 <= current < len(teams):
+        msg += f"- `{teams[current]}` :scales:\n"
+
+    next_idx = max(current + 1, 0)
+    for team_name in teams[next_idx:next_idx + upcoming]:
+        line = f"- `{team_name}`\n"
+        if etas != None and team_name in etas:
+            line = f"- `{team_name}` ~<t:{int(etas[team_name] // 60 * 60)}:t>\n"
+        if len(msg) + len(line) > MAX_LENGTH - 40: # leave room for the summary line below
+            break
+        msg += line
+        next_idx += 1
+
+    remaining = len(teams) - next_idx
+    if remaining > 0:
+        msg += f"- *...and {remaining} more*\n"
+
+    return msg[:MAX_LENGTH]
+
+
+class JudgingBoard:
+    def __init__(self, get_judging, debounce: float = None, get_etas = None):
+        self.get_judging = get_judging # returns the Judging cog's queues, {room_id: JudgingQueue}
+        self.get_etas = get_etas # optional; room_id -> {team_name: unix time}
+        self.debounce = config.get("judging_board_debounce", 2) if debounce == None else debounce
+        self.messages = {} # room_id -> message_id
+        self.rendered = {} # room_id -> content currently posted
+        self.pending = {} # room_id -> task waiting to edit that room's message
+        self.edits = 0
+        self.skipped = 0 # renders that matched what was already posted
+
+    async def load(self):
+        self.messages = await async_database.get_judging_board()
+
+    def channel(self):
+        return guild_index.channel(config['public_judging_log_channel_id'])
+
+    def mark_dirty(self, *room_ids):
+        '''
+        Schedule an update of these rooms' messages. Rooms already waiting for an update aren't scheduled twice.
+        '''
+        for room_id in room_ids:
+            if room_id not in self.pending:
+                self.pending[room_id] = asyncio.create_task(self._update_later(room_id))
+
+    def mark_all_dirty(self):
+        self.mark_dirty(*set(self.get_judging().keys()) | set(self.messages.keys()))
+
+    async def _update_later(self, room_id):
+        try:
+            await asyncio.sleep(self.debounce)
+        finally:
+            # changes from here on need another update, since this one may have already rendered
+            self.pending.pop(room_id, None)
+
+        try:
+            await self.update(room_id)
+        except discord.HTTPException as e:
+            logging.error(f"JudgingBoard: couldn't update board for {room_id}", exc_info=e)
+
+    async def update(self, room_id):
+        '''
+        Render a room and edit its message, if the render changed. Creates and pins the message if there isn't one,
+        and deletes it if the room is no longer being judged.
+        '''
+        channel = self.channel()
+        queue = self.get_judging().get(room_id)
+
+        if queue == None:
+            # room isn't in the current judging scheme
+            if room_id in self.messages:
+                message = channel.get_partial_message(self.messages[room_id])
+                try:
+                    await api_scheduler.normal(("delete", channel.id), message.delete())
+                except discord.NotFound:
+                    pass
+                del self.messages[room_id]
+                self.rendered.pop(room_id, None)
+                await async_database.remove_judging_board_message(room_id)
+            return
+
+        etas = self.get_etas(room_id) if self.get_etas != None else None
+        content = render_room(room_id, queue.to_state(), etas=etas)
+        if self.rendered.get(room_id) == content:
+            self.skipped += 1
+            return
+
+        if room_id in self.messages:
+            message = channel.get_partial_message(self.messages[room_id]) # no fetch needed to edit
+            try:
+                await api_scheduler.normal(("edit", channel.id), message.edit(content=content))
+                self.rendered[room_id] = content
+                self.edits += 1
+                return
+            except discord.NotFound:
+                logging.warning(f"JudgingBoard: board message for {room_id} was deleted, sending a new one")
+
+        message = await api_scheduler.normal(("send", channel.id), channel.send(content))
+        self.messages[room_id] = message.id
+        self.rendered[room_id] = content
+        await async_database.set_judging_board_message(room_id, channel.id, message.id)
+        try:
+            await api_scheduler.normal(("pin", channel.id), message.pin())
+        except discord.HTTPException as e:
+            logging.warning(f"JudgingBoard: couldn't pin board message for {room_id}: {e}")
@@ -1,10 +1,10 @@
 import discord
 from discord.ext import commands
 from typing import Optional
-from discord.utils import get as dget
 import logging
 from datetime import datetime
 import utils
+import api_scheduler
 import random
 import os
 import json
@@ -14,21 +14,81 @@ from pprint import pformat
 import itertools
 import numpy as np
 import queuing
-from copy import deepcopy
-import database
+import async_database
+import judging_state
+from judging_board import JudgingBoard
+from room_executor import RoomExecutor
+from judging_queue import JudgingQueue
+from judging_telemetry import JudgingTelemetry, SLOT_SECONDS
+from timers import timers
+from index_cog import guild_index
 from time import time
 
 args, config = utils.general_setup()
 
+# reply for when a room's queue changes while a command for it is waiting for confirmation
+CONFLICT_MSG = "the queue for room `{}` changed while this command was waiting (someone else moved it). Check the queue with `~q` and rerun the command if it's still needed."
+
+# reminders for the team being judged, as (seconds relative to the end of its slot, stage)
+REMINDERS = [(-120, "ping"), (-60, "warn"), (0, "overtime")]
+
 
 class Judging(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.judging = {}
+        self.judging = {} # room_id -> JudgingQueue
 
         self.judging_medium_msg = None
         self.judging_category_msg = None
 
+        self.telemetry = JudgingTelemetry() # how long teams are taking in each room
+        self.board = JudgingBoard(lambda: self.judging, get_etas=self.etas) # live board in the public judging log
+        self.rooms = RoomExecutor() # serializes operations per room
+        timers.register("judging_reminder", self.send_reminder)
+
+
+    async def cog_load(self):
+        # pick up wherever judging was before the bot last stopped
+        self.judging = self.queues_from_state(await async_database.load_judging())
+        self.rooms.set_versions(await async_database.get_judging_versions())
+        self.telemetry.rebuild(await async_database.get_current_judging_events())
+        await self.board.load()
+        await timers.load() # reminders pending from before the restart
+        timers.start()
+        if self.judging:
+            logging.info(f"Judging: restored judging state for rooms {list(self.judging.keys())}")
+            self.board.mark_all_dirty()
+
+
+    def queues_from_state(self, judging):
+        return {room_id: JudgingQueue.from_state(info) for room_id, info in judging.items()}
+
+
+    def state(self):
+        '''
+        The judging state in the json format, {room_id: {"teams": [...], "current": int}}.
+        '''
+        return {room_id: queue.to_state() for room_id, queue in self.judging.items()}
+
+
+    def etas(self, room_id):
+        '''
+        Predicted times for the teams still to go in to a room, as {team_name: unix time}.
+        '''
+        return self.telemetry.room(room_id).etas(self.judging[room_id], time())
+
+
+    async def record_event(self, kind, room_id, team_name):
+        '''
+        Log a `ping` or `vcpull` of a team in a room's queue, for telemetry. Teams outside the queue are ignored.
+        '''
+        if room_id not in self.judging or team_name not in self.judging[room_id]:
+            return
+        data = {"team_name": team_name}
+        await async_database.record_judging_event(kind, room_id, data)
+        self.telemetry.observe(kind, room_id, data, time())
+        self.board.mark_dirty(room_id) # ETAs may have moved
+
 
     def now(self, code="T"):
         return f"<t:{int(time())}:{code}>"
@@ -41,15 +101,16 @@ class Judging(commands.Cog):
     def get_team_artefacts(self, ctx, team_name):
         try:
             logging.info(f"trying to get team artefacts for team={team_name}")
-            team_cat = dget(ctx.message.guild.categories, name=team_name)
+            team_cat = guild_index.category_named(team_name)
             logging.info(f"team_cat={team_cat}")
 
-            team_text = [c for c in team_cat.channels if type(c) == discord.TextChannel][0]
-            team_vc = [c for c in team_cat.channels if type(c) == discord.VoiceChannel][0]
+            # the team's channels share its name, so only a couple of channels need checking here
+            team_text = [c for c in guild_index.channels_named(team_name, discord.TextChannel) if c.category_id == team_cat.id][0]
+            team_vc = [c for c in guild_index.channels_named(team_name, discord.VoiceChannel) if c.category_id == team_cat.id][0]
             
-            team_role = dget(ctx.message.guild.roles, name=team_name)
+            team_role = guild_index.role_named(team_name)
 
-        except AttributeError as e:
+        except (AttributeError, IndexError) as e:
             logging.error(f"couldn't find artefacts for team {team_name}.")
             return None
 
@@ -65,7 +126,7 @@ class Judging(commands.Cog):
             msg += f"The team indicated by :scales: is the current team being judged (if any). The team after it is the team that will be pinged when `~ping <room_id>` is run.\n\n"
 
         if judging == None:
-            judging = self.judging
+            judging = self.state()
 
         if use_room_id != None:
             # print info for just a single room
@@ -105,61 +166,73 @@ class Judging(commands.Cog):
 
     
     async def get_judging_log(self, ctx):
-        channel = dget(ctx.message.guild.channels, id=config['private_judging_log_channel_id']) # get log channel
+        channel = guild_index.channel(config['private_judging_log_channel_id']) # get log channel
         return channel
 
-    
-    async def update_public_judging_log(self, ctx):
+
+    async def log_event(self, ctx, seq, kind, room_id, data, note=""):
         '''
-        Sends the current judging log to a public channel.
+        Post a one-line entry for a judging event to the private judging log. The full state at any event can be
+        rebuilt from the event log with `judging_at`, so there's no need to post it here.
         '''
-        channel = dget(ctx.message.guild.channels, id=config['public_judging_log_channel_id']) # get log channel
-        await channel.send(self.pprint_judging(public=True))
+        judging_log = await self.get_judging_log(ctx)
+        await judging_log.send(f"[{self.now()}] {judging_state.describe_event(seq, kind, room_id, data)}{note}")
+
 
     
-    async def set_team_timer(self, ctx, room_id):
-        '''
-        Starts a timer to repeatedly pester the bot controller when a team should be pinged. Assumes this command is
-        run right when the team starts presenting.
+    def reminder_key(self, room_id):
+        return f"judging:{room_id}"
+
 
-        Not used; easier to make timer the responsibility of the people in the room.
+    async def schedule_reminders(self, room_id):
         '''
-        controller = dget(ctx.guild.members, id=config["controller_id"])
-        room_channel = dget(ctx.guild.channels, id=config["judging_rooms"][room_id]["text"])
-        team_name = self.judging[room_id]["teams"][ self.judging[room_id]["current"] ]
-        
-        await room_channel.send(f"{controller.mention}, a timer has been started assuming `{team_name}` has just started presenting. Ping the next team so they are ready once `{team_name}` is done.")
-        
-        await asyncio.sleep(60 * 2) # ping them again after 2m
+        Replace a room's reminders with ones for the team that's just gone in: ping the next team 2 minutes before
+        its slot is up, warn at 1 minute, and say when it's over time. Run whenever a room's queue moves.
+        '''
+        await timers.cancel_key(self.reminder_key(room_id))
+        team_name = self.judging[room_id].current_team()
+        if team_name == None:
+            return # room hasn't started, or is finished
 
-        # if something changed, leave
-        if self.judging[room_id]["teams"][ self.judging[room_id]["current"] ] != team_name:
-            logging.info(f"team_timer: left because team `{team_name}` no longer being judged")
-            return
-        await room_channel.send(f"{controller.mention}, it's been **2** minutes since `{team_name}` started presenting. Ping the next team again so they are ready once `{team_name}` is done.")
+        slot_end = time() + SLOT_SECONDS
+        for offset, stage in REMINDERS:
+            await timers.schedule("judging_reminder", slot_end + offset, {"room_id": room_id, "team_name": team_name, "stage": stage}, key=self.reminder_key(room_id))
 
-        await asyncio.sleep(60 * 2) # after 4m, ping both them and the team after them
 
-        # if something changed, leave
-        if self.judging[room_id]["teams"][ self.judging[room_id]["current"] ] != team_name:
-            logging.info(f"team_timer: left because team `{team_name}` no longer being judged")
+    async def send_reminder(self, job):
+        '''
+        Handler for "judging_reminder" jobs; pesters the bot controller in the room's text channel.
+        '''
+        room_id, team_name, stage = job.payload["room_id"], job.payload["team_name"], job.payload["stage"]
+        if room_id not in self.judging or self.judging[room_id].current_team() != team_name:
+            logging.info(f"send_reminder: `{team_name}` no longer being judged in {room_id}, not sending {stage} reminder")
             return
-        await room_channel.send(f"{controller.mention}, it's been **4** minutes since `{team_name}` started presenting.\nIf the next team isn't ready, ping both them and the team after.")
 
-        await asyncio.sleep(60 * 1) # after 5m, allotted time is up
+        controller = guild_index.member(config["controller_id"])
+        room_channel = guild_index.channel(config["judging_rooms"][room_id]["text"])
+        next_team_name = self.judging[room_id].next_team()
 
-        if self.judging[room_id]["teams"][ self.judging[room_id]["current"] ] != team_name:
-            logging.info(f"team_timer: left because team `{team_name}` no longer being judged")
-            return
-        await room_channel.send(f"{controller.mention}, it's been **5** minutes since `{team_name}` started presenting, which means their time is up.\nWrap up the presentation, and if there's a team ready to go then send them in.")
+        if stage == "ping" and next_team_name != None:
+            msg = f"{controller.mention}, `{team_name}` has **2** minutes left. Ping the next team (`{next_team_name}`) so they are ready once `{team_name}` is done."
+        elif stage == "warn" and next_team_name != None:
+            msg = f"{controller.mention}, `{team_name}` has **1** minute left.\nIf the next team (`{next_team_name}`) isn't ready, ping both them and the team after."
+        elif stage == "overtime":
+            msg = f"{controller.mention}, `{team_name}`'s time is up.\nWrap up the presentation, and if there's a team ready to go then send them in."
+        else:
+            return # nobody left to ping
+
+        await api_scheduler.normal(("send", room_channel.id), room_channel.send(msg))
     
 
     @commands.command(help=f'''Automatically generate judging queues, based on the judging rooms defined in this bot's config and the reactions to the messages set using the `set_judging_react_messages` command. Restricted.
     
     Usage: {config['prefix']}make_template_queues <algorithm>
-    * algorithm : first_chal_match
+    Usage: {config['prefix']}make_template_queues search_match <seed>
+    * algorithm : first_chal_match, or balanced_match (spreads teams over the rooms they're eligible for so that rooms finish at about the same time, using each room's `minutes_per_team` and `capacity` from config)
+    * algorithm : timetable_match (books each team a time slot in every room it needs, including main judging, with no overlaps between a team's rooms; also sends each team's timetable)
+    * algorithm : search_match (tries thousands of random assignments and keeps the one with the best balance of judging time, room balance, sponsor room load and teams in their preferred room; the same seed gives the same result)
     ''')
-    async def make_template_queues(self, ctx, algorithm: str):
+    async def make_template_queues(self, ctx, algorithm: str, seed: Optional[int]):
         '''
         Automatically generate judging queues for judging rooms defined in config.json, based on the 
         reactions to messsages optionally provided.
@@ -186,43 +259,71 @@ class Judging(commands.Cog):
         try:
 
             # different algorithms use different information
+            summary, timetable = None, None
             if algorithm == "first_chal_match":
                 # get all the teams/challenge info from db
-                rooms, unchosen, unassigned = queuing.first_chal_match()
-
-                # make formatted judging dict
-                judging = {
-                    room_id: {
-                        "teams": rooms[room_id],
-                        "current": -1
-                    }
-                    for room_id in rooms.keys()
+                rooms, unchosen, unassigned = await async_database.run(queuing.first_chal_match) # queries the database
+                makespan = queuing.predicted_makespan(rooms)
+            elif algorithm == "balanced_match":
+                rooms, unchosen, unassigned, makespan = await async_database.run(queuing.balanced_match)
+            elif algorithm == "timetable_match":
+                rooms, timetable, unchosen, unassigned, makespan = await async_database.run(queuing.timetable_match)
+            elif algorithm == "search_match":
+                # the search runs in worker processes; don't hold up the database thread while it does
+                info = await async_database.get_all_challenge_info()
+                rooms, unchosen, unassigned, makespan, summary = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: queuing.search_match(info, seed=seed)
+                )
+            else:
+                await ctx.message.add_reaction("❌")
+                await ctx.reply("The only algorithms supported right now are: `first_chal_match`, `balanced_match`, `timetable_match`, `search_match`")
+                return
+
+            # make formatted judging dict
+            judging = {
+                room_id: {
+                    "teams": rooms[room_id],
+                    "current": -1
                 }
+                for room_id in rooms.keys()
+            }
 
-                # info about teams that didnt sign up
-                if unchosen:
-                    st = '\n'.join([f"- `{team_name}`" for team_name in unchosen])
-                    await ctx.reply("Teams that did not sign up for judging:\n" + st)
-                else:
-                    await ctx.reply("All teams have signed up for judging.")
+            # info about teams that didnt sign up
+            if unchosen:
+                st = '\n'.join([f"- `{team_name}`" for team_name in unchosen])
+                await ctx.reply("Teams that did not sign up for judging:\n" + st)
+            else:
+                await ctx.reply("All teams have signed up for judging.")
 
-                # info about teams that didnt get assigned a room
-                if unassigned:
-                    st = '\n'.join([f"- `{team_name}`" for team_name in unassigned])
-                    await ctx.reply("Teams that signed up for judging but the algorithm did not assign to a room (**these teams must be manually given a room**):\n" + st)
-                else:
-                    await ctx.reply("All teams that signed up for judging were successfully assigned a room.")
+            # info about teams that didnt get assigned a room
+            if unassigned:
+                st = '\n'.join([f"- `{team_name}`" for team_name in unassigned])
+                await ctx.reply("Teams that signed up for judging but the algorithm did not assign to a room (**these teams must be manually given a room**):\n" + st)
+            else:
+                await ctx.reply("All teams that signed up for judging were successfully assigned a room.")
 
-                # send info message
-                await ctx.reply("- `algorithm.log` is a log file for the algorithm used to sort teams into rooms.\n- `judging.json` is a template file to be used to start judging.\nCheck the log and previous messages to ensure all teams were assigned correctly (look for error messages), then modify the template file if necessary and use it to start judging with the `start_judging` command (be careful with that though).")
+            # how long each room should take
+            st = '\n'.join([f"- `{room_id}`: {len(rooms[room_id])} teams, about {minutes:.0f} min" for room_id, minutes in makespan.items()])
+            msg = f"Predicted judging time per room (longest {max(makespan.values(), default=0):.0f} min):\n" + st
+            if timetable != None:
+                multi = sum(1 for bookings in timetable.values() if len(bookings) > 1)
+                msg = f"{multi} teams are booked in more than one room, never at overlapping times. " + msg
+            await ctx.reply(msg)
 
-                await ctx.send(file=discord.File(queue_log_name, filename="algorithm.log"))
-                await utils.send_as_json(ctx, judging, save_with_tag="autoqueue", send_with_name="judging.json")
+            if summary != None:
+                best, scores = summary["best"], summary["scores"]
+                await ctx.reply(f"Searched {summary['candidates']} candidates with seed `{summary['seed']}`. Best: longest room {best['makespan']:.0f} min, room time std. dev. {best['balance']:.0f} min, longest sponsor room {best['sponsor_load']:.0f} min, {best['preferred']:.0%} of teams in a preferred room.\nScores (lower is better): best {scores['best']:.1f}, p10 {scores['p10']:.1f}, median {scores['median']:.1f}, p90 {scores['p90']:.1f}, worst {scores['worst']:.1f}.")
 
-            else:
-                await ctx.message.add_reaction("❌")
-                await ctx.reply("The only algorithms supported right now are: `first_chal_match`")
-                return
+            # send info message
+            files = "- `algorithm.log` is a log file for the algorithm used to sort teams into rooms.\n- `judging.json` is a template file to be used to start judging"
+            if timetable != None:
+                files += "; each room's queue is in the order of its time slots.\n- `timetable.json` has each team's slots, in minutes from the start of judging"
+            await ctx.reply(files + ".\nCheck the log and previous messages to ensure all teams were assigned correctly (look for error messages), then modify the template file if necessary and use it to start judging with the `start_judging` command (be careful with that though).")
+
+            await ctx.send(file=discord.File(queue_log_name, filename="algorithm.log"))
+            await utils.send_as_json(ctx, judging, save_with_tag="autoqueue", send_with_name="judging.json")
+            if timetable != None:
+                await utils.send_as_json(ctx, timetable, save_with_tag="timetable", send_with_name="timetable.json")
 
 
         except Exception as e:
@@ -274,7 +375,7 @@ class Judging(commands.Cog):
                 judging = json.loads(f.read())
 
             # get all teams for validation purposes
-            teams_info = database.get_all_challenge_info()
+            teams_info = await async_database.get_all_challenge_info()
             team_names = [team['team_name'] for team in teams_info]
 
             # some lazy validation. can't really check every possible issue here.
@@ -288,6 +389,8 @@ class Judging(commands.Cog):
                 for name in judging[room_id]["teams"]:
                     assert name in team_names, f"team name {name} in room id {room_id} does not exist"
 
+                JudgingQueue.from_state(judging[room_id]) # e.g. a team listed twice
+
         except (ValueError, AssertionError, KeyError) as e:
             # catch any issues, log them, and send to user
             logging.error(e)
@@ -295,6 +398,7 @@ class Judging(commands.Cog):
 
             await ctx.message.add_reaction("❌")
             await ctx.reply(f"Judging was not started; there's likely something wrong with your json. Make sure it matches the format of the output of `make_template_queues`.\nError message: `{e}`")
+            return
 
         # get confirmation
         msg = "This is the judging scheme that you are about to switch to. Verify it is correct, and then react to this message with ✅ to confirm, or ❌ to cancel.\n\n"
@@ -311,17 +415,22 @@ class Judging(commands.Cog):
             return
         
         # otherwise, we are good to go with this judging
-        self.judging = judging
+        async def start():
+            seq = await async_database.save_judging(judging)
+            self.judging = self.queues_from_state(judging)
+            self.telemetry.observe("start", None, {}, time())
+            self.rooms.set_versions(await async_database.get_judging_versions())
+            await timers.cancel_kind("judging_reminder") # for teams in the old scheme
+            return seq
+
+        # no other judging operation can run while the scheme is being replaced
+        seq = await self.rooms.run_exclusive(judging.keys(), start)
         await confirm_msg.reply(f"Judging started! ✨")
 
-        # send confirmation in judging log channel
-        msg = "Started new judging scheme.\n"
-        msg += self.pprint_judging(self.judging)
-        judging_log = await self.get_judging_log(ctx)
-        await judging_log.send(msg)
-        await self.send_as_json(judging_log, self.judging, filename="judging_breakdown.json")
+        # log in judging log channel
+        await self.log_event(ctx, seq, "start", None, {"judging": judging})
 
-        await self.update_public_judging_log(ctx) # and in public judging log
+        self.board.mark_all_dirty() # and on the public board
 
 
     @commands.command(help=f'''Pings the next team to be judged in a particular room. Restricted.
@@ -350,16 +459,17 @@ class Judging(commands.Cog):
             return
         
         logging.info(f"ping: run with room_id={room_id}")
+        version = None # only checked if the team comes from the queue
 
         if team_name == None:
             # check special cases where there is no team to ping
-            if self.judging[room_id]["current"] == len(self.judging[room_id]["teams"]) - 1:
+            if self.judging[room_id].current == len(self.judging[room_id]) - 1:
                 # this is being run while the current team being judged is last in the queue
                 logging.info(f"ping: run while final team being judged, not pinging anyone")
                 await ctx.message.add_reaction("❌")
                 await ctx.reply(f"Team was not pinged; the current team being judged is the final team in the queue.")
                 return
-            elif self.judging[room_id]["current"] > len(self.judging[room_id]["teams"]) - 1:
+            elif self.judging[room_id].current > len(self.judging[room_id]) - 1:
                 # this is being run after all teams have been judged
                 logging.info(f"ping: run once queue over, not pinging anyone")
                 await ctx.message.add_reaction("❌")
@@ -369,8 +479,8 @@ class Judging(commands.Cog):
             # otherwise, this is being run while a team that is not last in the queue is being judged (or no team is being judged, i.e. current == -1)
             # so we want to ping the team that comes after them
 
-            next_team_idx = self.judging[room_id]["current"] + 1
-            team_name = self.judging[room_id]["teams"][next_team_idx]
+            team_name = self.judging[room_id].next_team()
+            version = self.rooms.version(room_id)
 
             explain_msg = f"Team `{team_name}` is next in line for room `{room_id}` and will be pinged"
 
@@ -386,37 +496,66 @@ class Judging(commands.Cog):
             await confirm_msg.reply(f"Team was not pinged.")
             return
 
-        # get the team role and text channel. text channels have weird name restrictions so you need to get the
-        # category and then get the channel from that
-        ret = database.get_team_info(ctx.guild, team_name)
-        if any([ret[v] == None for v in ['team_text', 'team_vc', 'team_cat', 'team_role']]):
-            logging.error(f"couldn't get an item for `{team_name}`: {ret}")
-            await ctx.message.add_reaction("❌")
-            await ctx.reply(f"There was an issue getting the category or role for this team; you will need to handle them manually.")
-            return
+        async def ping_team():
+            # get the team role and text channel. text channels have weird name restrictions so you need to get the
+            # category and then get the channel from that
+            ret = await async_database.get_team_info(ctx.guild, team_name)
+            if any([ret[v] == None for v in ['team_text', 'team_vc', 'team_cat', 'team_role']]):
+                logging.error(f"couldn't get an item for `{team_name}`: {ret}")
+                await ctx.message.add_reaction("❌")
+                await ctx.reply(f"There was an issue getting the category or role for this team; you will need to handle them manually.")
+                return
         
-        team_role = ret['team_role']
-        team_cat = ret['team_cat']
-        team_text = ret['team_text']
-        team_vc = ret['team_vc']
+            team_role = ret['team_role']
+            team_cat = ret['team_cat']
+            team_text = ret['team_text']
+            team_vc = ret['team_vc']
         
-        # actually ping the team, and send instructions to involved humans
-        if config["judging_rooms"][room_id]["mediums"] == ["online"]:
-            await team_text.send(f"Hey {team_role.mention}, you're up next for judging! You are being judged **online**. Please join {team_vc.mention} as soon as possible, and when the judges are ready you will be moved to the judging room.")
+            # actually ping the team, and send instructions to involved humans
+            if config["judging_rooms"][room_id]["mediums"] == ["online"]:
+                await api_scheduler.critical(("send", team_text.id), team_text.send(f"Hey {team_role.mention}, you're up next for judging! You are being judged **online**. Please join {team_vc.mention} as soon as possible, and when the judges are ready you will be moved to the judging room."))
         
-        elif config["judging_rooms"][room_id]["mediums"] == ["in-person"]:
-            await team_text.send(f"Hey {team_role.mention}, you're up next for judging! You are being judged **in-person**. Please report to the front desk as soon as possible, from where you will be directed to your judging room.")
+            elif config["judging_rooms"][room_id]["mediums"] == ["in-person"]:
+                await api_scheduler.critical(("send", team_text.id), team_text.send(f"Hey {team_role.mention}, you're up next for judging! You are being judged **in-person**. Please report to the front desk as soon as possible, from where you will be directed to your judging room."))
         
-        else:
-            # hybrid room; this is all rooms atm
-            await team_text.send(f"Hey {team_role.mention}, you're up next for judging!\n- For in-person team members: please report to the front desk as soon as possible, from where you will be directed to your judging room.\n- For online team members: please join {team_vc.mention} as soon as possible, and when the judges are ready you will be moved to the judging room.")
+            else:
+                # hybrid room; this is all rooms atm
+                await api_scheduler.critical(("send", team_text.id), team_text.send(f"Hey {team_role.mention}, you're up next for judging!\n- For in-person team members: please report to the front desk as soon as possible, from where you will be directed to your judging room.\n- For online team members: please join {team_vc.mention} as soon as possible, and when the judges are ready you will be moved to the judging room."))
         
-        # send confirmation
-        # await ctx.message.add_reaction("✅") # react to original command
-        await ctx.message.reply(f"[{self.now()}] `{team_name}` was pinged in {team_text.mention}.")
+            # send confirmation
+            # await ctx.message.add_reaction("✅") # react to original command
+            try:
+                self.judging[room_id].mark_pinged(team_name)
+            except ValueError:
+                pass # already judged, or not in this room's queue
+            await self.record_event("ping", room_id, team_name)
+            await ctx.message.reply(f"[{self.now()}] `{team_name}` was pinged in {team_text.mention}.")
+
+        # the team has to still be next up, and stay so until it's been pinged
+        ok, _ = await self.rooms.run(room_id, version, ping_team, mutates=False)
+        if not ok:
+            await confirm_msg.reply("Team was not pinged; " + CONFLICT_MSG.format(room_id))
+
+
+    async def advance_room(self, room_id, version):
+        '''
+        Move a room's queue along by one, in the database and here. Run through self.rooms.
+        '''
+        ret = await async_database.advance_judging_room(room_id, version)
+        if ret == None:
+            return None
+        current, seq = ret
+        self.judging[room_id].tick()
+        self.telemetry.observe("tick", room_id, {"team_name": self.judging[room_id].current_team()}, time())
+        if self.judging[room_id].current != current:
+            logging.error(f"advance_room: {room_id} is at {self.judging[room_id].current} here but {current} in the database")
+        await self.schedule_reminders(room_id)
+        return seq
 
 
     @commands.command(help=f'''Moves the judging queue along for the room named `room_id` in the config. To be run once a team has been sent in. Restricted.
+
+    Once the team has gone in, the bot will remind the room to ping the next team 2 minutes before the team's time is up, again at 1 minute, and once its time is up (`judging_slot_seconds` in the config; default 5 minutes).
                       
     Usage: {config['prefix']}tick <room_id>''')
     async def tick(self, ctx, room_id: str):
@@ -439,30 +578,30 @@ class Judging(commands.Cog):
             return
         
         logging.info(f"tick: run with room_id={room_id}")
+        version = self.rooms.version(room_id)
 
         # check special cases where we can't move queue
-        if self.judging[room_id]["current"] == len(self.judging[room_id]["teams"]) - 1:
+        if self.judging[room_id].current == len(self.judging[room_id]) - 1:
             # this is being run while the final team is being judged
             logging.info(f"tick: final team is being judged in `{room_id}`, updating log")
             
-            self.judging[room_id]["current"] += 1 # current = len(teams) + 1
+            ok, seq = await self.rooms.run(room_id, version, lambda: self.advance_room(room_id, version)) # current = len(teams) + 1
+            if not ok:
+                await ctx.message.add_reaction("❌")
+                await ctx.reply("Queue was not moved; " + CONFLICT_MSG.format(room_id))
+                return
 
             # finished with this room
             await ctx.message.add_reaction("✅")
             await ctx.reply(f"All teams have now been judged for room `{room_id}`. ✨")
 
             # log change
-            judging_log = await self.get_judging_log(ctx)
-            msg = f"All teams have now been judged for room `{room_id}`."
-            msg += self.pprint_judging(self.judging)
-
-            await judging_log.send(msg)
-            await self.send_as_json(judging_log, self.judging, filename="judging_breakdown.json")
+            await self.log_event(ctx, seq, "tick", room_id, {}, note="; all teams have now been judged.")
 
-            await self.update_public_judging_log(ctx)
+            self.board.mark_dirty(room_id)
             return
         
-        elif self.judging[room_id]["current"] > len(self.judging[room_id]["teams"]) - 1:
+        elif self.judging[room_id].current > len(self.judging[room_id]) - 1:
             # this is being run after `tick` already run for final team
             logging.info(f"tick: `{room_id}` has no more participants to judge")
             await ctx.message.add_reaction("❌")
@@ -473,16 +612,13 @@ class Judging(commands.Cog):
         # such that 'current team' reflects the team currently being judged in the room, and 'next team' is the team that
         # we want to start pinging with `ping`.
 
-        team_idx = self.judging[room_id]["current"]
+        team_name = self.judging[room_id].current_team()
+        next_team_name = self.judging[room_id].next_team()
         
-        if team_idx == -1: 
+        if team_name == None: 
             # judging just started, no team is current yet
-            team_name = None
-            next_team_name = self.judging[room_id]["teams"][0]
             explain_msg = f"no team has been judged yet, and `{next_team_name}` is going in to be judged"
         else:
-            team_name = self.judging[room_id]["teams"][team_idx]
-            next_team_name = self.judging[room_id]["teams"][team_idx + 1]
             explain_msg = f"`{team_name}` has finished being judged, and `{next_team_name}` is going in to be judged"
 
         # get confirmation
@@ -495,34 +631,31 @@ class Judging(commands.Cog):
             return
         
         # else confirmed == True, move queue along
-        self.judging[room_id]["current"] += 1
+        ok, seq = await self.rooms.run(room_id, version, lambda: self.advance_room(room_id, version))
+        if not ok:
+            await confirm_msg.reply("Queue was not moved; " + CONFLICT_MSG.format(room_id))
+            return
 
         # get this judging channel
-        judging_vc = dget(ctx.guild.channels, id=config['judging_rooms'][room_id]['judging_vc'])
+        judging_vc = guild_index.channel(config['judging_rooms'][room_id]['judging_vc'])
 
         # send info to people in judging room
-        pretty_text = dget(ctx.guild.channels, id=config['judging_rooms'][room_id]['pretty'])
+        pretty_text = guild_index.channel(config['judging_rooms'][room_id]['pretty'])
         if pretty_text == None:
             logging.warning(f"Couldn't find pretty/judge-visible logging channel for {room_id}")
         else:
             # construct info about team to send to judges
-            msg = database.get_team_display(ctx, next_team_name)
-            info_msg = await pretty_text.send(f"This team is:\n" + msg + '\n')
-            await info_msg.edit(suppress=True) # remove embeds
-
-        # log progress and send new json
-        judging_log = await self.get_judging_log(ctx)
-        msg = f"Moved queue along for room `{room_id}`; {explain_msg}.\n"
-        msg += self.pprint_judging(self.judging)
+            msg = await async_database.get_team_display(ctx, next_team_name)
+            info_msg = await api_scheduler.critical(("send", pretty_text.id), pretty_text.send(f"This team is:\n" + msg + '\n'))
+            await api_scheduler.critical(("edit", pretty_text.id), info_msg.edit(suppress=True)) # remove embeds
 
-        await judging_log.send(msg)
-        await self.send_as_json(judging_log, self.judging, filename="judging_breakdown.json")
+        # log progress
+        await self.log_event(ctx, seq, "tick", room_id, {}, note=f"; {explain_msg}.")
 
         # await ctx.message.add_reaction("✅") # react to original command
         await confirm_msg.reply(f"[{self.now()}] Queue was moved. This means that {explain_msg}.")
 
-        await self.update_public_judging_log(ctx)
-        # await self.set_team_timer(ctx, room_id)
+        self.board.mark_dirty(room_id)
 
     
     @commands.command(help=f'''Skips the 'next team' in the judging queue for this room and shunts them to the end of the queue. The 'current team' remains unchanged. Restricted.
@@ -548,16 +681,17 @@ class Judging(commands.Cog):
             return
         
         logging.info(f"skip: run with room_id={room_id}")
+        version = self.rooms.version(room_id)
 
         # check special cases where we cannot skip
-        if self.judging[room_id]["current"] + 1 == len(self.judging[room_id]["teams"]):
+        if self.judging[room_id].current + 1 == len(self.judging[room_id]):
             # no reason to skip the final team! it will just like add them back to the end which makes no sense
             logging.info(f"skip: tried to skip final team in `{room_id}`, exiting")
             await ctx.message.add_reaction("❌")
             await ctx.reply(f"Running `skip` when the queue is at the final team doesn't make sense, they will just be added back to the queue in the same position! Use `next` if you want to clear this team from the queue without judging them.")
             return
         
-        elif self.judging[room_id]["current"] + 1 > len(self.judging[room_id]["teams"]):
+        elif self.judging[room_id].current + 1 > len(self.judging[room_id]):
             # this is being run after all teams judged, there is nobody to skip
             logging.info(f"tick: `{room_id}` has no more participants to judge")
             await ctx.message.add_reaction("❌")
@@ -568,21 +702,12 @@ class Judging(commands.Cog):
         # the queue so that 'current team' remains the same team, but 'current team + 1' now refers to the team after
         # this team, and appent this team to the end of the queue for later.
 
-        skip_team_idx = self.judging[room_id]["current"] + 1 # index of team to skip (next team)
-        skip_team_name = self.judging[room_id]["teams"][skip_team_idx]
-
-        # i know this is inefficient, this bot doesn't need to be running at maximum efficiency tbh
-        new_queue = deepcopy(self.judging[room_id]["teams"][:skip_team_idx]) \
-                    + deepcopy(self.judging[room_id]["teams"][skip_team_idx+1:]) \
-                    + [ self.judging[room_id]["teams"][skip_team_idx] ]
+        skip_team_idx = self.judging[room_id].current + 1 # index of team to skip (next team)
+        skip_team_name = self.judging[room_id].next_team()
 
-        # new_extra = deepcopy(self.judging[room_id]["extra"][:skip_team_idx]) \
-        #             + deepcopy(self.judging[room_id]["extra"][skip_team_idx+1:]) \
-        #             + [ self.judging[room_id]["extra"][skip_team_idx] + " (skipped)" ]
-
-        mock_judging = deepcopy(self.judging)
-        mock_judging[room_id]["teams"] = new_queue
-        # mock_judging[room_id]["extra"] = new_extra
+        # preview of just this room after the skip
+        mock_judging = {room_id: self.judging[room_id].to_state()}
+        judging_state.apply_event(mock_judging, "skip", room_id, {"index": skip_team_idx, "team_name": skip_team_name})
 
         # get confirmation
         msg = f"Team `{skip_team_name}` will be skipped and appended to the end of the queue. The team will be notified that they have been skipped. The new queue will look like this:\n"
@@ -598,20 +723,26 @@ class Judging(commands.Cog):
             return
         
         # else confirmed == True, continue with skipping team
-        self.judging = mock_judging
+        async def apply_skip():
+            ret = await async_database.skip_judging_team(room_id, skip_team_idx, version)
+            if ret == None:
+                return None
+            self.judging[room_id].skip_next()
+            self.telemetry.observe("skip", room_id, {"team_name": ret[0]}, time())
+            return ret[1]
 
-        # send new json
-        judging_log = await self.get_judging_log(ctx)
-        msg = f"Skipped team `{skip_team_name}` in room `{room_id}` and appended them to end of queue.\n"
-        msg += self.pprint_judging(self.judging, use_room_id=room_id)
+        ok, seq = await self.rooms.run(room_id, version, apply_skip)
+        if not ok:
+            await confirm_msg.reply("Team was not skipped; " + CONFLICT_MSG.format(room_id))
+            return
 
-        await judging_log.send(msg)
-        await self.send_as_json(judging_log, self.judging, filename="judging_breakdown.json")
+        # log change
+        await self.log_event(ctx, seq, "skip", room_id, {"index": skip_team_idx, "team_name": skip_team_name})
 
         # notify skipped team they have been skipped
 
         # get the team role and text channel        
-        ret = database.get_team_info(ctx.guild, skip_team_name)
+        ret = await async_database.get_team_info(ctx.guild, skip_team_name)
         if any([ret[v] == None for v in ['team_text', 'team_vc', 'team_cat', 'team_role']]):
             logging.error(f"couldn't get an item for `{skip_team_name}`: {ret}")
             await ctx.message.add_reaction("❌")
@@ -627,7 +758,7 @@ class Judging(commands.Cog):
         await ctx.message.add_reaction("✅") # react to original command
         await ctx.message.reply(f"Team {skip_team_name} was skipped.")
 
-        await self.update_public_judging_log(ctx)
+        self.board.mark_dirty(room_id)
 
 
     @commands.command(help=f'''Moves all participants in the waiting VC to the judging VC, for waiting/judging rooms associated with the text channel this command was run in. Also removes access to VC for all other teams, and gives access to this team. Restricted.
@@ -660,6 +791,7 @@ class Judging(commands.Cog):
             return
         
         logging.info(f"vcpull: called with room_id {room_id}")
+        version = None # only checked if the team comes from the queue
 
         # check special cases
         if team_name == None:
@@ -667,7 +799,7 @@ class Judging(commands.Cog):
                 await ctx.message.add_reaction("❌") # react to original command
                 await ctx.message.reply("You haven't specified a team, and there is no 'next team' in the judging queue because judging has not been started. Try specifying a team name.")
                 return
-            elif self.judging[room_id]["current"] + 1 == len(self.judging[room_id]["teams"]):
+            elif self.judging[room_id].current + 1 == len(self.judging[room_id]):
                 # this was called when the final team is already being judged, there is no next team to pull
                 await ctx.message.add_reaction("❌") # react to original command
                 await ctx.message.reply("There is no next team to pull into the VC. Make sure you specify the team name if you meant to pull a different team; run `~help vcpull` for more information.")
@@ -675,8 +807,8 @@ class Judging(commands.Cog):
             else:
                 # if a team name was specified, pull from their vc into the judging vc. if not, pull the next-up team (current + 1),
                 # because next-up team hasn't started presenting yet so they aren't in the vc yet
-                next_team_idx = self.judging[room_id]["current"] + 1
-                team_name = self.judging[room_id]["teams"][next_team_idx]
+                team_name = self.judging[room_id].next_team()
+                version = self.rooms.version(room_id)
 
         ret = self.get_team_artefacts(ctx, team_name)
         if ret == None:
@@ -685,14 +817,14 @@ class Judging(commands.Cog):
             await ctx.reply(f"There was an issue getting the category or role for this team; you will need to handle them manually.")
             return
 
-        ret = database.get_team_info(ctx.guild, team_name)
+        ret = await async_database.get_team_info(ctx.guild, team_name)
         if any([ret[v] == None for v in ['team_text', 'team_vc', 'team_cat', 'team_role']]):
             logging.error(f"couldn't get an item for `{next_team_name}`: {ret}")
             await ctx.message.add_reaction("❌")
             await ctx.reply(f"There was an issue getting the category or role for team {ret}; you will need to handle them manually.")
         # team_role, team_cat, team_text, team_vc = ret
 
-        judging_vc = dget(ctx.guild.channels, id=config["judging_rooms"][room_id]["judging_vc"])
+        judging_vc = guild_index.channel(config["judging_rooms"][room_id]["judging_vc"])
 
         member_ids = ret['team_vc'].voice_states.keys() # people in the team vc
 
@@ -705,24 +837,43 @@ class Judging(commands.Cog):
             await confirm_msg.reply("Participants were not moved.")
             return
 
-        # revoke permissions from all other teams to enter room
-        all_team_role_ids = database.get_all_team_role_ids()
-        logging.info(all_team_role_ids)
-        for member_or_role, overwrite in judging_vc.overwrites.items():
-            if str(member_or_role.id) in all_team_role_ids:
-                # remove overwrite
-                logging.info(f"removing VC perms from @{member_or_role}")
-                await judging_vc.set_permissions(dget(ctx.guild.roles, id=member_or_role.id), overwrite=None)
-
-        # give permissions to this team to enter room
-        await judging_vc.set_permissions(ret['team_role'], view_channel=True)
-
-        # move everyone into the judging_vc
-        for member_id in member_ids:
-            member = dget(ctx.guild.members, id=member_id)
-            await member.move_to(judging_vc)
-
-        await ctx.message.add_reaction("✅") # react to original command
+        async def pull_team():
+            # revoke permissions from all other teams to enter room
+            all_team_role_ids = set(await async_database.get_all_team_role_ids())
+            logging.info(all_team_role_ids)
+            permission_calls = []
+            for member_or_role, overwrite in judging_vc.overwrites.items():
+                if member_or_role.id in all_team_role_ids and member_or_role.id != ret['team_role'].id:
+                    # remove overwrite
+                    logging.info(f"removing VC perms from @{member_or_role}")
+                    permission_calls.append(judging_vc.set_permissions(guild_index.role(member_or_role.id), overwrite=None))
+
+            # give permissions to this team to enter room
+            permission_calls.append(judging_vc.set_permissions(ret['team_role'], view_channel=True))
+
+            # these are judging-critical, so they go ahead of any bulk work queued in the scheduler
+            await asyncio.gather(*[api_scheduler.critical(("permissions", judging_vc.id), call) for call in permission_calls])
+
+            # move everyone into the judging_vc
+            members = []
+            for member_id in member_ids:
+                member = guild_index.member(member_id)
+                if member == None:
+                    logging.warning(f"vcpull: couldn't find member {member_id} in {ret['team_vc']}, not moving them")
+                    continue
+                members.append(member)
+            await asyncio.gather(*[
+                api_scheduler.critical(("move", ctx.guild.id), member.move_to(judging_vc))
+                for member in members
+            ])
+
+            await self.record_event("vcpull", room_id, team_name)
+            await ctx.message.add_reaction("✅") # react to original command
+
+        # the team has to still be next up, and stay so until it's been pulled
+        ok, _ = await self.rooms.run(room_id, version, pull_team, mutates=False)
+        if not ok:
+            await confirm_msg.reply("Participants were not moved; " + CONFLICT_MSG.format(room_id))
 
 
     @commands.command(help=f'''Quickly prints the judging queue. Restricted.
@@ -740,7 +891,7 @@ class Judging(commands.Cog):
             return
         
         if room_id == None:
-            await ctx.send(self.pprint_judging(use_room_id=room_id))
+            await utils.send_lines(ctx, self.pprint_judging().split("\n"))
             return
         
         # otherwise, check room_id matches text channel run in
@@ -755,5 +906,91 @@ class Judging(commands.Cog):
             await ctx.reply(f"Queue was not moved; room ID `{room_id}` does not match the channel this command was run in. Ensure you run this command in the text channel associated with the judging room `{room_id}`.")
             return
 
-        await ctx.send(self.pprint_judging())
+        await utils.send_lines(ctx, self.pprint_judging(use_room_id=room_id).split("\n"))
+
+
+    @commands.command(help=f'''Gives the team currently being judged in a room extra time, pushing back its reminders (see `~help tick`). Restricted.
+    
+    Usage: {config['prefix']}extend <room_id> <minutes>
+
+    (The command must be run in the text channel matching <room_id>.)''')
+    async def extend(self, ctx, room_id: str, minutes: float):
+
+        if not utils.check_perms(ctx.message.author, config["perms"]["can_control_judging"]):
+            logging.info(f"extend: ignoring nonpermitted call by {ctx.message.author.name}")
+            return
+
+        if room_id not in self.judging.keys() or config["judging_rooms"][room_id]["text"] != ctx.channel.id:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"Time was not extended; room ID `{room_id}` either has no participants being judged in it, or does not match the channel this command was run in.")
+            return
+
+        jobs = timers.pending(key=self.reminder_key(room_id))
+        if jobs == []:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"Time was not extended; there are no reminders left for the team being judged in `{room_id}`.")
+            return
+
+        for job in jobs:
+            await timers.reschedule(job.job_id, job.due + minutes * 60)
+        await ctx.message.add_reaction("✅")
+        await ctx.reply(f"`{self.judging[room_id].current_team()}` was given {minutes:g} more minutes; their time is now up <t:{int(jobs[-1].due)}:R>.")
+
+
+    @commands.command(help=f'''Shows how long teams have been taking in each judging room (or just one room), how long teams take to turn up after being pinged, and how many pinged teams were no-shows. Restricted.
+    
+    Usage: {config['prefix']}judging_stats
+    Usage: {config['prefix']}judging_stats <room_id>''')
+    async def judging_stats(self, ctx, room_id: Optional[str]):
+
+        if not utils.check_perms(ctx.message.author, config["perms"]["can_control_judging"]):
+            logging.info(f"judging_stats: ignoring nonpermitted call by {ctx.message.author.name}")
+            return
+
+        if room_id != None and room_id not in self.judging.keys():
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"Room ID `{room_id}` either does not exist or has no participants being judged in it.")
+            return
+
+        lines = []
+        for r in ([room_id] if room_id != None else self.judging.keys()):
+            line = f"- `{r}`: {self.telemetry.room(r).describe()}."
+            etas = self.etas(r)
+            if etas:
+                line += f" Next team in ~<t:{int(min(etas.values()))}:R>, last team in ~<t:{int(max(etas.values()))}:R>."
+            lines.append(line)
+
+        if lines == []:
+            lines = ["Judging hasn't been started."]
+        await utils.send_lines(ctx, lines)
+
+
+    @commands.command(help=f'''Rebuilds the judging state as it was just after a particular event in the judging log (the `#<seq>` at the start of each log entry), and sends it as a json. Restricted.
+    
+    Usage: {config['prefix']}judging_at <seq>
+    Usage: {config['prefix']}judging_at latest''')
+    async def judging_at(self, ctx, seq: str):
+
+        if not utils.check_perms(ctx.message.author, config["perms"]["can_control_judging"]):
+            logging.info(f"judging_at: ignoring nonpermitted call by {ctx.message.author.name}")
+            return
+
+        if seq == "latest":
+            seq = await async_database.last_judging_seq()
+        elif seq.lstrip("#").isdigit():
+            seq = int(seq.lstrip("#"))
+        else:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"`{seq}` isn't an event number; run `~help judging_at` for more information.")
+            return
+
+        judging = await async_database.judging_state_at(seq)
+        if judging == None:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"Judging hadn't started as of event `#{seq}`.")
+            return
+
+        await ctx.reply(f"Judging as of event `#{seq}`:")
+        await utils.send_lines(ctx, self.pprint_judging(judging).split("\n"))
+        await self.send_as_json(ctx, judging, filename=f"judging_{seq}.json")
 
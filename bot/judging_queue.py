@@ -0,0 +1,266 @@
+'''
+The judging queue for one room, as a doubly linked list of teams.
+
+Judged teams stay in the list before the cursor (the team currently being judged), so the queue still reads
+as the whole order teams were/will be judged in. Skipping the next team to the end, moving a team, withdrawing
+a team and putting it back are all O(1), since they only relink a couple of entries; with a plain list each of
+these has to shift (or, as `skip` used to, copy) every team after it.
+
+Each team also has a record of where it's at: waiting, pinged, judged or withdrawn, and how often it has been
+skipped.
+
+The queue converts to and from the {"teams": [...], "current": int} format used for the json files, the
+database and the event log, where `current` is the index of the team being judged (-1 before the first team
+has gone in, len(teams) once every team has).
+'''
+
+WAITING = "waiting"
+PINGED = "pinged"
+JUDGING = "judging"
+JUDGED = "judged"
+WITHDRAWN = "withdrawn"
+
+
+class Entry:
+    __slots__ = ("team_name", "status", "skips", "prev", "next")
+
+    def __init__(self, team_name):
+        self.team_name = team_name
+        self.status = WAITING
+        self.skips = 0
+        self.prev = None
+        self.next = None
+
+    def record(self):
+        return {"team_name": self.team_name, "status": self.status, "skips": self.skips}
+
+
+class JudgingQueue:
+    def __init__(self):
+        self.head = None
+        self.tail = None
+        self.entries = {} # team_name -> Entry, including withdrawn teams
+        self.size = 0 # teams in the queue (not withdrawn)
+        self.cursor = None # entry currently being judged; None before judging starts, or once it's done
+        self.last_judged = None # the judged team closest to the cursor
+        self.judged = 0 # judged teams are always at the front, so this is also the cursor's index
+        self.started = False
+
+
+    # ===== conversion
+
+    @classmethod
+    def from_state(cls, state: dict):
+        '''
+        Build a queue from the json format. Raises ValueError if a team is in it more than once.
+        '''
+        queue = cls()
+        for team_name in state["teams"]:
+            queue.append(team_name)
+
+        entry = queue.head
+        for i in range(min(state["current"], queue.size)):
+            entry.status = JUDGED
+            queue.last_judged = entry
+            queue.judged += 1
+            entry = entry.next
+        queue.started = state["current"] >= 0
+        if queue.started and entry != None:
+            queue.cursor = entry
+            entry.status = JUDGING
+        return queue
+
+    def to_state(self):
+        return {"teams": self.teams(), "current": self.current}
+
+    def teams(self):
+        return [entry.team_name for entry in self]
+
+
+    # ===== lookups
+
+    @property
+    def current(self):
+        '''
+        Index of the team being judged, as in the json format.
+        '''
+        return self.judged if self.started else -1
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        entry = self.head
+        while entry != None:
+            yield entry
+            entry = entry.next
+
+    def __contains__(self, team_name):
+        entry = self.entries.get(team_name)
+        return entry != None and entry.status != WITHDRAWN
+
+    def status(self, team_name):
+        return self.entries[team_name].record()
+
+    def current_team(self):
+        return self.cursor.team_name if self.cursor != None else None
+
+    def _next_entry(self):
+        if self.cursor != None:
+            return self.cursor.next
+        return self.head if self.last_judged == None else self.last_judged.next
+
+    def next_team(self):
+        '''
+        The team that will go in next (the one `ping` pings), or None if there isn't one.
+        '''
+        entry = self._next_entry()
+        return entry.team_name if entry != None else None
+
+    def upcoming(self):
+        '''
+        Names of the teams still to go in, in order.
+        '''
+        entry = self._next_entry()
+        while entry != None:
+            yield entry.team_name
+            entry = entry.next
+
+    def position(self, team_name):
+        '''
+        Index of a team in the queue. O(n); only for display.
+        '''
+        for i, entry in enumerate(self):
+            if entry.team_name == team_name:
+                return i
+        raise KeyError(team_name)
+
+
+    # ===== linking
+
+    def _link_after(self, anchor, entry):
+        '''
+        Link `entry` in after `anchor` (or at the front, if anchor is None).
+        '''
+        entry.prev = anchor
+        entry.next = self.head if anchor == None else anchor.next
+        if entry.next != None:
+            entry.next.prev = entry
+        else:
+            self.tail = entry
+        if anchor != None:
+            anchor.next = entry
+        else:
+            self.head = entry
+        self.entries[entry.team_name] = entry
+        self.size += 1
+
+    def _unlink(self, entry):
+        if entry.prev != None:
+            entry.prev.next = entry.next
+        else:
+            self.head = entry.next
+        if entry.next != None:
+            entry.next.prev = entry.prev
+        else:
+            self.tail = entry.prev
+        entry.prev = entry.next = None
+        self.size -= 1
+
+    def _can_follow(self, anchor):
+        '''
+        Whether a waiting team can be linked in after `anchor` without landing among the judged teams. Nothing can
+        be linked in after the final judged team once every team has gone in: the json format has no way to say
+        a room is done except `current == len(teams)`, so the new team would read back as being judged.
+        '''
+        if anchor == None:
+            return not self.started
+        return anchor.status not in [WITHDRAWN, JUDGED]
+
+    def _waiting_entry(self, team_name):
+        entry = self.entries.get(team_name)
+        if entry == None or entry.status in [WITHDRAWN, JUDGED, JUDGING]:
+            raise ValueError(f"{team_name} isn't waiting in the queue")
+        return entry
+
+
+    # ===== operations
+
+    def append(self, team_name):
+        if team_name in self.entries:
+            raise ValueError(f"{team_name} is already in the queue")
+        if not self._can_follow(self.tail):
+            raise ValueError(f"every team has already gone in, so {team_name} can't be added")
+        entry = Entry(team_name)
+        self._link_after(self.tail, entry)
+        return entry
+
+    def tick(self):
+        '''
+        The next team goes in to be judged. Returns the new `current`.
+        '''
+        following = self._next_entry()
+        if self.cursor != None:
+            self.cursor.status = JUDGED
+            self.last_judged = self.cursor
+            self.judged += 1
+        self.cursor = following
+        self.started = True
+        if self.cursor != None:
+            self.cursor.status = JUDGING
+        return self.current
+
+    def mark_pinged(self, team_name):
+        entry = self._waiting_entry(team_name)
+        entry.status = PINGED
+
+    def skip_next(self):
+        '''
+        Move the next team to the end of the queue. Returns its name.
+        '''
+        entry = self._next_entry()
+        if entry == None or entry is self.tail:
+            raise ValueError("there is no next team to skip, or it's already last")
+        self._unlink(entry)
+        self._link_after(self.tail, entry)
+        entry.status = WAITING
+        entry.skips += 1
+        return entry.team_name
+
+    def move_after(self, team_name, anchor_name=None):
+        '''
+        Move a waiting team to just after `anchor_name`, or to be the next team if anchor_name is None.
+        The anchor can't be a team that's already been judged.
+        '''
+        entry = self._waiting_entry(team_name)
+        if anchor_name == None:
+            anchor = self.cursor if self.cursor != None else self.last_judged
+        else:
+            anchor = self.entries[anchor_name]
+        if anchor is entry:
+            return
+        if not self._can_follow(anchor):
+            raise ValueError(f"can't move {team_name} there")
+        self._unlink(entry)
+        self._link_after(anchor, entry)
+
+    def withdraw(self, team_name):
+        '''
+        Take a waiting team out of the queue. Its record is kept, so it can be put back with `reinsert`.
+        '''
+        entry = self._waiting_entry(team_name)
+        self._unlink(entry)
+        entry.status = WITHDRAWN
+
+    def reinsert(self, team_name, anchor_name=None):
+        '''
+        Put a withdrawn team back in the queue, at the end or just after `anchor_name`.
+        '''
+        entry = self.entries.get(team_name)
+        if entry == None or entry.status != WITHDRAWN:
+            raise ValueError(f"{team_name} hasn't been withdrawn")
+        anchor = self.tail if anchor_name == None else self.entries[anchor_name]
+        if not self._can_follow(anchor):
+            raise ValueError(f"can't put {team_name} back there")
+        entry.status = WAITING
+        self._link_after(anchor, entry)
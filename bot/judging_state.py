@@ -0,0 +1,71 @@
+'''
+The judging event log, and how to replay it.
+
+Every change to judging is recorded as an event in the JudgingEvents table (see database.py), rather than by
+posting a snapshot of the whole judging state after each action. Every so often the state is also saved as a
+checkpoint, so the state at any point can be rebuilt by taking the last checkpoint before it and replaying
+only the events since.
+
+Judging state is in the format used by the Judging cog: {room_id: {"teams": [...], "current": int}}.
+
+Events are (kind, room_id, data):
+* ("start", None, {"judging": state}) : a new judging scheme was started
+* ("tick", room_id, {"team_name": name}) : the room's queue was moved along by one team, and `name` went in
+  (None once the room is finished; older logs have no team_name)
+* ("skip", room_id, {"index": i, "team_name": name}) : the team at index i was moved to the end of the queue
+* ("ping", room_id, {"team_name": name}), ("vcpull", room_id, {"team_name": name}) : a team was pinged, or
+  pulled into the judging VC. These don't change the queue; they're only logged for judging telemetry
+'''
+
+from copy import deepcopy
+
+
+def apply_event(judging: dict, kind: str, room_id: str, data: dict):
+    '''
+    Apply one event to a judging state, in place.
+    '''
+    if kind == "start":
+        judging.clear()
+        judging.update(deepcopy(data["judging"]))
+
+    elif kind == "tick":
+        judging[room_id]["current"] += 1
+
+    elif kind == "skip":
+        teams = judging[room_id]["teams"]
+        assert teams[data["index"]] == data["team_name"], f"replaying skip: expected {data['team_name']} at index {data['index']} in {room_id}, found {teams[data['index']]}"
+        teams.append(teams.pop(data["index"]))
+
+    elif kind in ["ping", "vcpull"]:
+        pass
+
+    else:
+        raise ValueError(f"unknown judging event kind {kind}")
+
+
+def replay(checkpoint: dict, events: list):
+    '''
+    Rebuild a judging state from a checkpoint and the (kind, room_id, data) events after it, in order.
+    '''
+    judging = deepcopy(checkpoint)
+    for kind, room_id, data in events:
+        apply_event(judging, kind, room_id, data)
+    return judging
+
+
+def describe_event(seq: int, kind: str, room_id: str, data: dict):
+    '''
+    A one-line description of an event, for the judging log.
+    '''
+    if kind == "start":
+        rooms = data["judging"]
+        return f"`#{seq}` started judging: " + ", ".join(f"`{r}` ({len(info['teams'])} teams)" for r, info in rooms.items())
+    elif kind == "tick":
+        return f"`#{seq}` `{room_id}`: queue moved along"
+    elif kind == "skip":
+        return f"`#{seq}` `{room_id}`: skipped `{data['team_name']}` to the end of the queue"
+    elif kind == "ping":
+        return f"`#{seq}` `{room_id}`: pinged `{data['team_name']}`"
+    elif kind == "vcpull":
+        return f"`#{seq}` `{room_id}`: pulled `{data['team_name']}` into the judging VC"
+    return f"`#{seq}` `{room_id}`: {kind} {data}"
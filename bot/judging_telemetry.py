@@ -0,0 +1,136 @@
+'''
+Judging telemetry: how long teams actually take in each room, and when each queued team can expect to go in.
+
+Built from the judging event log (see judging_state.py), which timestamps every `ping`, `vcpull`, `tick` and
+`skip`; so it's rebuilt from the database on startup like the rest of judging. For each room it keeps, over
+the last `judging_telemetry_window` teams (default 20):
+
+* time per team: from one `tick` to the next, i.e. the presentation plus the changeover to the next team.
+* response time: from a team's first `ping` to it being pulled into the judging VC (or going in, if it never
+  was pulled).
+* no-show rate: of the teams pinged, the fraction that were skipped instead of going in.
+
+Until a room has timed any teams, time per team is taken to be the slot each team is allotted,
+`judging_slot_seconds` (default 5 minutes).
+'''
+
+from collections import deque
+import numpy as np
+import utils
+
+args, config = utils.general_setup()
+
+WINDOW = config.get("judging_telemetry_window", 20)
+SLOT_SECONDS = config.get("judging_slot_seconds", 5 * 60) # time allotted to each team
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+
+class RoomTelemetry:
+    def __init__(self):
+        self.durations = deque(maxlen=WINDOW) # seconds per team, tick to tick
+        self.responses = deque(maxlen=WINDOW) # seconds from ping to vcpull/going in
+        self.outcomes = deque(maxlen=WINDOW) # True if a pinged team went in, False if it was skipped
+        self.pinged = {} # team_name -> time of first ping, for teams pinged that haven't gone in or been skipped
+        self.responded = set() # pinged teams that have already been pulled in
+        self.current_team = None
+        self.started_at = None # when current_team went in
+
+    def observe(self, kind, data, at):
+        team_name = data.get("team_name")
+
+        if kind == "ping":
+            self.pinged.setdefault(team_name, at)
+
+        elif kind == "vcpull":
+            if team_name in self.pinged and team_name not in self.responded:
+                self.responses.append(at - self.pinged[team_name])
+                self.responded.add(team_name)
+
+        elif kind == "tick":
+            if self.started_at != None:
+                self.durations.append(at - self.started_at)
+            if team_name in self.pinged:
+                if team_name not in self.responded:
+                    self.responses.append(at - self.pinged[team_name])
+                self.outcomes.append(True)
+                del self.pinged[team_name]
+                self.responded.discard(team_name)
+            self.current_team = team_name
+            self.started_at = at if team_name != None else None
+
+        elif kind == "skip":
+            if team_name in self.pinged:
+                self.outcomes.append(False)
+                del self.pinged[team_name]
+                self.responded.discard(team_name)
+
+
+    # ===== statistics
+
+    def mean(self):
+        return float(np.mean(self.durations)) if self.durations else SLOT_SECONDS
+
+    def p90(self):
+        return float(np.percentile(self.durations, 90)) if self.durations else None
+
+    def mean_response(self):
+        return float(np.mean(self.responses)) if self.responses else None
+
+    def no_show_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def etas(self, queue, now):
+        '''
+        Predict when each team still to go in will go in, as {team_name: unix time}. The current team is given
+        the rest of the mean time per team (none if it's already over), and each team ahead of a team adds the
+        mean time per team, discounted by the no-show rate since a no-show is skipped rather than judged.
+        '''
+        per_team = self.mean()
+        eta = now
+        if self.started_at != None and queue.current_team() != None:
+            eta += max(per_team - (now - self.started_at), 0)
+
+        etas = {}
+        for team_name in queue.upcoming():
+            etas[team_name] = eta
+            eta += per_team * (1 - self.no_show_rate())
+        return etas
+
+    def describe(self):
+        if not self.durations:
+            msg = f"no teams timed yet (assuming {format_duration(self.mean())} per team)"
+        else:
+            msg = f"{len(self.durations)} teams timed, mean {format_duration(self.mean())}, p90 {format_duration(self.p90())} per team"
+        if self.responses:
+            msg += f"; teams go in {format_duration(self.mean_response())} after being pinged on average"
+        if self.outcomes:
+            msg += f"; {self.no_show_rate():.0%} of pinged teams were no-shows"
+        return msg
+
+
+class JudgingTelemetry:
+    def __init__(self):
+        self.rooms = {} # room_id -> RoomTelemetry
+
+    def room(self, room_id):
+        if room_id not in self.rooms:
+            self.rooms[room_id] = RoomTelemetry()
+        return self.rooms[room_id]
+
+    def observe(self, kind, room_id, data, at):
+        if kind == "start":
+            self.rooms = {} # times from the previous scheme don't carry over
+        else:
+            self.room(room_id).observe(kind, data, at)
+
+    def rebuild(self, events):
+        '''
+        Replay (seq, kind, room_id, data, created_at) events, as from database.get_current_judging_events.
+        '''
+        self.rooms = {}
+        for seq, kind, room_id, data, created_at in events:
+            self.observe(kind, room_id, data, created_at)
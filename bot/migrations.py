@@ -0,0 +1,221 @@
+'''
+Versioned schema migrations for the bot's sqlite3 database.
+
+The schema version is kept in `PRAGMA user_version`. Each migration is applied in its own transaction,
+so a database can be upgraded in place (even mid-event) and is never left half-migrated. database.py
+applies any pending migrations when the bot starts; to upgrade a database by hand (this takes a backup
+first), run from this directory:
+
+    python migrations.py -c <config>
+
+To add a migration, append to MIGRATIONS with the next version number, and update schema.sql to match.
+'''
+
+import sqlite3
+import logging
+import utils
+
+MIGRATIONS = [
+    (1, "baseline schema", '''
+        CREATE TABLE IF NOT EXISTS Participants(
+            email      CHAR(100),
+            first_name CHAR(100),
+            last_name  CHAR(100),
+            discord_id CHAR(20),
+            team_name  CHAR(100),
+            PRIMARY KEY (email),
+            FOREIGN KEY (team_name) REFERENCES Teams
+        );
+
+        CREATE TABLE IF NOT EXISTS Teams(
+            team_name   CHAR(100),
+            channel_id  CHAR(20),
+            voice_id    CHAR(20),
+            category_id CHAR(20),
+            role_id     CHAR(20),
+            medium_pref CHAR(20),
+            github_link CHAR(200),
+            devpost_link CHAR(200),
+            PRIMARY KEY (team_name)
+        );
+
+        CREATE TABLE IF NOT EXISTS Challenges(
+            challenge_name CHAR(100),
+            team_name      CHAR(100),
+            PRIMARY KEY (challenge_name, team_name),
+            FOREIGN KEY (team_name) REFERENCES Teams
+        );
+    '''),
+
+    (2, "store snowflakes as INTEGER", '''
+        CREATE TABLE Participants_new(
+            email      CHAR(100),
+            first_name CHAR(100),
+            last_name  CHAR(100),
+            discord_id INTEGER,
+            team_name  CHAR(100),
+            PRIMARY KEY (email),
+            FOREIGN KEY (team_name) REFERENCES Teams
+        );
+        INSERT INTO Participants_new
+            SELECT email, first_name, last_name, CAST(discord_id AS INTEGER), team_name FROM Participants;
+        DROP TABLE Participants;
+        ALTER TABLE Participants_new RENAME TO Participants;
+
+        CREATE TABLE Teams_new(
+            team_name   CHAR(100),
+            channel_id  INTEGER,
+            voice_id    INTEGER,
+            category_id INTEGER,
+            role_id     INTEGER,
+            medium_pref CHAR(20),
+            github_link CHAR(200),
+            devpost_link CHAR(200),
+            PRIMARY KEY (team_name)
+        );
+        INSERT INTO Teams_new
+            SELECT team_name, CAST(channel_id AS INTEGER), CAST(voice_id AS INTEGER), CAST(category_id AS INTEGER),
+                CAST(role_id AS INTEGER), medium_pref, github_link, devpost_link FROM Teams;
+        DROP TABLE Teams;
+        ALTER TABLE Teams_new RENAME TO Teams;
+    '''),
+
+    (3, "index lookup columns", '''
+        CREATE INDEX IF NOT EXISTS participants_discord_id ON Participants(discord_id);
+        CREATE INDEX IF NOT EXISTS participants_team_name ON Participants(team_name);
+        CREATE INDEX IF NOT EXISTS teams_channel_id ON Teams(channel_id);
+        CREATE INDEX IF NOT EXISTS teams_voice_id ON Teams(voice_id);
+        CREATE INDEX IF NOT EXISTS teams_category_id ON Teams(category_id);
+        CREATE INDEX IF NOT EXISTS teams_role_id ON Teams(role_id);
+        CREATE INDEX IF NOT EXISTS challenges_team_name ON Challenges(team_name);
+    '''),
+
+    (4, "queue of registration sheet writes", '''
+        CREATE TABLE IF NOT EXISTS SheetUpdates(
+            update_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cell      CHAR(20),
+            value     CHAR(100),
+            queued_at REAL
+        );
+    '''),
+
+    (5, "persistent judging state", '''
+        CREATE TABLE IF NOT EXISTS JudgingRooms(
+            room_id CHAR(100),
+            current INTEGER,
+            version INTEGER,
+            PRIMARY KEY (room_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS JudgingQueue(
+            entry_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_id   CHAR(100),
+            team_name CHAR(100),
+            position  INTEGER,
+            FOREIGN KEY (room_id) REFERENCES JudgingRooms
+        );
+        CREATE INDEX IF NOT EXISTS judgingqueue_room_position ON JudgingQueue(room_id, position);
+
+        CREATE TABLE IF NOT EXISTS JudgingSkips(
+            skip_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_id    CHAR(100),
+            team_name  CHAR(100),
+            skipped_at REAL,
+            FOREIGN KEY (room_id) REFERENCES JudgingRooms
+        );
+    '''),
+
+    (6, "judging event log and checkpoints", '''
+        CREATE TABLE IF NOT EXISTS JudgingEvents(
+            seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind       CHAR(20),
+            room_id    CHAR(100),
+            data       TEXT,
+            created_at REAL
+        );
+
+        CREATE TABLE IF NOT EXISTS JudgingCheckpoints(
+            seq        INTEGER,
+            state      TEXT,
+            created_at REAL,
+            PRIMARY KEY (seq)
+        );
+    '''),
+
+    (7, "live judging board messages", '''
+        CREATE TABLE IF NOT EXISTS JudgingBoard(
+            room_id    CHAR(100),
+            channel_id INTEGER,
+            message_id INTEGER,
+            PRIMARY KEY (room_id)
+        );
+    '''),
+    (8, "scheduled jobs for the timer service", '''
+        CREATE TABLE IF NOT EXISTS ScheduledJobs(
+            job_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind       CHAR(50),
+            job_key    CHAR(100),
+            due        REAL,
+            payload    TEXT
+        );
+        CREATE INDEX IF NOT EXISTS scheduledjobs_job_key ON ScheduledJobs(job_key);
+    '''),
+]
+
+
+def current_version(con: sqlite3.Connection):
+    return con.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def upgrade(con: sqlite3.Connection):
+    '''
+    Apply every migration newer than the database's current version. Returns the new version.
+    '''
+    version = current_version(con)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        return version
+
+    # tables are rebuilt by some migrations, which would trip foreign key checks partway through.
+    # this pragma can't be changed inside a transaction, so it's done around all of them
+    con.commit()
+    con.execute("PRAGMA foreign_keys = OFF;")
+
+    try:
+        for number, description, sql in pending:
+            logging.info(f"migrations: applying {number} ({description})")
+            try:
+                con.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {number};\nCOMMIT;")
+            except sqlite3.Error as e:
+                con.rollback()
+                logging.error(f"migrations: migration {number} failed, database left at version {current_version(con)}", exc_info=e)
+                raise
+
+        problems = con.execute("PRAGMA foreign_key_check;").fetchall()
+        if problems:
+            logging.warning(f"migrations: foreign key problems after migrating: {problems}")
+
+    finally:
+        con.execute("PRAGMA foreign_keys = ON;")
+
+    version = current_version(con)
+    logging.info(f"migrations: database is now at version {version}")
+    return version
+
+
+if __name__ == "__main__":
+    args, config = utils.general_setup()
+    utils.logging_setup()
+
+    con = sqlite3.connect(config["db_path"], timeout=30)
+    print(f"{config['db_path']} is at version {current_version(con)}, latest is {MIGRATIONS[-1][0]}")
+
+    # keep a copy of the database as it was, just in case
+    backup_name = utils.gen_filename("db_backup", "db")
+    backup_con = sqlite3.connect(backup_name)
+    con.backup(backup_con)
+    backup_con.close()
+    print(f"Backed up database to {backup_name}")
+
+    upgrade(con)
+    con.close()
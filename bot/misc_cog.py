@@ -14,6 +14,7 @@ from pprint import pformat
 import itertools
 import numpy as np
 import queuing
+import api_scheduler
 from copy import deepcopy
 
 args, config = utils.general_setup()
@@ -104,4 +105,22 @@ class Misc(commands.Cog):
         
         await self.bot.tree.sync(guild=ctx.guild)
         await ctx.message.add_reaction("✅")
+
+
+    @commands.command(help=f'''Shows how many Discord API calls are queued in the scheduler, and how long they've been waiting. Restricted.
+    
+    Usage: {config['prefix']}api_stats''')
+    async def api_stats(self, ctx):
+
+        if not utils.check_perms(ctx.message.author, config["perms"]["controller"]):
+            logging.info(f"api_stats: ignoring nonpermitted call by {ctx.message.author.name}")
+            return
+
+        stats = api_scheduler.scheduler.stats()
+        msg = f"API calls: {stats['in_flight']} in flight across {stats['buckets_active']} buckets (deepest bucket queue so far: {stats['max_bucket_depth']}).\n"
+        for name in api_scheduler.PRIORITY_NAMES.values():
+            s = stats[name]
+            waits = "no calls yet" if s['wait_mean_ms'] == None else f"waited {s['wait_mean_ms']}ms on average (p90 {s['wait_p90_ms']}ms)"
+            msg += f"- `{name}`: {s['waiting']} waiting, {s['completed']} completed, {waits}\n"
+        await ctx.reply(msg)
         
@@ -0,0 +1,170 @@
+'''
+Creates the Discord artefacts (role, category, text channel, voice channel) for a team.
+
+Steps that don't depend on each other run concurrently: members are given the team role while the category
+is being created, and the text and voice channels are created together. The category is created with all of
+its permission overwrites in one call, rather than one set_permissions call per role afterwards.
+
+create_team runs the whole of team creation as a saga: the database checks happen before anything is made
+in Discord, every artefact is recorded as it is created, and if any later step fails (including the
+database insert) everything created so far is deleted again, so no orphaned roles or channels are left behind.
+
+All API calls go through api_scheduler at BULK priority, so provisioning never holds up judging.
+'''
+
+import discord
+import asyncio
+import logging
+from time import perf_counter
+import utils
+import async_database
+import api_scheduler
+from index_cog import guild_index
+
+args, config = utils.general_setup()
+
+
+class StepTimer:
+    '''
+    Records how long each named step of a pipeline took.
+    '''
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.timings = {}
+
+    async def run(self, step, coro):
+        step_start = perf_counter()
+        try:
+            return await coro
+        finally:
+            self.timings[step] = perf_counter() - step_start
+
+    def total(self):
+        return perf_counter() - self.start
+
+    def summary(self):
+        steps = ", ".join(f"{step}={t:.2f}s" for step, t in self.timings.items())
+        return f"total={self.total():.2f}s ({steps})"
+
+
+def team_overwrites(guild: discord.Guild, team_role: discord.Role):
+    '''
+    Permission overwrites for a team's category and channels; only the team and some others can view them.
+    '''
+    overwrites = {
+        guild.default_role: discord.PermissionOverwrite(read_messages=False), # @everyone can't view
+        team_role: discord.PermissionOverwrite(read_messages=True),
+    }
+    for role_name in ['organizer', 'mentor', 'volunteer', 'sponsor', 'judge']:
+        role = guild_index.role(config['roles'][role_name]) # get role with ID identified in config
+        overwrites[role] = discord.PermissionOverwrite(read_messages=True)
+    return overwrites
+
+
+def raise_first_error(results):
+    '''
+    For the results of asyncio.gather(..., return_exceptions=True): raise the first exception, if there was one.
+    '''
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def delete_artefacts(artefacts: list, reason: str):
+    '''
+    Delete the given roles/channels concurrently. Failures are logged rather than raised, so one artefact that
+    can't be deleted doesn't stop the rest. Returns the artefacts that couldn't be deleted.
+    '''
+    results = await asyncio.gather(*[api_scheduler.bulk(("delete", artefact.guild.id), artefact.delete(reason=reason)) for artefact in artefacts], return_exceptions=True)
+
+    failed = []
+    for artefact, result in zip(artefacts, results):
+        if isinstance(result, Exception):
+            logging.error(f"delete_artefacts: couldn't delete {artefact} (id={artefact.id})", exc_info=result)
+            failed.append(artefact)
+    return failed
+
+
+async def provision_team(guild: discord.Guild, team_name: str, members: list):
+    '''
+    Create the role, category, text channel and voice channel for a team, and give the role to its members.
+    Returns a dictionary of the created artefacts (keyed like database.make_team_info) and the StepTimer.
+    If any step fails, whatever was already created is deleted and the error is re-raised.
+    '''
+    timer = StepTimer()
+    created = [] # every artefact made so far, in case they need to be deleted again
+
+    async def create(step, coro):
+        artefact = await timer.run(step, coro)
+        created.append(artefact)
+        return artefact
+
+    try:
+        # everything else depends on the role, so it has to go first
+        team_role = await create("create_role", api_scheduler.bulk(("create_role", guild.id), guild.create_role(name=team_name, mentionable=True, colour=config['team_role_colour_obj'])))
+        overwrites = team_overwrites(guild, team_role)
+
+        async def create_channels():
+            team_cat = await create("create_category", api_scheduler.bulk(("create_channel", guild.id), guild.create_category(name=team_name, overwrites=overwrites))) # category to store team text & vc
+            # return_exceptions, so that if one fails the other has still finished (and been recorded) before we clean up
+            results = await asyncio.gather(
+                create("create_text_channel", api_scheduler.bulk(("create_channel", guild.id), guild.create_text_channel(name=team_name, category=team_cat, overwrites=overwrites))),
+                create("create_voice_channel", api_scheduler.bulk(("create_channel", guild.id), guild.create_voice_channel(name=team_name, category=team_cat, overwrites=overwrites))),
+                return_exceptions=True
+            )
+            raise_first_error(results)
+            return team_cat, results[0], results[1]
+
+        async def assign_roles():
+            # members' roles don't need undoing separately; deleting the role takes it off them
+            results = await timer.run("add_roles", asyncio.gather(*[api_scheduler.bulk(("member_roles", member.id), member.add_roles(team_role)) for member in members], return_exceptions=True))
+            raise_first_error(results)
+
+        results = await asyncio.gather(create_channels(), assign_roles(), return_exceptions=True)
+        raise_first_error(results)
+        team_cat, team_text, team_vc = results[0]
+
+    except Exception as e:
+        logging.error(f"provision_team: failed to provision {team_name} after {timer.summary()}; deleting {len(created)} created artefacts", exc_info=e)
+        await delete_artefacts(created, reason=f"Creating team {team_name} failed")
+        raise
+
+    logging.info(f"provision_team: created artefacts for {team_name} in {timer.summary()}")
+
+    artefacts = {
+        "team_role": team_role,
+        "team_cat": team_cat,
+        "team_text": team_text,
+        "team_vc": team_vc,
+    }
+    return artefacts, timer
+
+
+async def create_team(guild: discord.Guild, team_name: str, members: list):
+    '''
+    Check, provision and insert a team. Returns (artefacts, timer, None) if the team was created, or
+    (None, timer, reason) if it wasn't, in which case nothing is left behind in Discord or the database.
+    '''
+    timer = StepTimer()
+
+    # things may have changed since the command's own checks (e.g. while waiting for confirmation),
+    # and it's much cheaper to find out now than after creating everything
+    if not await timer.run("check", async_database.check_new_team(team_name, members)):
+        return None, timer, "the team name is taken or a member can't join a team"
+
+    try:
+        artefacts, provision_timer = await provision_team(guild, team_name, members)
+    except discord.HTTPException as e:
+        return None, timer, f"Discord returned an error while creating the team ({e.status})"
+    timer.timings.update(provision_timer.timings)
+
+    inserted = await timer.run("insert", async_database.insert_team(team_name, artefacts['team_text'], artefacts['team_vc'], artefacts['team_cat'], artefacts['team_role'], members))
+    if not inserted:
+        # compensate: the database refused the team, so the artefacts made for it have to go
+        failed = await timer.run("rollback", delete_artefacts(list(artefacts.values()), reason=f"Inserting team {team_name} failed"))
+        logging.error(f"create_team: database insert failed for {team_name}; rolled back artefacts ({len(failed)} couldn't be deleted)")
+        return None, timer, "the team couldn't be saved to the database"
+
+    logging.info(f"create_team: created {team_name} in {timer.summary()}")
+    return artefacts, timer, None
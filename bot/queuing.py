@@ -1,5 +1,7 @@
 import itertools
+import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from utils import general_setup
 from copy import deepcopy
 import logging
@@ -15,59 +17,489 @@ with open(config['challenge_data_path'], 'r') as f:
     challenge_data = json.loads(f.read())
 
 
-def first_chal_match():
+# ===== room settings
+
+def minutes_per_team(room_id, rooms=None):
+    '''
+    How long a room takes per team, from `minutes_per_team` in the room's config (default: the judging slot,
+    `judging_slot_seconds`, plus `judging_changeover_seconds` between teams).
+    '''
+    rooms = config['judging_rooms'] if rooms == None else rooms
+    default = (config.get("judging_slot_seconds", 5 * 60) + config.get("judging_changeover_seconds", 60)) / 60
+    return rooms[room_id].get("minutes_per_team", default)
+
+
+def transition_minutes(room_a, room_b, rooms=None):
+    '''
+    The gap a team needs between being judged in one room and then the other: `judging_transition_minutes` in
+    config, {"in-person": 5, "online": 2} by default. The in-person gap applies if either room judges in person,
+    since team members may have to walk between them; otherwise it's only switching VCs.
+    '''
+    rooms = config['judging_rooms'] if rooms == None else rooms
+    buffers = config.get("judging_transition_minutes", {})
+    in_person = any("in-person" in rooms[room_id].get('mediums', []) for room_id in [room_a, room_b])
+    return buffers.get("in-person", 5) if in_person else buffers.get("online", 2)
+
+
+def predicted_makespan(assignment, rooms=None):
+    '''
+    Predicted time for each room to get through its queue, in minutes, as {room_id: minutes}, for an assignment
+    of {room_id: [team_name, ...]}.
+    '''
+    return {room_id: len(teams) * minutes_per_team(room_id, rooms) for room_id, teams in assignment.items()}
+
+
+class EventMatrices:
+    '''
+    Teams, rooms and challenges as arrays, built once per queuing run from `database.get_all_challenge_info` and
+    the challenge data, so the algorithms below work on whole rows and columns instead of comparing lists team by
+    team. Rows and columns are in the order of `team_names`, `room_ids` and `challenges` (the challenge data's
+    order, which is also the order each team's challenges come in).
+
+    * incidence : teams x challenges, whether the team signed up for the challenge
+    * room_challenges : rooms x challenges, whether the room judges the challenge
+    * optional : challenges, False for the main challenge
+    * default_rooms : rooms, whether the room judges teams only in the main challenge (rooms with no challenges,
+      or `"accepts_main": true`)
+    * challenge_eligibility : teams x rooms, whether the room judges one of the team's optional challenges
+    * eligibility : teams x rooms, the rooms a team can be judged in if it's judged once; its challenge rooms if
+      it has any, otherwise the default rooms
+    * preferred : teams x rooms, the rooms judging the team's first optional challenge that has a room (any room
+      it's eligible for, if it has none)
+    * minutes, capacity : rooms, minutes per team and max teams (inf if unlimited)
+    * transition : rooms x rooms, minutes a team needs between the two rooms
+    '''
+
+    def __init__(self, info, rooms):
+        self.team_names = [team_data['team_name'] for team_data in info]
+        self.room_ids = list(rooms.keys())
+        self.challenges = challenge_order(list(challenge_data['challenges'].keys()))
+        for chal in itertools.chain(*[room_info['challenges'] for room_info in rooms.values()]):
+            if chal not in self.challenges:
+                self.challenges.append(chal) # judged, but missing from the challenge data; nobody can sign up for it
+        column = {chal: j for j, chal in enumerate(self.challenges)}
+
+        self.incidence = np.zeros((len(self.team_names), len(self.challenges)), dtype=bool)
+        pairs = [(i, column[chal]) for i, team_data in enumerate(info) for chal in team_data['challenges']]
+        if pairs:
+            self.incidence[tuple(zip(*pairs))] = True
+
+        self.room_challenges = np.zeros((len(self.room_ids), len(self.challenges)), dtype=bool)
+        pairs = [(r, column[chal]) for r, room_info in enumerate(rooms.values()) for chal in room_info['challenges']]
+        if pairs:
+            self.room_challenges[tuple(zip(*pairs))] = True
+
+        self.optional = np.array([chal != challenge_data['main_challenge'] for chal in self.challenges], dtype=bool)
+        self.signed_up = self.incidence.any(axis=1)
+        self.default_rooms = np.array([room_info['challenges'] == [] or room_info.get("accepts_main", False) for room_info in rooms.values()], dtype=bool)
+
+        self.challenge_eligibility = (self.incidence & self.optional) @ self.room_challenges.T
+        has_challenge_room = self.challenge_eligibility.any(axis=1)
+        self.eligibility = np.where(has_challenge_room[:, None], self.challenge_eligibility, self.default_rooms[None, :])
+
+        first_choice = self.incidence & self.optional & self.room_challenges.any(axis=0)
+        self.preferred = np.where(first_choice.any(axis=1)[:, None], self.room_challenges[:, first_choice.argmax(axis=1)].T, self.eligibility)
+
+        self.minutes = np.array([minutes_per_team(room_id, rooms) for room_id in self.room_ids], dtype=float)
+        self.capacity = np.array([room_info.get("capacity", np.inf) for room_info in rooms.values()], dtype=float)
+        self.transition = np.array([[transition_minutes(a, b, rooms) for b in self.room_ids] for a in self.room_ids], dtype=float).reshape(len(self.room_ids), len(self.room_ids))
+
+    def room_requests(self, team):
+        '''
+        The judging team (a row index) needs when it's judged in every room it's entered for, as a list of arrays
+        of room indices; the team is judged once in one room from each. There's one for each optional challenge
+        that a room judges (challenges judged in the same rooms share one), then one of the default rooms for the
+        main challenge.
+        '''
+        requests, seen = [], set()
+        for chal in np.flatnonzero(self.incidence[team] & self.optional):
+            options = self.room_challenges[:, chal]
+            if options.any() and options.tobytes() not in seen:
+                seen.add(options.tobytes())
+                requests.append(np.flatnonzero(options))
+
+        main = self.incidence[team] & ~self.optional
+        if self.default_rooms.any() and (main.any() or requests == []):
+            requests.append(np.flatnonzero(self.default_rooms))
+        return requests
+
+    def assignment(self, rooms):
+        '''
+        Convert {room_id: [team_name, ...]} to an array giving each team's room index (-1 if it has none).
+        '''
+        row = {team_name: i for i, team_name in enumerate(self.team_names)}
+        assigned = np.full(len(self.team_names), -1)
+        for r, room_id in enumerate(self.room_ids):
+            assigned[[row[team_name] for team_name in rooms.get(room_id, [])]] = r
+        return assigned
+
+    def makespans(self, assignments):
+        '''
+        Minutes for each room to get through its queue, for one assignment (an array of room indices per team, as
+        from `assignment`) or many at once (a 2D array, one assignment per row). Returns an array of the same
+        number of dimensions with rooms in place of teams.
+        '''
+        single = np.ndim(assignments) == 1
+        assignments = np.atleast_2d(assignments)
+        n_rooms = len(self.room_ids)
+        offsets = np.arange(len(assignments))[:, None] * n_rooms
+        valid = assignments >= 0
+        loads = np.bincount((assignments + offsets)[valid], minlength=len(assignments) * n_rooms).reshape(len(assignments), n_rooms)
+        makespans = loads * self.minutes
+        return makespans[0] if single else makespans
+
+    def is_eligible(self, assignments):
+        '''
+        Whether every assigned team in each assignment is in a room it's eligible for.
+        '''
+        assignments = np.atleast_2d(assignments)
+        teams = np.broadcast_to(np.arange(len(self.team_names)), assignments.shape)
+        ok = (assignments < 0) | self.eligibility[teams, np.maximum(assignments, 0)]
+        return ok.all(axis=1)
+
+
+def load_event(info=None, rooms=None):
+    '''
+    Team challenge info (from the database unless given) and rooms (from config unless given), and their
+    EventMatrices.
+    '''
+    info = database.get_all_challenge_info() if info == None else info
+    rooms = config['judging_rooms'] if rooms == None else rooms
+    return info, rooms, EventMatrices(info, rooms)
+
+
+# ===== algorithms
+# each takes the team challenge info and rooms, which default to the database and config
+
+def first_chal_match(info=None, rooms=None):
     '''
     Puts teams in the first room that matches their challenge. Disregards medium.
     Returns a dictionary mapping room_id to teams, and a dictionary of unassigned teams.
     '''
-    info = database.get_all_challenge_info()
-    print(info)
+    info, rooms, m = load_event(info, rooms)
 
-    rooms = {room_id: [] for room_id in config['judging_rooms'].keys()} # available rooms
+    assignment = {room_id: [] for room_id in m.room_ids} # available rooms
     unchosen = [] # teams that seemingly did not choose any challenges (including main hacked), i.e. did not sign up for judging
     unassigned = [] # teams that picked challenges but don't get assigned a room
 
-    # for each team, get their challenge combo
-    for team_data in info:
-        
+    # each team's first optional challenge that a room judges, and the first room judging it
+    judged = m.incidence & m.optional & m.room_challenges.any(axis=0)
+    first_room = m.room_challenges.argmax(axis=0)[judged.argmax(axis=1)]
+
+    # if it doesn't match any rooms for optional challenge, put in a default room
+    plain_rooms = np.flatnonzero(~m.room_challenges.any(axis=1))
+    default_room = plain_rooms[0] if len(plain_rooms) > 0 else -1
+    choice = np.where(judged.any(axis=1), first_room, default_room)
+
+    for i, team_data in enumerate(info):
         team_name = team_data['team_name']
-        challenge_choices = team_data['challenges']
-        room_found = False
-        logging.info(f"{team_name}: {challenge_choices}")
+        logging.info(f"{team_name}: {team_data['challenges']}")
 
-        if challenge_choices == []:
+        if not m.signed_up[i]:
             # team did not sign up for judging
             logging.info("> team has no recorded challenge choices, skipping")
             unchosen.append(team_name)
 
-        # if a challenge and medium matches, put in that room
-        for chal in challenge_choices:
-            if chal == challenge_data['main_challenge']: continue
-
-            for room_id, room_info in config['judging_rooms'].items():
-                if chal in room_info['challenges']:
-                    rooms[room_id].append(team_name)
-                    room_found = room_id
-                    break
-
-            if room_found: break
-
-        # if it doesn't match any rooms for optional challenge, put in a default room matching medium
-        if not room_found:
-            for room_id, room_info in config['judging_rooms'].items():
-                if room_info['challenges'] == []:
-                    rooms[room_id].append(team_name)
-                    room_found = room_id
-                    break
-        
         # if this hasn't worked, error
-        if not room_found:
-            logging.error(f"> Was unable to find a room for {team_name} with medium_pref={medium_pref} and challenges={team_data['challenges']}")
+        if choice[i] < 0:
+            logging.error(f"> Was unable to find a room for {team_name} with challenges={team_data['challenges']}")
             unassigned.append(team_name)
         else:
+            room_id = m.room_ids[choice[i]]
+            assignment[room_id].append(team_name)
             logging.info(f"> Assigned {team_name} to room {room_id}.")
-    
-    return rooms, unchosen, unassigned
+
+    return assignment, unchosen, unassigned
+
+
+def balanced_match(info=None, rooms=None):
+    '''
+    Puts each team in the room, out of those it's eligible for (see EventMatrices.eligibility), that would finish
+    its queue earliest; i.e. earliest-finish-time list scheduling, taking each room's `minutes_per_team` and
+    `capacity` (max teams, default unlimited) from config. Teams eligible for the fewest rooms are placed first,
+    so flexible teams fill in around them. Then teams are moved out of whichever room finishes last, while that
+    brings its finish time down.
+    Returns a dictionary mapping room_id to teams, a list of teams that didn't sign up, a list of teams that
+    couldn't be given a room, and the predicted makespan of each room in minutes.
+    '''
+    info, rooms, m = load_event(info, rooms)
+
+    queues = [[] for room_id in m.room_ids] # team row indices per room
+    load = np.zeros(len(m.room_ids))
+    unchosen = [m.team_names[i] for i in np.flatnonzero(~m.signed_up)] # teams that seemingly did not choose any challenges (including main hacked), i.e. did not sign up for judging
+    unassigned = [] # teams that picked challenges but don't get assigned a room
+
+    for team_name in unchosen:
+        logging.info(f"{team_name}: team has no recorded challenge choices, skipping")
+
+    # most constrained teams first; a stable sort, so otherwise teams keep the order they came in
+    signed_up = np.flatnonzero(m.signed_up)
+    for i in signed_up[np.argsort(m.eligibility[signed_up].sum(axis=1), kind="stable")]:
+        options = np.flatnonzero(m.eligibility[i] & (load < m.capacity))
+        if len(options) == 0:
+            logging.error(f"> Was unable to find a room for {m.team_names[i]}; eligible rooms {[m.room_ids[r] for r in np.flatnonzero(m.eligibility[i])]} are all full or there are none")
+            unassigned.append(m.team_names[i])
+            continue
+        r = options[np.argmin((load[options] + 1) * m.minutes[options])]
+        queues[r].append(i)
+        load[r] += 1
+        logging.info(f"> Assigned {m.team_names[i]} to room {m.room_ids[r]}, which now finishes at {load[r] * m.minutes[r]:.0f} min.")
+
+    # improve: move a team out of the last room to finish, if some other room it's eligible for would still finish
+    # before the last room does now
+    while len(m.room_ids) > 0:
+        finish = load * m.minutes
+        latest = np.argmax(finish)
+        move = None
+        for i in reversed(queues[latest]):
+            options = np.flatnonzero(m.eligibility[i] & (load < m.capacity) & ((load + 1) * m.minutes < finish[latest]))
+            if len(options) > 0:
+                move = i, options[np.argmin((load[options] + 1) * m.minutes[options])]
+                break
+        if move == None:
+            break
+        i, r = move
+        queues[latest].remove(i)
+        queues[r].append(i)
+        load[latest] -= 1
+        load[r] += 1
+        logging.info(f"> Moved {m.team_names[i]} from {m.room_ids[latest]} to {m.room_ids[r]} to even out finish times.")
+
+    assignment = {room_id: [m.team_names[i] for i in queues[r]] for r, room_id in enumerate(m.room_ids)}
+    makespan = predicted_makespan(assignment, rooms)
+    for room_id, minutes in makespan.items():
+        logging.info(f"{room_id}: {len(assignment[room_id])} teams, predicted to finish after {minutes:.0f} min")
+
+    return assignment, unchosen, unassigned, makespan
+
+
+SEARCH_WEIGHTS = {"makespan": 1, "balance": 0.5, "sponsor_load": 0.25, "preferred": 30}
+SEARCH_CHUNK = 250 # candidates per task; fixed, so results don't depend on how many workers there are
+
+
+def score_assignments(m, assignments, weights=None):
+    '''
+    Score a 2D array of assignments (one per row, as from EventMatrices.assignment); lower is better. Each is
+    scored on, in minutes:
+    * makespan : how long the slowest room takes
+    * balance : the standard deviation of the rooms' times
+    * sponsor_load : how long the slowest challenge (sponsor) room takes
+    * preferred : the fraction of teams in a room they prefer (see EventMatrices.preferred); subtracted
+    weighted by `queuing_search_weights` in config (default SEARCH_WEIGHTS). Returns the scores, and each metric.
+    '''
+    weights = {**SEARCH_WEIGHTS, **config.get("queuing_search_weights", {}), **(weights or {})}
+    makespans = m.makespans(np.atleast_2d(assignments))
+    sponsor = ~m.default_rooms
+
+    teams = np.broadcast_to(np.arange(len(m.team_names)), assignments.shape)
+    in_preferred = (assignments >= 0) & m.preferred[teams, np.maximum(assignments, 0)]
+
+    metrics = {
+        "makespan": makespans.max(axis=1, initial=0),
+        "balance": makespans.std(axis=1) if len(m.room_ids) > 0 else np.zeros(len(assignments)),
+        "sponsor_load": makespans[:, sponsor].max(axis=1, initial=0),
+        "preferred": in_preferred.mean(axis=1) if len(m.team_names) > 0 else np.ones(len(assignments)),
+    }
+    scores = weights["makespan"] * metrics["makespan"] + weights["balance"] * metrics["balance"] \
+        + weights["sponsor_load"] * metrics["sponsor_load"] - weights["preferred"] * metrics["preferred"]
+    return scores, metrics
+
+
+def random_candidates(m, n, rng):
+    '''
+    Generate n candidate assignments at once, as (assignments, orders): teams are placed in a random order (still
+    most constrained first), each in the eligible room that would finish earliest after some random noise, which
+    is zero for the first candidate in each batch (plain greedy) and up to 50% for others. `orders` gives each candidate's
+    order of placement, which is also the order of each room's queue.
+    '''
+    n_teams, n_rooms = len(m.team_names), len(m.room_ids)
+    eligible = m.eligibility & m.signed_up[:, None] # teams that didn't sign up aren't placed
+    counts = eligible.sum(axis=1)
+    orders = np.argsort(counts + rng.random((n, n_teams)), axis=1) # random ties, fewest eligible rooms first
+    noise = rng.uniform(0, 0.5, size=(n, 1))
+    noise[0] = 0
+
+    assignments = np.full((n, n_teams), -1)
+    load = np.zeros((n, n_rooms))
+    candidates = np.arange(n)
+    for step in range(n_teams):
+        teams = orders[:, step]
+        finish = (load + 1) * m.minutes * (1 + noise * rng.random((n, n_rooms)))
+        finish[~(eligible[teams] & (load < m.capacity))] = np.inf
+        choice = finish.argmin(axis=1)
+        ok = np.isfinite(finish[candidates, choice])
+        assignments[candidates[ok], teams[ok]] = choice[ok]
+        load[candidates[ok], choice[ok]] += 1
+
+    return assignments, orders
+
+
+def _search_chunk(m, n, seed, weights):
+    # runs in a worker process; returns this chunk's best candidate and every score
+    rng = np.random.default_rng(seed)
+    assignments, orders = random_candidates(m, n, rng)
+    scores, metrics = score_assignments(m, assignments, weights)
+    best = int(np.argmin(scores))
+    return scores, assignments[best], orders[best], {k: float(v[best]) for k, v in metrics.items()}
+
+
+def search_match(info=None, rooms=None, n_candidates=None, seed=None, workers=None, weights=None):
+    '''
+    Multi-start randomized search: generates `n_candidates` room assignments and queue orders (see
+    random_candidates) across a pool of `workers` processes, scores them (see score_assignments), and keeps the
+    best. The same seed always gives the same result, however many workers there are. Defaults are from
+    config: `queuing_search_candidates` (5000), `queuing_search_seed` (0), `queuing_search_workers` (one per CPU).
+
+    Returns a dictionary mapping room_id to teams, a list of teams that didn't sign up, a list of teams that
+    couldn't be given a room, the predicted makespan of each room in minutes, and a summary of the search: the
+    best candidate's metrics and the distribution of scores.
+    '''
+    info, rooms, m = load_event(info, rooms)
+    n_candidates = config.get("queuing_search_candidates", 5000) if n_candidates == None else n_candidates
+    seed = config.get("queuing_search_seed", 0) if seed == None else seed
+    workers = config.get("queuing_search_workers", os.cpu_count()) if workers == None else workers
+
+    sizes = [SEARCH_CHUNK] * (n_candidates // SEARCH_CHUNK) + ([n_candidates % SEARCH_CHUNK] if n_candidates % SEARCH_CHUNK else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    logging.info(f"search: {n_candidates} candidates in {len(sizes)} chunks, seed {seed}, {workers} workers")
+
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_search_chunk, [m] * len(sizes), sizes, seeds, [weights] * len(sizes)))
+    else:
+        results = [_search_chunk(m, size, chunk_seed, weights) for size, chunk_seed in zip(sizes, seeds)]
+
+    # first best chunk wins ties, so the result is the same whatever order chunks finished in
+    scores = np.concatenate([result[0] for result in results])
+    best_scores = [result[0].min() for result in results]
+    _, best, order, metrics = results[int(np.argmin(best_scores))]
+
+    assignment = {room_id: [m.team_names[i] for i in order if best[i] == r] for r, room_id in enumerate(m.room_ids)}
+    unchosen = [m.team_names[i] for i in np.flatnonzero(~m.signed_up)]
+    unassigned = [m.team_names[i] for i in np.flatnonzero(m.signed_up & (best < 0))]
+    for team_name in unassigned:
+        logging.error(f"> Was unable to find a room for {team_name}; its eligible rooms are all full or there are none")
+
+    makespan = predicted_makespan(assignment, rooms)
+    summary = {
+        "seed": seed,
+        "candidates": len(scores),
+        "best": metrics,
+        "scores": {
+            "best": float(scores.min()),
+            "p10": float(np.percentile(scores, 10)),
+            "median": float(np.median(scores)),
+            "p90": float(np.percentile(scores, 90)),
+            "worst": float(scores.max()),
+        },
+    }
+    logging.info(f"search: {summary}")
+    for room_id, minutes in makespan.items():
+        logging.info(f"{room_id}: {len(assignment[room_id])} teams, predicted to finish after {minutes:.0f} min")
+
+    return assignment, unchosen, unassigned, makespan, summary
+
+
+def find_conflicts(timetable, rooms=None):
+    '''
+    Pairs of bookings that overlap, or leave less than the transition time between rooms, or are in the same room
+    (a team can only be in a room's queue once), in a timetable of {team_name: [{"room_id", "start", "end"}, ...]}.
+    Returns (team_name, booking, booking) tuples.
+    '''
+    conflicts = []
+    for team_name, bookings in timetable.items():
+        bookings = sorted(bookings, key=lambda b: b["start"])
+        for a, b in zip(bookings, bookings[1:]):
+            if a["end"] + transition_minutes(a["room_id"], b["room_id"], rooms) > b["start"]:
+                conflicts.append((team_name, a, b))
+        for k, a in enumerate(bookings):
+            for b in bookings[k+1:]:
+                if a["room_id"] == b["room_id"]:
+                    conflicts.append((team_name, a, b))
+    return conflicts
+
+
+def timetable_match(info=None, rooms=None):
+    '''
+    Books every team a time slot in each room it needs (see EventMatrices.room_requests), so a team entered in
+    optional challenges is also seen for the main challenge. Each room's free time is kept as a list of gaps;
+    teams with the most bookings are placed first, and each booking goes in whichever of its rooms can fit it the
+    earliest given the team's other bookings and the transition time between rooms (see transition_minutes), so
+    teams with fewer bookings fill in the gaps left around them. A team is never booked in two rooms at
+    overlapping times, or twice in one room; if every room for a booking already has the team (e.g. a room that
+    judges both an optional challenge and the main challenge, with `accepts_main`), that slot covers it.
+
+    Times are in minutes from the start of judging.
+    Returns a dictionary mapping room_id to teams in order of their slots, the timetable as {team_name: [{"room_id",
+    "start", "end"}, ...]}, a list of teams that didn't sign up, a list of teams that couldn't be given a room, and
+    the predicted makespan of each room in minutes.
+    '''
+    info, rooms, m = load_event(info, rooms)
+
+    gaps = [[(0, float("inf"))] for room_id in m.room_ids] # free (start, end) per room
+    slots = [[] for room_id in m.room_ids] # (start, team_name) per room
+    timetable = {}
+    unchosen = [] # teams that seemingly did not choose any challenges (including main hacked), i.e. did not sign up for judging
+    unassigned = [] # teams that picked challenges but don't get assigned a room
+
+    requests = {}
+    for i, team_name in enumerate(m.team_names):
+        if not m.signed_up[i]:
+            logging.info(f"{team_name}: team has no recorded challenge choices, skipping")
+            unchosen.append(team_name)
+            continue
+        requests[i] = m.room_requests(i)
+        if requests[i] == []:
+            logging.error(f"> Was unable to find a room for {team_name} with challenges={info[i]['challenges']}")
+            unassigned.append(team_name)
+
+    def earliest_fit(r, bookings):
+        '''
+        (gap index, start) of the earliest slot in room r that keeps clear of the team's other (room, start, end)
+        bookings.
+        '''
+        length = m.minutes[r]
+        blocked = [(start - m.transition[r, other], end + m.transition[r, other]) for other, start, end in bookings]
+        for g, (gap_start, gap_end) in enumerate(gaps[r]):
+            start, moved = gap_start, True
+            while moved and start + length <= gap_end:
+                moved = False
+                for block_start, block_end in blocked:
+                    if start < block_end and block_start < start + length:
+                        start, moved = block_end, True
+            if start + length <= gap_end:
+                return g, start
+
+    # most bookings first; sorted() is stable, so otherwise teams keep the order they came in
+    for i in sorted(requests.keys(), key=lambda i: -len(requests[i])):
+        bookings = []
+        for options in requests[i]:
+            options = [r for r in options if r not in [other for other, start, end in bookings]]
+            if options == []:
+                continue # already booked in a room that judges this
+            fits = {r: earliest_fit(r, bookings) for r in options}
+            r = min(options, key=lambda r: fits[r][1] + m.minutes[r])
+            g, start = fits[r]
+            end = start + m.minutes[r]
+
+            # split the gap around the new slot
+            gap_start, gap_end = gaps[r][g]
+            gaps[r][g:g+1] = [gap for gap in [(gap_start, start), (end, gap_end)] if gap[1] > gap[0]]
+
+            slots[r].append((start, m.team_names[i]))
+            bookings.append((r, start, end))
+            logging.info(f"> Booked {m.team_names[i]} in room {m.room_ids[r]} from {start:.0f} to {end:.0f} min.")
+        timetable[m.team_names[i]] = [{"room_id": m.room_ids[r], "start": float(start), "end": float(end)} for r, start, end in bookings]
+
+    for conflict in find_conflicts(timetable, rooms):
+        logging.error(f"> Conflicting bookings: {conflict}") # shouldn't happen
+
+    assignment = {room_id: [team_name for start, team_name in sorted(slots[r])] for r, room_id in enumerate(m.room_ids)}
+    makespan = {room_id: max([float(start + m.minutes[r]) for start, team_name in slots[r]], default=0) for r, room_id in enumerate(m.room_ids)}
+    for room_id, minutes in makespan.items():
+        logging.info(f"{room_id}: {len(assignment[room_id])} teams, predicted to finish after {minutes:.0f} min")
+
+    return assignment, timetable, unchosen, unassigned, makespan
 
 
 def first_chal_med_match():
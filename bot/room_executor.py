@@ -0,0 +1,74 @@
+'''
+Serializes judging operations per room.
+
+Judging commands read a room's queue, wait (up to 20 seconds) for confirmation, and then act on what they
+read. If two people run commands for the same room at once, the second one to be confirmed would otherwise
+act on a queue that has since moved. So:
+
+* Each room has its own lock; operations on one room run one at a time, in the order they get the lock, and
+  operations on different rooms never wait on each other.
+* Each room has a version, which goes up by one with every change. A command notes the version when it reads
+  the room, and its operation only runs if the room is still at that version once it has the lock; otherwise
+  it's rejected and the command has to be rerun against the current queue. The database checks the version
+  again as it writes (see database.advance_judging_room), so the two can't drift apart.
+'''
+
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+
+
+class RoomExecutor:
+    def __init__(self):
+        self.locks = {} # room_id -> asyncio.Lock
+        self.versions = {} # room_id -> version
+        self.conflicts = 0 # operations rejected because the room had changed
+        self.completed = 0
+
+    def lock(self, room_id):
+        if room_id not in self.locks:
+            self.locks[room_id] = asyncio.Lock()
+        return self.locks[room_id]
+
+    def version(self, room_id):
+        return self.versions.get(room_id)
+
+    def set_versions(self, versions: dict):
+        self.versions = dict(versions)
+
+    async def run(self, room_id, expected_version, operation, mutates=True):
+        '''
+        Run `operation` (an async function taking no arguments) with the room to itself, provided the room is
+        still at `expected_version` (pass None to skip the check). If `mutates`, the room's version goes up by one
+        afterwards; the operation should return None if the database refused the change. Operations that only act
+        on what they read (e.g. pinging the next team) pass mutates=False, so no other operation on the room can
+        change it between the check and the action.
+
+        Returns (True, result), or (False, None) if the room had changed since the caller read it.
+        '''
+        async with self.lock(room_id):
+            if expected_version != None and self.versions.get(room_id) != expected_version:
+                self.conflicts += 1
+                logging.info(f"RoomExecutor: rejected operation on {room_id}; expected version {expected_version}, room is at {self.versions.get(room_id)}")
+                return False, None
+
+            result = await operation()
+
+            if mutates:
+                if result == None:
+                    self.conflicts += 1
+                    return False, None
+                self.versions[room_id] = self.versions.get(room_id, 0) + 1
+
+            self.completed += 1
+            return True, result
+
+    async def run_exclusive(self, room_ids, operation):
+        '''
+        Run `operation` with every room in `room_ids` (plus every room already known) to itself, e.g. to replace
+        the whole judging scheme. Locks are taken in a fixed order, so two of these can't deadlock.
+        '''
+        async with AsyncExitStack() as stack:
+            for room_id in sorted(set(room_ids) | set(self.locks.keys())):
+                await stack.enter_async_context(self.lock(room_id))
+            return await operation()
@@ -21,6 +21,8 @@ from datetime import datetime
 import atexit
 import utils
 import sys
+import async_database
+import async_sheets
 
 # cogs
 from team_cog import Teams, add_team_slash
@@ -29,6 +31,7 @@ from verification_cog import Verification, add_verification_slash
 from embed_cog import Embed
 from declare_cog import Declare, add_declare_slash
 from misc_cog import Misc
+from index_cog import Index
 
 
 load_dotenv() # load env vars, like token
@@ -38,6 +41,9 @@ args, config = utils.general_setup()
 utils.logging_setup()
 print(logging.getLogger().handlers)
 
+atexit.register(async_database.shutdown) # let queued database writes finish before exiting
+atexit.register(async_sheets.shutdown)
+
 class Bot(commands.Bot):
     def __init__(self, *argv, **kwargv):
         super().__init__(*argv, **kwargv)
@@ -53,6 +59,7 @@ add_declare_slash(bot)
 
 # add cogs for non-slash commands
 async def setup(bot: commands.Bot):
+    await bot.add_cog(Index(bot)) # first, so the other cogs can use the guild index straight away
     await bot.add_cog(Teams(bot))
     await bot.add_cog(Judging(bot))
     await bot.add_cog(Declare(bot))
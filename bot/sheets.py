@@ -1,49 +1,253 @@
-import gspread
 import pandas as pd
 import logging
+import threading
+import os
+from time import time
 import utils
 
 args, config = utils.general_setup()
 
-account = gspread.service_account(filename="./google_service_account.json")
-sheet = account.open_by_key(config["registration_form_key"])
+DISCORD_COLUMN = "AH" # column of the registration sheet that verified participants' Discord IDs are written to
+
+
+class GoogleSheetSource:
+    '''
+    Registrations read from (and verifications written to) the Google Form's response sheet.
+    Connects on first use rather than at import, so the bot can start without reaching Google.
+    '''
+
+    def __init__(self, form_key, service_account_file="./google_service_account.json"):
+        self.form_key = form_key
+        self.service_account_file = service_account_file
+        self.sheet = None
+        self.lock = threading.Lock() # so only one of the sheets threads connects
+
+    def worksheet(self):
+        with self.lock:
+            if self.sheet == None:
+                import gspread # only needed for this source
+                account = gspread.service_account(filename=self.service_account_file)
+                self.sheet = account.open_by_key(self.form_key)
+        return self.sheet.get_worksheet(0)
+
+    def load(self):
+        worksheet = self.worksheet()
+
+        # get email and name columns
+        info_cols = worksheet.get("B:D")
+        # go to elaborate lengths to avoid querying the sensitive personal info columns
+        discord_col = worksheet.get(f"{DISCORD_COLUMN}1:{DISCORD_COLUMN}{len(info_cols)}", maintain_size=True)
+
+        df = pd.DataFrame(info_cols[1:], columns=info_cols[0]) # make df
+        df = df.map(lambda x: x.strip().lower()) # make matching easier
+
+        df[ discord_col[0] ] = discord_col[1:] # concatenate discord info to column
+
+        return df
+
+    def write(self, updates):
+        self.worksheet().batch_update([{"range": cell, "values": [[value]]} for cell, value in updates])
+
+
+class LocalFileSource:
+    '''
+    Registrations kept in a local CSV file with the columns `Email Address`, `First Name`, `Last Name` and `Discord ID`,
+    one row per registrant in the same order as the sheet. Stands in for the Google Sheet when running offline
+    or load testing.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock() # writes rewrite the whole file
+
+    def load(self):
+        with self.lock:
+            df = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+
+        discord_ids = df['Discord ID']
+        df = df[['Email Address', 'First Name', 'Last Name']].map(lambda x: x.strip().lower()) # make matching easier
+        df['Discord ID'] = discord_ids
+        return df
+
+    def write(self, updates):
+        with self.lock:
+            df = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+            for cell, value in updates:
+                row = int(cell[len(DISCORD_COLUMN):]) # sheet row numbers are df index + 2, like the real sheet
+                df.loc[row - 2, 'Discord ID'] = value
+
+            # write to a temporary file first so a crash never leaves a half-written file
+            tmp_path = f"{self.path}.tmp"
+            df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+
+
+def make_source(config):
+    '''
+    Choose the registration source from the config. Defaults to the Google Sheet given by `registration_form_key`;
+    set `"registration_source": {"type": "csv", "path": "<file>"}` to use a local file instead.
+    '''
+    source_config = config.get("registration_source", {"type": "google"})
+
+    if source_config["type"] == "google":
+        return GoogleSheetSource(config.get("registration_form_key"), source_config.get("service_account_file", "./google_service_account.json"))
+    elif source_config["type"] == "csv":
+        return LocalFileSource(source_config["path"])
+    else:
+        raise ValueError(f"unknown registration source type {source_config['type']}")
+
+
+source = make_source(config)
+
 
 def reload_values():
     '''
-    Open a connection to the Google Sheet and load the relevant information as a DataFrame.
+    Load the relevant registration information as a DataFrame.
+    '''
+    return source.load()
+
+
+class RegistrationIndex:
+    '''
+    An in-memory copy of the registration sheet, indexed by (email, first name, last name) and by Discord ID, so
+    that a lookup is a dictionary access instead of downloading the whole sheet.
+
+    The index is refreshed when it's older than `ttl` seconds, and when a lookup misses (someone may have only just
+    registered), though never more often than every `min_refresh_interval` seconds. Only one refresh runs at a time;
+    lookups that find the index stale (or miss) while one is running wait for it and use its result rather than
+    downloading again, so a burst of them only causes one download. Verification cog also refreshes it in the
+    background so lookups rarely have to wait for a refresh.
     '''
-    
-    worksheet = sheet.get_worksheet(0)
 
-    # get email and name columns
-    info_cols = worksheet.get("B:D")
-    # go to elaborate lengths to avoid querying the sensitive personal info columns
-    discord_col = worksheet.get(f"AH1:AH{len(info_cols)}", maintain_size=True)
+    def __init__(self, ttl, min_refresh_interval):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
 
-    df = pd.DataFrame(info_cols[1:], columns=info_cols[0]) # make df
-    df = df.map(lambda x: x.strip().lower()) # make matching easier
+        self.by_identity = {} # (email, first, last) -> list of sheet row numbers
+        self.by_discord = {} # discord id -> list of sheet row numbers
+        self.discord_ids = {} # sheet row number -> discord id in that row ("" if not verified)
+        self.loaded_at = None
 
-    df[ discord_col[0] ] = discord_col[1:] # concatenate discord info to column
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock() # held for a whole refresh, so only one download runs at a time
 
-    return df
+
+    def refresh(self, if_older_than=None):
+        '''
+        Download the sheet and rebuild the index. If `if_older_than` is given, only refresh if the index is still
+        older than that many seconds once any refresh already running has finished, i.e. reuse that refresh.
+        '''
+        with self.refresh_lock:
+            staleness = self.staleness()
+            if if_older_than != None and staleness != None and staleness <= if_older_than:
+                return # refreshed while we waited
+            self._refresh()
+
+
+    def _refresh(self):
+        df = reload_values()
+
+        by_identity, by_discord, discord_ids = {}, {}, {}
+        for i, (email, first_name, last_name, discord_id) in enumerate(zip(df['Email Address'], df['First Name'], df['Last Name'], df['Discord ID'])):
+            row = i + 2 # row number is df index + 1 (for sheet header) + 1 (for one-indexed rows)
+            if isinstance(discord_id, list): # cells come back from gspread as single-item (or empty) lists
+                discord_id = discord_id[0] if discord_id else ""
+            discord_id = (discord_id or "").strip()
+
+            by_identity.setdefault((email, first_name, last_name), []).append(row)
+            if discord_id != "":
+                by_discord.setdefault(discord_id, []).append(row)
+            discord_ids[row] = discord_id
+
+        with self.lock:
+            self.by_identity, self.by_discord, self.discord_ids = by_identity, by_discord, discord_ids
+            self.loaded_at = time()
+            self.refreshes += 1
+
+        logging.info(f"Sheet: registration index refreshed, {len(discord_ids)} rows")
+
+
+    def staleness(self):
+        '''
+        Seconds since the index was last refreshed (None if it has never been loaded).
+        '''
+        return None if self.loaded_at == None else time() - self.loaded_at
+
+
+    def refresh_if_stale(self):
+        if self.loaded_at == None or self.staleness() > self.ttl:
+            self.refresh(if_older_than=self.ttl)
+
+
+    def find(self, email, first_name, last_name):
+        '''
+        Get the sheet rows matching a registrant. Refreshes once on a miss.
+        '''
+        self.refresh_if_stale()
+        key = (email, first_name, last_name)
+
+        rows = self.by_identity.get(key)
+        if rows == None and self.staleness() > self.min_refresh_interval:
+            self.refresh(if_older_than=self.min_refresh_interval)
+            rows = self.by_identity.get(key)
+
+        if rows == None:
+            self.misses += 1
+            return []
+
+        self.hits += 1
+        return list(rows)
+
+
+    def rows_with_discord_id(self, discord_id):
+        self.refresh_if_stale()
+        return list(self.by_discord.get(str(discord_id), []))
+
+
+    def mark_verified(self, row, discord_id):
+        '''
+        Record a verification we've just written to the sheet, so the index doesn't have to be reloaded to see it.
+        '''
+        with self.lock:
+            self.discord_ids[row] = str(discord_id)
+            self.by_discord.setdefault(str(discord_id), []).append(row)
+
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "rows": len(self.discord_ids),
+            "staleness": self.staleness(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "refreshes": self.refreshes,
+        }
+
+
+registrations = RegistrationIndex(
+    ttl=config.get("registration_refresh_seconds", 60),
+    min_refresh_interval=config.get("registration_min_refresh_seconds", 5)
+)
 
 
 def check_if_registered(email, first_name, last_name):
     '''
     Check if a person has registered in the registration sheet.
     '''
-    
-    df = reload_values() # this will be live while people are still registering (scary)
 
-    res = df[ (df['Email Address'] == email) & (df['First Name'] == first_name) & (df['Last Name'] == last_name) ]
+    rows = registrations.find(email, first_name, last_name) # this will be live while people are still registering (scary)
 
     # participant not registered
-    if len(res) == 0:
+    if len(rows) == 0:
         return False
     
     # participant submitted the form more than once; this is ok, but should warn
-    if len(res) > 1:
-        logging.warning(f"Participant ({email}, {first_name}, {last_name}) appears {len(res)} times in registration sheet.")
+    if len(rows) > 1:
+        logging.warning(f"Participant ({email}, {first_name}, {last_name}) appears {len(rows)} times in registration sheet.")
 
     return True
 
@@ -53,16 +257,14 @@ def check_if_verified(email, first_name, last_name, discord_id):
     Check if a participant has already been verified in the registration sheet.
     '''
     
-    df = reload_values()
-    res = df[ (df['Email Address'] == email) & (df['First Name'] == first_name) & (df['Last Name'] == last_name) ]
+    rows = registrations.find(email, first_name, last_name)
 
     # if any of multiple entries checked, assume verified...
-    if any(res['Discord ID'] != ""):
+    if any(registrations.discord_ids.get(row, "") != "" for row in rows):
         logging.info(f"Sheet: Participant ({email}, {first_name}, {last_name}) already registered with some discord ID.")
         return "email" # i.e. email has already been verified with some discord account
     
-    res = df[ df['Discord ID'] == str(discord_id) ]
-    if len(res) != 0:
+    if registrations.rows_with_discord_id(discord_id):
         logging.info(f"Sheet: Discord ID {discord_id} already used for another participant.")
         return "discord" # i.e. discord id has already been used to verify a user
     
@@ -71,21 +273,38 @@ def check_if_verified(email, first_name, last_name, discord_id):
 
 def verify(email, first_name, last_name, discord_id):
     '''
-    Edit the spreadsheet to verify the participant (add their Discord ID to the right column).
+    Work out the edit to the spreadsheet that verifies the participant (adding their Discord ID to the right column).
+    Returns a list of (cell, value) updates, to be queued with database.insert_participant and written in the next
+    batch by write_updates; returns [] if the participant isn't in the sheet. Doesn't change the registration index;
+    call mark_verified once the updates are saved.
     Should check if registered first, because this function does not.
     '''
 
-    df = reload_values()
-    res = df[ (df['Email Address'] == email) & (df['First Name'] == first_name) & (df['Last Name'] == last_name) ]
+    rows = registrations.find(email, first_name, last_name)
 
-    if len(res.index) == 0:
+    if len(rows) == 0:
         logging.error(f"Tried to verify participant ({email}, {first_name}, {last_name}, {discord_id}) in sheet, but no results that match.")
-        return False
+        return []
 
-    for i in range(len(res.index)):
-        # row index is df index + 1 (for sheet header) + 1 (for one-indexed rows)
-        cell = f"AH{res.index[i].astype(int) + 2}"
-        sheet.get_worksheet(0).update(cell, str(discord_id))
+    row = rows[0]
+    cell = f"{DISCORD_COLUMN}{row}"
 
-        logging.info(f"Updated cell {cell} to verify participant ({email}, {first_name}, {last_name}, {discord_id})")
-        return True
\ No newline at end of file
+    logging.info(f"Queueing update to cell {cell} to verify participant ({email}, {first_name}, {last_name}, {discord_id})")
+    return [(cell, str(discord_id))]
+
+
+def mark_verified(updates):
+    '''
+    Record verify's (cell, value) updates in the registration index, so checks see them before the write actually
+    goes out.
+    '''
+    for cell, value in updates:
+        registrations.mark_verified(int(cell[len(DISCORD_COLUMN):]), value)
+
+
+def write_updates(updates):
+    '''
+    Write a batch of (cell, value) updates to the sheet in a single API call (or file write).
+    '''
+    source.write(updates)
+    logging.info(f"Sheet: wrote {len(updates)} updates in one batch")
@@ -0,0 +1,84 @@
+'''
+Synthetic hackathons, for trying out and benchmarking the queuing algorithms without a real event's database.
+
+generate_event(n_teams, seed) gives team challenge info in the format of database.get_all_challenge_info, and
+judging rooms in the format of config['judging_rooms'], both of which every algorithm in queuing.py takes as
+arguments. Challenges come from the challenge data in the config (`challenge_data_path`):
+
+* about 5% of teams don't sign up for judging at all; the rest are all in the main challenge.
+* about 40% of the rest are in only the main challenge. Each other team picks an optional challenge, weighted by
+  a random popularity per challenge, and if that challenge is part of one of the `accepted_combinations`, half
+  the time it's entered in the whole combination instead.
+* there's a room for most optional challenges (each combination's challenges share one), plus extra rooms for
+  popular ones, and enough default rooms for the main-only teams, at about 40 teams a room. Rooms are
+  in-person, online or hybrid, and take 5-8 minutes per team.
+'''
+
+import numpy as np
+from queuing import challenge_data
+from declare_cog import challenge_order
+
+TEAMS_PER_ROOM = 40
+MEDIUMS = [["in-person"], ["online"], ["in-person", "online"]]
+
+
+def generate_event(n_teams: int, seed: int = 0):
+    '''
+    Returns (info, rooms) for a synthetic event with n_teams teams.
+    '''
+    rng = np.random.default_rng(seed)
+    main = challenge_data['main_challenge']
+    optional = list(challenge_data['optional_challenges'])
+    combinations = challenge_data.get('accepted_combinations', [])
+    popularity = rng.dirichlet(np.ones(len(optional)))
+
+    # ===== teams
+    info = []
+    for t in range(n_teams):
+        roll = rng.random()
+        if roll < 0.05:
+            challenges = [] # didn't sign up
+        elif roll < 0.05 + 0.95 * 0.4:
+            challenges = [main]
+        else:
+            chal = optional[rng.choice(len(optional), p=popularity)]
+            options = [combo for combo in combinations if chal in combo]
+            if options and rng.random() < 0.5:
+                challenges = [main] + list(options[rng.integers(len(options))])
+            else:
+                challenges = [main, chal]
+        info.append({'team_name': f"team-{t}", 'challenges': challenge_order(challenges)})
+
+    # ===== rooms
+    entered = {chal: sum(chal in team['challenges'] for team in info) for chal in optional}
+
+    # challenges entered together share rooms
+    groups = []
+    for chal in optional:
+        group = next((g for g in groups if any([chal, other] in combinations or [other, chal] in combinations for other in g)), None)
+        if group == None:
+            groups.append([chal])
+        else:
+            group.append(chal)
+
+    rooms = {}
+    def add_room(room_id, challenges):
+        rooms[room_id] = {
+            "display_name": f"Synthetic Room {room_id}",
+            "mediums": MEDIUMS[rng.integers(len(MEDIUMS))],
+            "challenges": challenges,
+            "minutes_per_team": int(rng.integers(5, 9)),
+        }
+
+    for g, group in enumerate(groups):
+        if rng.random() < 0.2:
+            continue # judged some other way; teams only in these challenges go to default rooms
+        teams = max(entered[chal] for chal in group)
+        for k in range(max(1, round(teams / TEAMS_PER_ROOM))):
+            add_room(f"chal{g}-{k}", list(group))
+
+    main_only = sum(team['challenges'] == [main] for team in info)
+    for k in range(max(1, round(main_only / TEAMS_PER_ROOM))):
+        add_room(f"default-{k}", [])
+
+    return info, rooms
@@ -6,15 +6,57 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from typing import Optional, List
-from discord.utils import get as dget
 import logging
 from datetime import datetime
 import utils
 import re
-import database
+import csv
+import json
+import asyncio
+from time import perf_counter
+import async_database
+import provisioning
+import api_scheduler
+from index_cog import guild_index
 
 args, config = utils.general_setup()
 
+VALID_TEAM_NAME = "^([a-z0-9]+-)*[a-z0-9]+$" # valid regex match to something that can be a discord text channel
+
+# discord's limits on a server, which a big import could run into
+MAX_GUILD_CHANNELS = 500
+MAX_GUILD_ROLES = 250
+
+
+def read_roster(filename):
+    '''
+    Read a roster file into a dict of {team_name: [member, ...]}, where each member is a Discord ID or the
+    email the participant verified with.
+
+    A csv roster has a header row, then one team per row: the team name in the first column and its members in
+    the rest. A json roster is an object mapping each team name to a list of members.
+    '''
+    roster = {}
+
+    if filename.endswith(".json"):
+        with open(filename, "r") as f:
+            data = json.load(f)
+        assert isinstance(data, dict), "the json must be an object mapping team names to lists of members"
+        rows = [[team_name] + list(members) for team_name, members in data.items()]
+    else:
+        with open(filename, "r", newline="") as f:
+            rows = list(csv.reader(f))[1:] # skip header
+
+    for row in rows:
+        row = [str(cell).strip() for cell in row]
+        if not row or row[0] == "":
+            continue
+        assert row[0] not in roster, f"team {row[0]} appears more than once"
+        roster[row[0]] = [cell for cell in row[1:] if cell != ""]
+
+    return roster
+
+
 class Teams(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -63,7 +105,7 @@ class Teams(commands.Cog):
         logging.info(f"all_teams_info: called")
 
         # get info and send
-        all_info = database.get_teams_info(ctx.message.guild)
+        all_info = await async_database.get_teams_info(ctx.message.guild)
 
         msg = f"# TEAMS\n"
         char_count = len(msg) # for ``` at end
@@ -109,7 +151,7 @@ class Teams(commands.Cog):
             await ctx.message.reply("This command cannot be run here.")
             return
 
-        msg = database.get_team_display(ctx, team_name)
+        msg = await async_database.get_team_display(ctx, team_name)
         await ctx.reply(msg)
 
 
@@ -146,11 +188,11 @@ class Teams(commands.Cog):
             return
 
         # perform operation
-        success, msg = database.add_to_team(team_name, member)
+        success, msg = await async_database.add_to_team(team_name, member)
 
         if success:
             # also give team role to participant
-            await member.add_roles(database.get_team_role(ctx.message.guild, team_name))
+            await member.add_roles(await async_database.get_team_role(ctx.message.guild, team_name))
             emote = "✅"
         else:
             emote = "❌"
@@ -191,16 +233,191 @@ class Teams(commands.Cog):
             return
         
         # perform operation
-        success, msg = database.remove_from_team(team_name, member)
+        success, msg = await async_database.remove_from_team(team_name, member)
         
         if success:
             # also remove team role from participant
-            await member.remove_roles(database.get_team_role(ctx.message.guild, team_name))
+            await member.remove_roles(await async_database.get_team_role(ctx.message.guild, team_name))
             emote = "✅"
         else:
             emote = "❌"
 
         await confirm_msg.reply(emote + ' ' + msg)
+
+    @commands.command(help=f'''Creates many teams at once from an attached roster file (csv or json). Restricted.
+    Usage: {config['prefix']}import_teams
+
+    A csv roster has a header row, then one team per row: the team name, then its members. A json roster maps each team name to a list of members. Members are given by Discord ID or by the email they verified with.''')
+    async def import_teams(self, ctx):
+
+        # check permissions
+        if not utils.check_perms(ctx.message.author, config["perms"]["controller"]):
+            logging.info(f"import_teams: ignoring nonpermitted call by {ctx.message.author.name}")
+            return
+
+        if len(ctx.message.attachments) != 1 or not ctx.message.attachments[0].filename.endswith((".csv", ".json")):
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("No teams were imported; this command must be called with exactly one attachment (a csv or json roster).")
+            return
+
+        # download and read the roster
+        attachment = ctx.message.attachments[0]
+        filename = utils.gen_filename("roster", attachment.filename.rsplit(".", 1)[1])
+        with open(filename, "wb") as f:
+            await attachment.save(fp=f)
+
+        try:
+            roster = read_roster(filename)
+        except (ValueError, AssertionError, csv.Error) as e:
+            logging.error(e)
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"No teams were imported; there's something wrong with the roster.\nError message: `{e}`")
+            return
+
+        logging.info(f"import_teams: read {len(roster)} teams from {filename}")
+
+        # validate everything up front, so the one confirmation covers exactly what will happen
+        teams, problems = await self.validate_roster(roster)
+
+        if not teams:
+            await ctx.message.add_reaction("❌")
+            await utils.send_lines(ctx, ["No teams were imported; none of the teams in the roster are valid."] + problems)
+            return
+
+        # a server only holds so many channels and roles; better to refuse now than fail halfway through
+        new_channels = len(ctx.guild.channels) + 3 * len(teams)
+        new_roles = len(ctx.guild.roles) + len(teams)
+        if new_channels > MAX_GUILD_CHANNELS or new_roles > MAX_GUILD_ROLES:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"No teams were imported; {len(teams)} teams would take the server to {new_channels} channels and {new_roles} roles, over Discord's limits of {MAX_GUILD_CHANNELS} and {MAX_GUILD_ROLES}.")
+            return
+
+        # get confirmation, once for the whole roster
+        if problems:
+            await utils.send_lines(ctx, [f"{len(problems)} team(s) in the roster have problems and will be skipped:"] + problems)
+        confirm_msg = await ctx.message.reply(f"**{len(teams)}** teams will be created from `{attachment.filename}`. React to this message with ✅ to confirm, or ❌ to cancel.")
+        confirmed = await utils.get_confirmation(self.bot, ctx.message.author, confirm_msg)
+        if confirmed == None: # timed out
+            return
+        elif confirmed == False: # reacted with ❌
+            await confirm_msg.reply(f"No teams were imported.")
+            return
+
+        progress_msg = await confirm_msg.reply(f"Importing teams: 0/{len(teams)} done.")
+        created, failed = [], []
+        start = last_edit = perf_counter()
+
+        # only a few teams are provisioned at a time. each team is a handful of API calls to the same routes, so
+        # this keeps the bot under the rate limits instead of queueing hundreds of calls and waiting out 429s
+        slots = asyncio.Semaphore(config.get("import_teams_concurrency", 4))
+
+        async def import_team(team_name, members):
+            nonlocal last_edit
+            async with slots:
+                # one team going wrong shouldn't stop the rest of the import, or the report at the end
+                try:
+                    artefacts, timer, problem = await provisioning.create_team(ctx.guild, team_name, members)
+                except Exception as e:
+                    logging.error(f"import_teams: unexpected error creating {team_name}", exc_info=e)
+                    artefacts, problem = None, f"unexpected error ({type(e).__name__}: {e})"
+
+                if artefacts == None:
+                    failed.append(f"`{team_name}`: {problem}")
+                else:
+                    created.append(timer.total())
+                    team_text = artefacts['team_text']
+                    try:
+                        await api_scheduler.bulk(("send", team_text.id), team_text.send(f'Hey {" ".join([member.mention for member in members])}! Here is your team category & channels.'))
+                    except discord.HTTPException as e:
+                        logging.warning(f"import_teams: created {team_name}, but couldn't send its welcome message: {e}")
+
+            # edit the progress message in place, but not so often that the edits are rate limited themselves
+            if perf_counter() - last_edit > 2:
+                last_edit = perf_counter()
+                try:
+                    await api_scheduler.normal(("edit", progress_msg.channel.id), progress_msg.edit(content=f"Importing teams: {len(created) + len(failed)}/{len(teams)} done ({len(failed)} failed)."))
+                except discord.HTTPException as e:
+                    logging.warning(f"import_teams: couldn't update progress message: {e}")
+
+        await asyncio.gather(*[import_team(team_name, members) for team_name, members in teams.items()])
+        elapsed = perf_counter() - start
+
+        report = f"Imported {len(created)}/{len(teams)} teams in {elapsed:.1f}s ({len(created) / elapsed * 60:.1f} teams/min"
+        if created:
+            report += f", {sum(created) / len(created):.2f}s per team"
+        report += ")."
+        logging.info(f"import_teams: {report} Failures: {failed}")
+
+        await progress_msg.edit(content=f"{'✅' if not failed else '⚠️'} {report}")
+        if failed:
+            await utils.send_lines(ctx, [f"{len(failed)} team(s) were not created:"] + failed)
+
+
+    async def validate_roster(self, roster: dict):
+        '''
+        Run the /team checks over every team in a roster. Returns {team_name: [discord.Member]} for the teams that
+        can be created, and a list of problems with the rest.
+        '''
+        problems = []
+        teams = {}
+
+        # resolve members given by email in one query; emails are stored lowercase, as /verify lowercases them
+        emails = [m.lower() for members in roster.values() for m in members if "@" in m]
+        ids_by_email = await async_database.get_discord_ids_by_email(emails)
+
+        seen = {} # member id -> team name, to catch a member listed on two teams
+        for team_name, identifiers in roster.items():
+            problem = None
+
+            if len(team_name) > 100:
+                problem = "name is too long"
+            elif not re.search(VALID_TEAM_NAME, team_name):
+                problem = "name is invalid"
+            elif guild_index.name_taken(team_name):
+                problem = "name is already used in the server"
+            elif not 1 <= len(identifiers) <= config["max_team_participants"]:
+                problem = f"has {len(identifiers)} members"
+
+            members = []
+            for identifier in identifiers:
+                if problem != None:
+                    break
+
+                if "@" in identifier:
+                    discord_id = ids_by_email.get(identifier.lower())
+                    if discord_id == None:
+                        problem = f"{identifier} hasn't verified"
+                        break
+                elif identifier.isdigit():
+                    discord_id = int(identifier)
+                else:
+                    problem = f"{identifier} isn't a Discord ID or email"
+                    break
+
+                member = guild_index.member(discord_id)
+                if member == None:
+                    problem = f"{identifier} isn't in the server"
+                elif member.bot:
+                    problem = f"{identifier} is a bot"
+                elif config["roles"]["participant"] not in [role.id for role in member.roles]:
+                    problem = f"{identifier} does not have the `@participant` role"
+                elif discord_id in seen:
+                    problem = f"{identifier} is also listed on `{seen[discord_id]}`"
+                else:
+                    seen[discord_id] = team_name
+                    members.append(member)
+
+            if problem != None:
+                problems.append(f"`{team_name}`: {problem}")
+            else:
+                teams[team_name] = members
+
+        # then the database checks (name free, members verified and not on a team), in one go
+        for team_name in await async_database.check_new_teams(teams):
+            problems.append(f"`{team_name}`: the team name is taken or a member can't join a team")
+            del teams[team_name]
+
+        return teams, problems
     
 
 """
@@ -226,10 +443,10 @@ class Teams(commands.Cog):
             await confirm_msg.reply(f"Team was not modified.")
             return
 
-        success, message = database.change_team_name(old_name, new_name)
+        success, message = await async_database.change_team_name(old_name, new_name)
         if success:
             # get team artefacts
-            team_info = database.get_team_info(ctx.guild, new_name)
+            team_info = await async_database.get_team_info(ctx.guild, new_name)
 
             # also change role and channel names
             await self.bot.edit_role(server=ctx.guild, role=team_info['team_role'], name=new_name)
@@ -304,21 +521,17 @@ async def team(
         return
 
     # check validity of name
-    valid_text_channel = "^([a-z0-9]+-)*[a-z0-9]+$" # valid regex match to something that can be a discord text channel
-    if not re.search(valid_text_channel, team_name):
+    if not re.search(VALID_TEAM_NAME, team_name):
         await interaction.response.send_message(f"❌ Your team was not created; your team name is invalid. Team names may only consist of **lowercase letters** and **digits** separated by **dashes**.\nA few examples of valid team names: `some-team`, `hackathon-winners`, `a-b-c-d-e-f`")
         return
     
     # ensure team name not already taken
-    if database.team_exists(team_name):
+    if await async_database.team_exists(team_name):
         await interaction.response.send_message(f"❌ Your team was not created; there is already a team called `{team_name}`.")
         return
     
     # ensure team name won't cause conflicts with anything already in the server
-    if dget(interaction.guild.channels, name=team_name) \
-        or dget(interaction.guild.categories, name=team_name) \
-        or dget(interaction.guild.channels, name=team_name) \
-        or dget(interaction.guild.roles, name=team_name):
+    if guild_index.name_taken(team_name):
 
         await interaction.response.send_message(f"❌ Your team was not created; the name `{team_name}` is not allowed.")
         return
@@ -334,7 +547,7 @@ async def team(
             return
 
         # ensure user not already in team
-        if database.is_on_team(member):
+        if await async_database.is_on_team(member):
             await interaction.response.send_message(f"❌ Your team was not created; at least one member is already in a team.")
             return
         
@@ -372,39 +585,19 @@ async def team(
         return
     # otherwise, user confirmed, so we can proceed
 
-    # create team category & role
-    team_cat = await interaction.guild.create_category(name=team_name) # category to store team text & vc
-    team_role = await interaction.guild.create_role(name=team_name, mentionable=True, colour=config['team_role_colour_obj']) # team role
-
-    # Privatize category so that only team and some others can view
-    await team_cat.set_permissions(interaction.guild.default_role, read_messages=False) # @everyone can't view
-    await team_cat.set_permissions(team_role, read_messages=True)
-    for role_name in ['organizer', 'mentor', 'volunteer', 'sponsor', 'judge']:
-        await team_cat.set_permissions(
-            dget(interaction.guild.roles, id=config['roles'][role_name]), # get role with ID identified in config
-            read_messages=True
-        )
-
-    # Create the text and voice channel
-    team_text = await interaction.guild.create_text_channel(name=team_name, category=team_cat)
-    team_vc = await interaction.guild.create_voice_channel(name=team_name, category=team_cat)
-    
-    # Add created role to all team members
-    for member in members:
-        await member.add_roles(team_role)
-
-    # insert team into database
-    valid = database.check_team_validity(team_name, team_text, team_vc, team_cat, team_role, members)
-    if not valid:
-        await confirm_msg.reply(f"❌ Your team was not created because of an unknown problem; paging {utils.get_controller(interaction.guild).mention}.")
+    # check, create the team role, category and channels, give members the role, and insert into the database;
+    # if any step fails, nothing is left behind
+    artefacts, timer, problem = await provisioning.create_team(interaction.guild, team_name, members)
+    if artefacts == None:
+        controller = await utils.get_controller(interaction.guild)
+        await confirm_msg.reply(f"❌ Your team was not created; {problem}. Paging {controller.mention}.")
         return
-    
-    database.insert_team(team_name, team_text, team_vc, team_cat, team_role, members)
+    team_role, team_text = artefacts['team_role'], artefacts['team_text']
 
     # React in confirmation and send notification in team text channel
     await team_text.send(f'Hey {" ".join([member.mention for member in members])}! Here is your team category & channels.')
 
-    logging.info(f"Team created: {team_name}, {[m.name for m in members]}, {team_role}")
+    logging.info(f"Team created: {team_name}, {[m.name for m in members]}, {team_role} ({timer.summary()})")
 
 
 def add_team_slash(bot):
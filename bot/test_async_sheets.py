@@ -0,0 +1,100 @@
+'''
+Check that concurrent verifications don't queue up behind each other when the registration sheet is slow, and
+that async_sheets never runs more sheet calls at once than the thread pool allows. Uses a fake registration
+source that sleeps instead of calling Google, and an in-memory database, so no network access is needed.
+
+    python test_async_sheets.py -c <config>
+'''
+
+import asyncio
+import sqlite3
+import threading
+from time import perf_counter, sleep
+import pandas as pd
+import utils
+import sheets
+import async_sheets
+import database
+import migrations
+import verification_cog
+from verification_cog import VerifyRes
+
+args, config = utils.general_setup()
+
+WORKERS = config.get("sheets_workers", 4)
+N_VERIFY = 50
+N_WRITES = WORKERS * 4
+DELAY = 0.2 # seconds per fake sheet read or write
+
+
+class SleepySource:
+    def __init__(self, registrants):
+        self.registrants = registrants
+        self.lock = threading.Lock()
+        self.active = 0
+        self.most_active = 0
+        self.loads = 0
+
+    def call(self):
+        with self.lock:
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        sleep(DELAY)
+        with self.lock:
+            self.active -= 1
+
+    def load(self):
+        self.call()
+        self.loads += 1
+        return pd.DataFrame({
+            "Email Address": [email for email, first_name, last_name in self.registrants],
+            "First Name": [first_name for email, first_name, last_name in self.registrants],
+            "Last Name": [last_name for email, first_name, last_name in self.registrants],
+            "Discord ID": ["" for registrant in self.registrants],
+        })
+
+    def write(self, updates):
+        self.call()
+
+
+async def check_verify():
+    registrants = [(f"hacker{i}@ualberta.ca", f"first{i}", f"last{i}") for i in range(N_VERIFY)]
+    source = SleepySource(registrants)
+    sheets.source = source
+    sheets.registrations = sheets.RegistrationIndex(ttl=60, min_refresh_interval=5) # cold
+    database.con = sqlite3.connect(":memory:", check_same_thread=False)
+    migrations.upgrade(database.con)
+    database.cur = database.con.cursor()
+
+    start = perf_counter()
+    results = await asyncio.gather(*[verification_cog.verify_participant(*registrant, 10**17 + i) for i, registrant in enumerate(registrants)])
+    elapsed = perf_counter() - start
+
+    print(f"{N_VERIFY} verifications with a {DELAY}s sheet: {elapsed:.2f}s, {source.loads} sheet load(s)")
+    assert all(res == VerifyRes.CAN_BE_VERIFIED and queued for res, queued in results), "every registrant should be verified"
+    assert elapsed < N_VERIFY * DELAY / 10, "verifications ran one after another"
+    assert source.loads == 1, "verifications waiting on the cold index should share one load"
+
+
+async def check_worker_cap():
+    source = SleepySource([])
+    sheets.source = source
+
+    start = perf_counter()
+    await asyncio.gather(*[async_sheets.write_updates([(f"AH{i + 2}", str(i))]) for i in range(N_WRITES)])
+    elapsed = perf_counter() - start
+
+    print(f"{N_WRITES} writes of {DELAY}s on {WORKERS} workers: {elapsed:.2f}s, at most {source.most_active} at once")
+    assert source.most_active == WORKERS, "calls should overlap, up to the number of workers"
+    assert elapsed < N_WRITES * DELAY / 2, "calls ran one after another"
+    assert elapsed >= N_WRITES / WORKERS * DELAY * 0.9, "more calls ran at once than there are workers"
+    assert async_sheets.stats["admitted"] == 0 and async_sheets.stats["running"] == 0 and async_sheets.stats["waiting"] == 0
+
+
+async def main():
+    await check_verify()
+    await check_worker_cap()
+    print("ok")
+
+
+asyncio.run(main())
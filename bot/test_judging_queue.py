@@ -0,0 +1,120 @@
+'''
+Checks for judging_queue.JudgingQueue: converting to and from the json format, and each operation's effect on
+the queue order, `current` and the teams' records. Runs with no Discord or database:
+
+    python test_judging_queue.py -c <config>
+'''
+
+import utils
+from judging_queue import JudgingQueue
+
+args, config = utils.general_setup()
+
+
+def make_queue(n=5, current=-1):
+    return JudgingQueue.from_state({"teams": [f"team-{i}" for i in range(n)], "current": current})
+
+
+def raises(fn, *args):
+    try:
+        fn(*args)
+    except ValueError:
+        return True
+    return False
+
+
+def test_conversion():
+    for current in [-1, 0, 2, 5]:
+        state = {"teams": [f"team-{i}" for i in range(5)], "current": current}
+        assert JudgingQueue.from_state(state).to_state() == state
+    assert make_queue(0).to_state() == {"teams": [], "current": -1}
+
+    queue = make_queue(current=2)
+    assert queue.current_team() == "team-2" and queue.next_team() == "team-3"
+    assert [queue.status(f"team-{i}")["status"] for i in range(5)] == ["judged", "judged", "judging", "waiting", "waiting"]
+
+    assert raises(JudgingQueue.from_state, {"teams": ["a", "b", "a"], "current": -1}), "duplicate teams should be rejected"
+
+
+def test_tick():
+    queue = make_queue(3)
+    assert queue.current == -1 and queue.current_team() == None and queue.next_team() == "team-0"
+    assert [queue.tick() for _ in range(4)] == [0, 1, 2, 3]
+    assert queue.current_team() == None and queue.next_team() == None
+    assert all(entry.status == "judged" for entry in queue)
+
+
+def test_skip():
+    queue = make_queue(current=0)
+    assert queue.skip_next() == "team-1"
+    assert queue.teams() == ["team-0", "team-2", "team-3", "team-4", "team-1"]
+    assert queue.status("team-1")["skips"] == 1 and queue.current == 0
+
+    queue = make_queue(2, current=0)
+    assert raises(queue.skip_next), "the last team can't be skipped"
+
+
+def test_move():
+    queue = make_queue(current=0)
+    queue.move_after("team-4")
+    assert queue.teams() == ["team-0", "team-4", "team-1", "team-2", "team-3"]
+    queue.move_after("team-1", "team-3")
+    assert queue.teams() == ["team-0", "team-4", "team-2", "team-3", "team-1"]
+    assert raises(queue.move_after, "team-0"), "the team being judged can't be moved"
+
+    queue = make_queue(current=2)
+    assert raises(queue.move_after, "team-4", "team-0"), "teams can't be moved among the judged teams"
+
+
+def test_withdraw():
+    queue = make_queue(current=0)
+    queue.withdraw("team-2")
+    assert "team-2" not in queue and len(queue) == 4 and queue.status("team-2")["status"] == "withdrawn"
+    assert raises(queue.withdraw, "team-2")
+    queue.reinsert("team-2")
+    assert queue.teams() == ["team-0", "team-1", "team-3", "team-4", "team-2"] and len(queue) == 5
+    assert raises(queue.reinsert, "team-2"), "only withdrawn teams can be put back"
+
+
+def test_finished():
+    # a room where every team has gone in can't take teams back, since that can't be saved and read back
+    queue = JudgingQueue.from_state({"teams": ["a", "b", "c"], "current": 0})
+    queue.withdraw("b")
+    for _ in range(3):
+        queue.tick()
+    assert queue.current_team() == None and queue.next_team() == None
+    assert raises(queue.reinsert, "b") and raises(queue.append, "d")
+    assert JudgingQueue.from_state(queue.to_state()).to_state() == queue.to_state()
+    assert JudgingQueue.from_state(queue.to_state()).current_team() == None
+
+    # putting a team back before the last team is done is fine, and saves and reads back the same
+    queue = JudgingQueue.from_state({"teams": ["a", "b", "c"], "current": 0})
+    queue.withdraw("b")
+    queue.tick()
+    queue.reinsert("b")
+    restored = JudgingQueue.from_state(queue.to_state())
+    assert restored.to_state() == queue.to_state() == {"teams": ["a", "c", "b"], "current": 1}
+    assert restored.current_team() == queue.current_team() == "c"
+    assert restored.next_team() == queue.next_team() == "b"
+
+
+def test_ping():
+    queue = make_queue(current=0)
+    queue.mark_pinged("team-1")
+    assert queue.status("team-1")["status"] == "pinged"
+    assert raises(queue.mark_pinged, "team-0"), "the team being judged can't be pinged"
+    queue.skip_next()
+    assert queue.status("team-1")["status"] == "waiting", "skipping a team resets it to waiting"
+
+
+def test_append():
+    queue = make_queue(2)
+    queue.append("new")
+    assert queue.teams() == ["team-0", "team-1", "new"]
+    assert raises(queue.append, "new")
+
+
+for name, test in list(globals().items()):
+    if name.startswith("test_"):
+        test()
+        print(f"{name}: ok")
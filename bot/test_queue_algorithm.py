@@ -1,54 +1,24 @@
-import queuing
+'''
+Try out the queuing algorithms on a small synthetic event (see synthetic_event.py), printing each one's queues.
+For timings and schedule quality at larger sizes, see bench_queuing.py.
 
-team_category_choice = {
-    "hackers": ["mecsimcalc", "edi"],
-    "hackers2": ["mecsimcalc", "edi"],
-    "aaa": ["mecsimcalc", "edi"],
-    "bbb": ["mecsimcalc", "edi"],
-    "ccc": ["edi"],
-    "ddd": ["edi"],
-    "eee": ["mecsimcalc"],
-    "fff": ["mecsimcalc"],
-    "ggg": ["mecsimcalc"],
-    "hhh": ["mecsimcalc"],
-    "teamname": [],
-    "teamname2": [],
-    "teamname3": [],
-    "teamname4": [],
-    "teamname5": [],
-    "teamname6": []
-}
+    python test_queue_algorithm.py -c <config>
+'''
 
-team_medium_pref = {
-    "hackers": "online",
-    "hackers2": "online",
-    "aaa": "online",
-    "bbb": "inperson",
-    "ccc": "inperson",
-    "ddd": "online",
-    "eee": "online",
-    "fff": "inperson",
-    "ggg": "inperson",
-    "hhh": "inperson",
-    "teamname": "inperson",
-    "teamname2": "inperson",
-    "teamname3": "inperson",
-    "teamname4": "inperson",
-    "teamname5": "inperson",
-    "teamname6": "online"
-}
+import logging
+import json
+import utils
+import queuing
+from synthetic_event import generate_event
 
-team_category_reacts = {
-    "hackers": ["⚙️"],
-    "hackers2": ["⚙️", "⭐"],
-    "aaa": ["⚙️", "⭐"],
-    "bbb": [],
-    "ccc": [],
-    "ddd": ["⭐"],
-    "eee": ["⭐"]
-}
+args, config = utils.general_setup()
+logging.disable(logging.INFO)
 
-# queuing.queue_algorithm(team_category_choice, team_medium_pref)
-x = queuing.category_priority(team_category_reacts)
+info, rooms = generate_event(16, seed=0)
+print(json.dumps({team['team_name']: team['challenges'] for team in info}, indent=2))
 
-print(x)
\ No newline at end of file
+for algorithm in [queuing.first_chal_match, queuing.balanced_match, queuing.timetable_match, queuing.search_match]:
+    result = algorithm(info, rooms)
+    print(f"\n===== {algorithm.__name__}")
+    print(json.dumps(result[0], indent=2))
+    print(f"unassigned: {result[3] if algorithm == queuing.timetable_match else result[2]}")
@@ -0,0 +1,177 @@
+'''
+A timer service for things the bot has to do at a given time, shared by all cogs.
+
+Jobs are kept in a heap ordered by when they're due, and a single loop sleeps until the earliest one, so any
+number of pending timers (e.g. reminders for every judging room) cost one task rather than one sleeping
+coroutine each. Jobs can be cancelled or rescheduled, and are stored in the ScheduledJobs table so they're
+picked up again after a restart.
+
+Usage:
+    timers.register("judging_reminder", handler) # handler is an async function taking a Job
+    job_id = await timers.schedule("judging_reminder", due=time() + 60, payload={...}, key=room_id)
+    await timers.cancel_key(room_id) # cancel every job for this room
+
+Each job has a `kind`, which picks the handler run when it's due, and optionally a `key`, for cancelling a
+group of jobs at once. Jobs that come due while the bot is down are run on startup if they're no more than
+`timer_max_lateness` seconds (default 60) late, and dropped otherwise.
+'''
+
+import asyncio
+import heapq
+import logging
+from time import time
+import utils
+import async_database
+
+args, config = utils.general_setup()
+
+MAX_LATENESS = config.get("timer_max_lateness", 60)
+
+
+class Job:
+    __slots__ = ("job_id", "kind", "key", "due", "payload")
+
+    def __init__(self, job_id, kind, key, due, payload):
+        self.job_id = job_id
+        self.kind = kind
+        self.key = key
+        self.due = due
+        self.payload = payload
+
+
+class TimerService:
+    def __init__(self):
+        self.handlers = {} # kind -> async function taking a Job
+        self.jobs = {} # job_id -> Job, for every pending job
+        self.heap = [] # (due, job_id); entries for cancelled or rescheduled jobs are skipped when popped
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.running = set() # handler tasks, so they aren't garbage collected mid-run
+        self.fired = 0
+        self.dropped = 0 # too late to run after a restart, or no handler
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    async def load(self):
+        '''
+        Pick up jobs stored before the bot last stopped.
+        '''
+        for job_id, kind, key, due, payload in await async_database.get_scheduled_jobs():
+            if job_id not in self.jobs:
+                self._push(Job(job_id, kind, key, due, payload))
+        logging.info(f"timers: loaded {len(self.jobs)} pending jobs")
+
+    def start(self):
+        if self.task == None or self.task.done():
+            self.task = asyncio.create_task(self._loop())
+
+    def _push(self, job):
+        self.jobs[job.job_id] = job
+        heapq.heappush(self.heap, (job.due, job.job_id))
+        if self.heap[0][1] == job.job_id:
+            self.wakeup.set() # the loop is sleeping until something later
+
+
+    # ===== scheduling
+
+    async def schedule(self, kind, due, payload: dict = None, key=None):
+        '''
+        Run the handler for `kind` with a job holding `payload` at unix time `due`. Returns the job's ID.
+        '''
+        payload = {} if payload == None else payload
+        job_id = await async_database.add_scheduled_job(kind, key, due, payload)
+        self._push(Job(job_id, kind, key, due, payload))
+        return job_id
+
+    async def reschedule(self, job_id, due):
+        '''
+        Move a pending job to a new time. Returns False if there's no such job (e.g. it has already run).
+        '''
+        job = self.jobs.get(job_id)
+        if job == None:
+            return False
+        await async_database.set_scheduled_job_due(job_id, due)
+        job.due = due
+        heapq.heappush(self.heap, (due, job_id)) # the old entry no longer matches job.due, so it'll be skipped
+        if self.heap[0][1] == job_id:
+            self.wakeup.set()
+        return True
+
+    async def cancel(self, *job_ids):
+        job_ids = [job_id for job_id in job_ids if self.jobs.pop(job_id, None) != None]
+        if job_ids:
+            await async_database.remove_scheduled_jobs(job_ids)
+        return len(job_ids)
+
+    async def cancel_key(self, key):
+        return await self.cancel(*[job.job_id for job in self.jobs.values() if job.key == key])
+
+    async def cancel_kind(self, kind):
+        return await self.cancel(*[job.job_id for job in self.jobs.values() if job.kind == kind])
+
+    def pending(self, key=None):
+        return sorted([job for job in self.jobs.values() if key == None or job.key == key], key=lambda job: job.due)
+
+
+    # ===== running
+
+    def _pop_due(self, now):
+        '''
+        Pop every job that's due, skipping stale heap entries.
+        '''
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, job_id = heapq.heappop(self.heap)
+            job = self.jobs.get(job_id)
+            if job == None or job.due != when:
+                continue # cancelled, or rescheduled and pushed again
+            del self.jobs[job_id]
+            due.append(job)
+        return due
+
+    async def _loop(self):
+        while True:
+            self.wakeup.clear()
+            while self.heap and self.heap[0][1] not in self.jobs:
+                heapq.heappop(self.heap) # drop cancelled jobs off the top so we don't wake up for them
+
+            timeout = max(self.heap[0][0] - time(), 0) if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+                continue # something earlier was scheduled; work out how long to sleep again
+            except asyncio.TimeoutError:
+                pass
+
+            now = time()
+            jobs = self._pop_due(now)
+            if jobs:
+                await async_database.remove_scheduled_jobs([job.job_id for job in jobs])
+            for job in jobs:
+                self._fire(job, now)
+
+    def _fire(self, job, now):
+        handler = self.handlers.get(job.kind)
+        if handler == None:
+            logging.warning(f"timers: no handler for job {job.job_id} of kind {job.kind}, dropping it")
+            self.dropped += 1
+            return
+        if now - job.due > MAX_LATENESS:
+            logging.info(f"timers: dropping job {job.job_id} ({job.kind}), it's {now - job.due:.0f}s late")
+            self.dropped += 1
+            return
+
+        # run separately, so a slow handler doesn't hold up other jobs
+        task = asyncio.create_task(self._run(handler, job))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+        self.fired += 1
+
+    async def _run(self, handler, job):
+        try:
+            await handler(job)
+        except Exception as e:
+            logging.error(f"timers: job {job.job_id} ({job.kind}) failed", exc_info=e)
+
+
+timers = TimerService()
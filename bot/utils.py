@@ -134,6 +134,20 @@ async def get_controller(guild):
     return controller
 
 
+async def send_lines(ctx, lines):
+    """
+    Send lines of text, split across as many messages as needed to stay under Discord's character limit.
+    """
+    msg = ""
+    for line in lines:
+        if msg and len(msg) + len(line) + 1 > 1990: # 10 char padding
+            await ctx.send(msg)
+            msg = ""
+        msg += line[:1990] + "\n"
+    if msg:
+        await ctx.send(msg)
+
+
 async def send_as_json(ctx, dictionary, save_with_tag, send_with_name):
     # make file
     save_filename = gen_filename(save_with_tag, "json")
@@ -143,3 +157,47 @@ async def send_as_json(ctx, dictionary, save_with_tag, send_with_name):
     # send file
     await ctx.send(file=discord.File(save_filename, filename=send_with_name))
 
+
+
+class SingleFlight:
+    '''
+    Deduplicates concurrent calls. Each call is identified by a request (e.g. the exact arguments) and a set of keys
+    it touches (e.g. a user ID and an email). While a call is in flight:
+    * an identical request awaits the in-flight call's result instead of redoing the work (it is "coalesced");
+    * a different request sharing any key waits for the in-flight call to finish and then runs, so the two never
+      race each other.
+    '''
+
+    def __init__(self):
+        self.in_flight = {} # key -> (request, task)
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, request, keys, coro_fn, *args):
+        while True:
+            conflict = next((self.in_flight[k] for k in keys if k in self.in_flight), None)
+            if conflict == None:
+                break
+
+            other_request, task = conflict
+            if other_request == request:
+                self.coalesced += 1
+                logging.info(f"SingleFlight: coalesced {request} into in-flight call")
+                return await asyncio.shield(task)
+
+            # wait for the other call to finish (whether it worked or not), then check again
+            await asyncio.wait([task])
+
+        task = asyncio.ensure_future(coro_fn(*args))
+        for k in keys:
+            self.in_flight[k] = (request, task)
+        self.started += 1
+
+        def cleanup(_):
+            for k in keys:
+                if k in self.in_flight and self.in_flight[k][1] is task:
+                    del self.in_flight[k]
+        task.add_done_callback(cleanup)
+
+        # shielded so that the caller giving up doesn't cancel the work for anyone coalesced into it
+        return await asyncio.shield(task)
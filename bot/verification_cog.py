@@ -1,12 +1,16 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-from discord.utils import get as dget
 import logging
+import asyncio
 import utils
 import sheets
-import database
+import async_sheets
+import async_database
+from index_cog import guild_index
 from enum import Enum
+from collections import deque
+from time import time, perf_counter
 
 
 args, config = utils.general_setup()
@@ -21,6 +25,73 @@ class VerifyRes(Enum):
 class Verification(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.flush_latencies = deque(maxlen=50) # seconds taken by recent sheet flushes
+        self.oldest_flushed_wait = None # how long the oldest update in the last flush sat in the queue
+
+    async def cog_load(self):
+        self.refresh_registrations.start()
+        self.flush_sheet_updates.start()
+
+    async def cog_unload(self):
+        self.refresh_registrations.cancel()
+        self.flush_sheet_updates.cancel()
+
+
+    @tasks.loop(seconds=config.get("registration_refresh_seconds", 60))
+    async def refresh_registrations(self):
+        '''
+        Keep the registration index fresh in the background, so /verify doesn't have to wait for the sheet to download.
+        '''
+        try:
+            await async_sheets.refresh_registrations()
+        except Exception as e:
+            logging.error("couldn't refresh registration index", exc_info=e)
+
+
+    @tasks.loop(seconds=config.get("sheet_flush_seconds", 5))
+    async def flush_sheet_updates(self):
+        '''
+        Write all queued verifications to the registration sheet in one batch. Updates stay queued in the database
+        until the write succeeds, so nothing is lost if it fails or the bot goes down.
+        '''
+        updates = await async_database.get_sheet_updates()
+        if not updates:
+            return
+
+        start = perf_counter()
+        try:
+            await async_sheets.write_updates([(cell, value) for _, cell, value, _ in updates])
+        except Exception as e:
+            logging.error(f"couldn't write {len(updates)} queued updates to the registration sheet, will retry", exc_info=e)
+            return
+
+        await async_database.remove_sheet_updates([update_id for update_id, _, _, _ in updates])
+        self.flush_latencies.append(perf_counter() - start)
+        self.oldest_flushed_wait = time() - updates[0][3]
+
+
+    @commands.command(help=f'''Shows how fresh the bot's copy of the registration sheet is, how often lookups find a registrant, and how many verifications are waiting to be written to the sheet. Restricted.
+    
+    Usage: {config['prefix']}registration_stats''')
+    async def registration_stats(self, ctx):
+
+        if not utils.check_perms(ctx.message.author, config["perms"]["controller"]):
+            logging.info(f"registration_stats: ignoring nonpermitted call by {ctx.message.author.name}")
+            return
+        
+        stats = sheets.registrations.stats()
+        staleness = "never loaded" if stats['staleness'] == None else f"{stats['staleness']:.0f}s old"
+        hit_rate = "n/a" if stats['hit_rate'] == None else f"{stats['hit_rate']:.0%}"
+
+        pending = await async_database.count_sheet_updates()
+        if self.flush_latencies:
+            flushes = f"last flush took {self.flush_latencies[-1]:.2f}s (avg {sum(self.flush_latencies) / len(self.flush_latencies):.2f}s), oldest update had waited {self.oldest_flushed_wait:.1f}s"
+        else:
+            flushes = "no flushes yet"
+
+        pool = async_sheets.stats
+
+        await ctx.reply(f"Registration index: {stats['rows']} rows, {staleness}, refreshed {stats['refreshes']} times.\nLookups: {stats['hits']} hits, {stats['misses']} misses (hit rate {hit_rate}).\nSheet writes: {pending} pending, {flushes}.\nSheet calls: {pool['running']} running, {pool['admitted'] - pool['running']} queued for a thread, {pool['waiting']} waiting for a slot, {pool['completed']} completed.\nVerifications: {verify_flights.started} run, {verify_flights.coalesced} duplicate requests coalesced.")
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -33,7 +104,7 @@ class Verification(commands.Cog):
             logging.info(f"illegal message in verification channel: {message.content}")
 
             # explain to user
-            controller = dget(message.guild.members, id=config["controller_id"]) # tell them to direct all problems to the bot controller
+            controller = guild_index.member(config["controller_id"]) # tell them to direct all problems to the bot controller
             await message.author.send(f"Only messages using the `/verify` command can be sent in the `#verify` channel. If you need help with something and don't have access to the rest of the server, please send a DM to {controller.mention}!")
 
             # delete message
@@ -54,11 +125,15 @@ class Verification(commands.Cog):
             logging.info(f"manual_verify: ignoring nonpermitted call by {ctx.message.author.name}")
             return
         
+        if not discord_id.isdigit():
+            await ctx.reply(f"`{discord_id}` isn't a Discord ID; it should be a number.")
+            return
+
         # use lowercase for matching to make life easier
         email, first_name, last_name = email.lower(), first_name.lower(), last_name.lower()
                         
         logging.info(f"---- start verify ({email}, {first_name}, {last_name}, {discord_id}) ----")
-        res = await check_verifiability(email, first_name, last_name, discord_id)
+        res, sheets_success = await verify_participant(email, first_name, last_name, discord_id)
 
         # error messages for various error cases
         if res == VerifyRes.NOT_REGISTERED:
@@ -69,16 +144,13 @@ class Verification(commands.Cog):
             await ctx.reply("That Discord account has already been verified as a particpant.")
 
         elif res == VerifyRes.CAN_BE_VERIFIED:
-            database.insert_participant(email, first_name, last_name, discord_id) # add to database
-            sheets_success = sheets.verify(email, first_name, last_name, discord_id) # check off on registration spreadsheet
-            
             if not sheets_success:
                 await ctx.reply(f"There was an issue updating the registration spreadsheet.")
             
             else:
                 # finally give them the participant role
                 user = await ctx.guild.fetch_member(discord_id)
-                participant_role = dget(ctx.guild.roles, id=config['roles']['participant'])
+                participant_role = guild_index.role(config['roles']['participant'])
                 await user.add_roles(participant_role)
 
                 # confirmation message
@@ -125,7 +197,7 @@ async def verify(interaction: discord.Interaction, email: str, first_name: str,
     await interaction.response.defer(ephemeral=True)
 
     logging.info(f"---- start verify ({email}, {first_name}, {last_name}, {discord_id}) ----")
-    res = await check_verifiability(email, first_name, last_name, discord_id)
+    res, sheets_success = await verify_participant(email, first_name, last_name, discord_id)
 
     if res == VerifyRes.NOT_REGISTERED:
         await interaction.followup.send(f"We can't find a registrant with that information. Please check your registration form response (a copy was emailed to you on submission) and ensure the email, first name, and last name are *exactly* identical to the values you're entering in the command.")
@@ -135,18 +207,14 @@ async def verify(interaction: discord.Interaction, email: str, first_name: str,
         await interaction.followup.send(f"You have already verified your Discord account as a different participant.")
     
     elif res == VerifyRes.CAN_BE_VERIFIED:
-        
-        database.insert_participant(email, first_name, last_name, discord_id) # add to database
-        sheets_success = sheets.verify(email, first_name, last_name, discord_id) # check off on registration spreadsheet
-        
         if not sheets_success:
             controller = await interaction.guild.fetch_member(config['controller_id'])
             await interaction.followup.send(f"There was an issue confirming your registration; please send a message to {controller.mention}.")
         
         else:
             # finally give them the participant role
-            user = dget(interaction.guild.members, id=discord_id)
-            participant_role = dget(interaction.guild.roles, id=config['roles']['participant'])
+            user = guild_index.member(discord_id)
+            participant_role = guild_index.role(config['roles']['participant'])
             await user.add_roles(participant_role)
 
             # confirmation message
@@ -158,13 +226,43 @@ async def verify(interaction: discord.Interaction, email: str, first_name: str,
     logging.info(f"---- end verify ({email}, {first_name}, {last_name}, {discord_id}) ----")
 
 
+# participants spam /verify when discord is slow; this makes sure each one is only verified once at a time
+verify_flights = utils.SingleFlight()
+
+
+async def verify_participant(email, first_name, last_name, discord_id):
+    '''
+    Check a participant can be verified and, if so, add them to the database and queue the sheet update.
+    Concurrent calls for the same participant share one run; calls that share only the email or Discord account
+    wait for each other. Returns the VerifyRes code and whether the sheet update was queued (None if not verified).
+    '''
+    discord_id = int(discord_id)
+    return await verify_flights.do(
+        (email, first_name, last_name, discord_id),
+        [("email", email), ("discord", discord_id)],
+        _verify_participant, email, first_name, last_name, discord_id
+    )
+
+
+async def _verify_participant(email, first_name, last_name, discord_id):
+    res = await check_verifiability(email, first_name, last_name, discord_id)
+    if res != VerifyRes.CAN_BE_VERIFIED:
+        return res, None
+
+    sheet_updates = await async_sheets.verify(email, first_name, last_name, discord_id) # the edit that checks them off on the registration spreadsheet
+    # add to database, queueing the sheet edit in the same transaction; it's written to the sheet in the next batch
+    await async_database.insert_participant(email, first_name, last_name, discord_id, sheet_updates)
+    sheets.mark_verified(sheet_updates) # only once they're in the database, so the two never disagree
+    return res, len(sheet_updates) > 0
+
+
 async def check_verifiability(email, first_name, last_name, discord_id):
     '''
     Check a participant can be verified. Returns a VerifyRes enum code.
     '''
     
     # make sure information given exactly matches a participant we have registered
-    registered = sheets.check_if_registered(email, first_name, last_name)
+    registered = await async_sheets.check_if_registered(email, first_name, last_name)
 
     if not registered:
         logging.info(f"Participant not registered.")
@@ -172,8 +270,10 @@ async def check_verifiability(email, first_name, last_name, discord_id):
     
     else: # otherwise, need to check database and sheet to make sure account/participant not already *verified*
         
-        db_result = database.check_if_verified(email, first_name, last_name, discord_id)
-        sheet_result = sheets.check_if_verified(email, first_name, last_name, discord_id)
+        db_result, sheet_result = await asyncio.gather(
+            async_database.check_if_verified(email, first_name, last_name, discord_id),
+            async_sheets.check_if_verified(email, first_name, last_name, discord_id)
+        )
 
         # checks for synchronicity
         if db_result != sheet_result:
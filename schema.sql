@@ -1,8 +1,10 @@
+-- Current schema, for reference. Databases are created and upgraded by bot/migrations.py; keep this in sync with it.
+
 CREATE TABLE Participants(
     email      CHAR(100),
     first_name CHAR(100),
     last_name  CHAR(100),
-    discord_id CHAR(20),
+    discord_id INTEGER,
     team_name  CHAR(100),
     PRIMARY KEY (email),
     FOREIGN KEY (team_name) REFERENCES Teams
@@ -10,10 +12,10 @@ CREATE TABLE Participants(
 
 CREATE TABLE Teams(
     team_name   CHAR(100),
-    channel_id  CHAR(20),
-    voice_id    CHAR(20),
-    category_id CHAR(20),
-    role_id     CHAR(20),
+    channel_id  INTEGER,
+    voice_id    INTEGER,
+    category_id INTEGER,
+    role_id     INTEGER,
     medium_pref CHAR(20),
     github_link CHAR(200),
     devpost_link CHAR(200),
@@ -27,4 +29,81 @@ CREATE TABLE Challenges(
     FOREIGN KEY (team_name) REFERENCES Teams
 );
 
--- https://discord.com/developers/docs/reference#snowflakes IT HAS LITTLE SNOWFLAKES
\ No newline at end of file
+-- registration sheet writes waiting to be sent in the next batch update
+CREATE TABLE SheetUpdates(
+    update_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cell      CHAR(20),
+    value     CHAR(100),
+    queued_at REAL
+);
+
+-- judging state, so it survives the bot restarting. a room's queue is its JudgingQueue rows in order of
+-- position (positions aren't contiguous, so a skipped team can be moved to the end by updating one row)
+CREATE TABLE JudgingRooms(
+    room_id CHAR(100),
+    current INTEGER,
+    version INTEGER,
+    PRIMARY KEY (room_id)
+);
+
+CREATE TABLE JudgingQueue(
+    entry_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_id   CHAR(100),
+    team_name CHAR(100),
+    position  INTEGER,
+    FOREIGN KEY (room_id) REFERENCES JudgingRooms
+);
+
+CREATE TABLE JudgingSkips(
+    skip_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_id    CHAR(100),
+    team_name  CHAR(100),
+    skipped_at REAL,
+    FOREIGN KEY (room_id) REFERENCES JudgingRooms
+);
+
+-- append-only log of every change to judging (see bot/judging_state.py), with the whole state saved every so
+-- often as a checkpoint to replay from
+CREATE TABLE JudgingEvents(
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind       CHAR(20),
+    room_id    CHAR(100),
+    data       TEXT,
+    created_at REAL
+);
+
+CREATE TABLE JudgingCheckpoints(
+    seq        INTEGER,
+    state      TEXT,
+    created_at REAL,
+    PRIMARY KEY (seq)
+);
+
+-- the pinned message for each room on the live judging board (see bot/judging_board.py)
+CREATE TABLE JudgingBoard(
+    room_id    CHAR(100),
+    channel_id INTEGER,
+    message_id INTEGER,
+    PRIMARY KEY (room_id)
+);
+
+-- pending jobs for the timer service (see bot/timers.py), so they survive a restart
+CREATE TABLE ScheduledJobs(
+    job_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind       CHAR(50),
+    job_key    CHAR(100),
+    due        REAL,
+    payload    TEXT
+);
+
+CREATE INDEX participants_discord_id ON Participants(discord_id);
+CREATE INDEX participants_team_name ON Participants(team_name);
+CREATE INDEX teams_channel_id ON Teams(channel_id);
+CREATE INDEX teams_voice_id ON Teams(voice_id);
+CREATE INDEX teams_category_id ON Teams(category_id);
+CREATE INDEX teams_role_id ON Teams(role_id);
+CREATE INDEX challenges_team_name ON Challenges(team_name);
+CREATE INDEX judgingqueue_room_position ON JudgingQueue(room_id, position);
+CREATE INDEX scheduledjobs_job_key ON ScheduledJobs(job_key);
+
+-- https://discord.com/developers/docs/reference#snowflakes IT HAS LITTLE SNOWFLAKES